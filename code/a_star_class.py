@@ -4,8 +4,13 @@ from itertools import product
 import numpy as np
 import copy
 
+from bucket_queue import BucketQueue
+
 DEBUG = False
 
+# id(map) -> (map, number of free cells), so that the cells of a map are only counted once
+FREE_CELLS = dict()
+
 def move(loc, dir):
     directions = [(0, -1), (1, 0), (0, 1), (-1, 0), (0, 0)]
     return loc[0] + directions[dir][0], loc[1] + directions[dir][1]
@@ -19,6 +24,17 @@ def get_sum_of_cost(paths):
             assert path[-1] != path[-2]
     return rst
 
+def get_free_cells(my_map):
+    '''
+    Returns the number of free (not blocked) cells of a map, counted the first time the map is seen.
+    '''
+
+    cached = FREE_CELLS.get(id(my_map))
+    if cached is None or cached[0] is not my_map:
+        cached = (my_map, sum(1 for row in my_map for cell in row if not cell))
+        FREE_CELLS[id(my_map)] = cached
+    return cached[1]
+
 def compute_heuristics(my_map, goal):
     # Use Dijkstra to build a shortest-path tree rooted at the goal location
     open_list = []
@@ -81,7 +97,8 @@ def get_path(goal_node,meta_agent):
             # remove trailing duplicates
             while path[i][-1] == path[i][-2]:
                 path[i].pop()
-                print(path[i])
+                if DEBUG:
+                    print(path[i])
                 if len(path[i]) <= 1:
                     break
             # assert path[i][-1] != path[i][-2] # no repeats at the end!!
@@ -91,7 +108,7 @@ def get_path(goal_node,meta_agent):
 
 class A_Star(object):
 
-    def __init__(self,my_map,starts,goals,heuristics,agents,contraints):
+    def __init__(self,my_map,starts,goals,heuristics,agents,contraints,budget=None,max_cost=None,max_timestep=None):
         """
         Parameters
         ----------
@@ -99,17 +116,37 @@ class A_Star(object):
             - starts      - [(x1, y1), (x2, y2), ...] list of start locations for CBS
             - goals       - [(x1, y1), (x2, y2), ...] list of goal locations for CBS
             - agents      - the agent (CBS) or meta-agent of the agent (MA-CBS) involved in collision
-            - constraints - list of dict constraints generated by a CBS splitter; dict = {agent,loc,timestep,positive}
+            - constraints - list of dict constraints generated by a CBS splitter; dict = {agent,loc,timestep,positive},
+                            or a group constraint {agents,loc,timestep,positive} that applies to every agent in agents
+            - budget      - Budget of the high-level solver, charged once per expansion (optional)
+            - max_cost    - the largest sum of costs of the paths that is of use to the caller. Nodes whose f-value
+                            exceeds it are not generated, so the search fails instead of finding a costlier path (optional)
+            - max_timestep - the last timestep a node may have. Defaults to the last constraint timestep plus the number
+                            of joint locations of the agents (the free cells of the map to the power of the number of
+                            agents): past the last constraint, a shortest path reaches the goal without visiting a joint
+                            location twice, so the search fails instead of exploring time forever (optional)
         """            
 
         self.my_map = my_map
+        self.budget = budget
+        self.max_cost = max_cost
+        self.max_timestep = max_timestep
+
+        # The children that were not generated because they exceeded max_cost or max_timestep
+        self.num_pruned = 0
+
+        # The last timestep with a constraint, after which the closed list ignores time (see get_closed_key())
+        self.last_constraint_timestep = 0
+
+        # The children dropped because their location was already reached at another timestep after the last constraint
+        self.num_collapsed = 0
 
 
         self.num_generated = 0
         self.num_expanded = 0
         self.CPU_time = 0
 
-        self.open_list = []
+        self.open_list = BucketQueue() # ordered by f, then h (i.e. larger g first), then insertion order
         self.closed_list = dict()
 
         
@@ -120,11 +157,6 @@ class A_Star(object):
         # check if meta_agent is only a simple agent (from basic CBS)
         if not isinstance(agents, list):
             self.agents = [agents]
-            # print(meta_agent)
-
-            # add meta_agent keys to constraints
-            for c in self.constraints:
-                c['meta_agent'] = {c['agent']}
 
         # FILTER BY INDEX FOR STARTS AND GOALS AND HEURISTICS
         self.starts = [starts[a] for a in self.agents]
@@ -138,11 +170,11 @@ class A_Star(object):
     def push_node(self, node):
         f_value = node['g_val'] + node['h_val']
 
-        heapq.heappush(self.open_list, (f_value, node['h_val'], node['loc'], self.num_generated, node))
+        self.open_list.push(f_value, node['h_val'], self.num_generated, node)
         self.num_generated += 1
         
     def pop_node(self):
-        _,_,_, id, curr = heapq.heappop(self.open_list)
+        _, _, id, curr = self.open_list.pop()
 
         self.num_expanded += 1
         return curr
@@ -161,8 +193,16 @@ class A_Star(object):
             if timestep in constraint_table:
                 t_constraint = constraint_table[timestep]
 
+            # group constraint (Tuvya splitting), expanded only for the agent being planned
+            if 'agents' in constraint:
+                if agent in constraint['agents']:
+                    t_constraint.append({'agent': agent,
+                                         'loc': constraint['loc'],
+                                         'timestep': timestep,
+                                         'positive': constraint['positive']})
+                    constraint_table[timestep] = t_constraint
             # positive constraint for agent
-            if constraint['positive'] and constraint['agent'] == agent:
+            elif constraint['positive'] and constraint['agent'] == agent:
                 t_constraint.append(constraint)
                 constraint_table[timestep] = t_constraint
             # and negative (external) constraint for agent
@@ -342,6 +382,15 @@ class A_Star(object):
 
         return children
 
+    def get_closed_key(self, node):
+        """
+        Return the key of a node in the closed list. After the last constraint timestep nothing depends on time: the
+        moves, their costs and whether the agents have reached their goals only depend on the locations. All the
+        timesteps after it therefore share a key, so the search is a spatial A* from there on.
+        """
+
+        return (tuple(node['loc']), min(node['timestep'], self.last_constraint_timestep + 1))
+
     def compare_nodes(self, n1, n2):
         """Return true is n1 is better than n2."""
 
@@ -371,6 +420,10 @@ class A_Star(object):
             if table_i.keys():
                 self.max_constraints[i] = max(table_i.keys())
 
+        self.last_constraint_timestep = int(max(self.max_constraints))
+        if self.max_timestep is None:
+            self.max_timestep = self.last_constraint_timestep + get_free_cells(self.my_map) ** len(self.agents)
+
 
         h_value = sum([self.heuristics[i][self.starts[i]] for i in range(len(self.agents))])
 
@@ -396,8 +449,12 @@ class A_Star(object):
                         self.max_constraints[i] = 0
 
 
+        # Every path is costlier than the bound
+        if self.max_cost is not None and h_value > self.max_cost:
+            return None
+
         self.push_node(root)
-        self.closed_list[(tuple(root['loc']),root['timestep'])] = [root]
+        self.closed_list[self.get_closed_key(root)] = root
 
         while len(self.open_list) > 0:
 
@@ -406,6 +463,10 @@ class A_Star(object):
 
             curr = self.pop_node()
 
+            # raises BudgetExhausted if the solver has run out of budget
+            if self.budget is not None:
+                self.budget.expand_ll()
+
             solution_found = all(curr['reached_goal'][i] for i in range(len(self.agents)))
             # print(curr['reached_goal'] )
 
@@ -419,6 +480,11 @@ class A_Star(object):
 
                 f_value = child['g_val'] + child['h_val']
 
+                # The paths through the child are costlier than the bound, or the child is past the last timestep
+                if (self.max_cost is not None and f_value > self.max_cost) or child['timestep'] > self.max_timestep:
+                    self.num_pruned += 1
+                    continue
+
                 # if (tuple(child['loc']),child['timestep']) in self.closed_list:
                 #     existing_node = self.closed_list[(tuple(child['loc']),child['timestep'])]
                 #     if self.compare_nodes(child, existing_node):
@@ -429,16 +495,19 @@ class A_Star(object):
                 #     self.closed_list[(tuple(child['loc']),child['timestep'])] = child
                 #     self.push_node(child)
 
-                if (tuple(child['loc']),child['timestep']) in self.closed_list:
-                    existing = self.closed_list[(tuple(child['loc']),child['timestep'])]
+                key = self.get_closed_key(child)
+                if key in self.closed_list:
+                    existing = self.closed_list[key]
                     if (child['g_val'] + child['h_val'] < existing['g_val'] + existing['h_val']) and (child['g_val'] < existing['g_val']) and child['reached_goal'].count(False) <= existing['reached_goal'].count(False):
                         if DEBUG:
                             print("child is better than existing in closed list")
-                        self.closed_list[(tuple(child['loc']),child['timestep'])] = child
+                        self.closed_list[key] = child
                         self.push_node(child)
+                    elif child['timestep'] != existing['timestep']:
+                        self.num_collapsed += 1
                 else:
                     # print('bye child ',child['loc'])
-                    self.closed_list[(tuple(child['loc']),child['timestep'])] = child
+                    self.closed_list[key] = child
                     self.push_node(child)
 
                 # if (tuple(child['loc']),child['timestep']) not in self.closed_list:
@@ -0,0 +1,233 @@
+'''
+This file contains the adaptive merge policy of MA-CBS (see icbs_complete.py). Instead of merging two meta-agents after
+a fixed number of conflicts, the policy compares two projections, both in low-level nodes generated:
+
+- the cost of the merged joint search. A joint A* over k agents generates up to 5^k children per expansion, and
+  expands about T * prod(w_i) nodes, where T is the length of the longest path and w_i is the mean width of the MDD
+  (the layered graph of the optimal paths) of agent i. The estimate is scaled by how far off the previous estimates
+  were from the measured joint searches.
+- the cost of continued splitting. Resolving c more conflicts between the two meta-agents by splitting takes a subtree
+  of about 2^(c+1) CT nodes, where c is the number of conflicts recorded between them so far, and every CT node
+  replans one meta-agent. The cost of a replan is the running mean of the measured A* searches of meta-agents of the
+  same size.
+
+The meta-agents are merged when the joint search is projected to be cheaper. Every decision is printed and kept in
+AdaptiveMergePolicy.decisions.
+
+The MDD widths ignore the constraints of the node, so they are an upper bound of the widths of the constrained MDDs.
+
+Classes
+-------
+AdaptiveMergePolicy
+    Decides when to merge two meta-agents from the projected costs of merging and of splitting.
+'''
+
+from a_star_class import compute_heuristics
+
+# The weight of the latest measurement in the running means
+SMOOTHING = 0.2
+
+# The number of moves of an agent in one timestep (four directions and wait)
+NUM_OF_MOVES = 5
+
+
+class AdaptiveMergePolicy(object):
+    '''
+    Decides when to merge two meta-agents from the projected costs of merging and of splitting.
+    '''
+
+    def __init__(self, my_map, starts, heuristics, smoothing=SMOOTHING):
+        '''
+        Parameters
+        ----------
+        my_map : list
+            The map.
+        starts : list
+            The start locations of the agents.
+        heuristics : list
+            The distances to the goal of every agent (see a_star_class.compute_heuristics()).
+        smoothing : float
+            The weight of the latest measurement in the running means. Default is SMOOTHING.
+        '''
+
+        self.my_map = my_map
+        self.starts = starts
+        self.heuristics = heuristics
+        self.smoothing = smoothing
+
+        # agent -> the distances from the start of the agent, computed the first time they are needed
+        self.start_distances = dict()
+
+        # (agent, cost) -> the mean width of the MDD of the agent
+        self.mdd_widths = dict()
+
+        # size of the meta-agent -> running mean of the nodes generated by its A* searches
+        self.search_costs = dict()
+
+        # running mean of the measured / projected cost of the joint searches
+        self.calibration = 1.0
+
+        # the projected cost of the last merge, to calibrate with the measured cost of its joint search
+        self.pending_projection = None
+
+        self.decisions = []
+
+    def get_mdd_width(self, agent, cost):
+        '''
+        Get the mean width of the MDD of an agent: the mean number of locations, per timestep, that are on a path of
+        the given cost from the start to the goal of the agent.
+
+        Parameters
+        ----------
+        agent : int
+            The agent.
+        cost : int
+            The cost of the paths of the MDD.
+
+        Returns
+        -------
+        float
+            The mean width of the MDD.
+        '''
+
+        key = (agent, cost)
+        if key in self.mdd_widths:
+            return self.mdd_widths[key]
+
+        if agent not in self.start_distances:
+            self.start_distances[agent] = compute_heuristics(self.my_map, self.starts[agent])
+        start_distances = self.start_distances[agent]
+        goal_distances = self.heuristics[agent]
+
+        # A location is in the layers d_start(v) to cost - d_goal(v) of the MDD
+        size = 0
+        for loc, start_distance in start_distances.items():
+            layers = cost - goal_distances.get(loc, cost + 1) - start_distance + 1
+            if layers > 0:
+                size += layers
+
+        width = max(size / (cost + 1), 1.0)
+        self.mdd_widths[key] = width
+        return width
+
+    def get_search_cost(self, size):
+        '''
+        Get the running mean of the nodes generated by the A* searches of meta-agents of a given size, or of the
+        closest smaller size that was measured. Returns None if no search was measured yet.
+        '''
+
+        measured = [s for s in self.search_costs if s <= size]
+        if not measured:
+            measured = list(self.search_costs)
+        if not measured:
+            return None
+        return self.search_costs[max(measured)]
+
+    def record_search(self, meta_agent, num_generated):
+        '''
+        Record the nodes generated by the A* search of a meta-agent.
+
+        Parameters
+        ----------
+        meta_agent : collection
+            The agents of the search.
+        num_generated : int
+            The number of nodes the search generated.
+
+        Returns
+        -------
+        None
+        '''
+
+        size = len(meta_agent)
+        if size not in self.search_costs:
+            self.search_costs[size] = float(num_generated)
+        else:
+            self.search_costs[size] += self.smoothing * (num_generated - self.search_costs[size])
+
+    def record_joint_search(self, meta_agent, num_generated):
+        '''
+        Record the nodes generated by the joint search of a merge, and calibrate the projections of the joint
+        searches with it.
+
+        Parameters
+        ----------
+        meta_agent : collection
+            The merged meta-agent.
+        num_generated : int
+            The number of nodes the search generated.
+
+        Returns
+        -------
+        None
+        '''
+
+        self.record_search(meta_agent, num_generated)
+
+        if self.pending_projection:
+            ratio = num_generated / self.pending_projection
+            self.calibration += self.smoothing * (ratio - self.calibration)
+        self.pending_projection = None
+
+    def get_joint_cost(self, meta_agent, paths):
+        '''
+        Get the projected nodes generated by the joint search of a meta-agent, before calibration.
+        '''
+
+        horizon = max(len(paths[agent]) for agent in meta_agent)
+
+        expanded = horizon
+        for agent in meta_agent:
+            expanded *= self.get_mdd_width(agent, len(paths[agent]) - 1)
+
+        return expanded * NUM_OF_MOVES ** len(meta_agent)
+
+    def should_merge(self, collision, paths, conflict_history):
+        '''
+        Returns True if the meta-agents of a collision should be merged.
+
+        Parameters
+        ----------
+        collision : dict
+            The collision, with the meta-agents in "ma1" and "ma2".
+        paths : list
+            The paths of the agents in the CT node.
+        conflict_history : ConflictHistory
+            The conflict history of the CT node.
+
+        Returns
+        -------
+        bool
+            Whether to merge the meta-agents.
+        '''
+
+        ma1, ma2 = collision['ma1'], collision['ma2']
+        meta_agent = ma1 | ma2
+        conflicts = conflict_history.count(ma1, ma2)
+
+        projection = self.get_joint_cost(meta_agent, paths)
+        joint_cost = self.calibration * projection
+
+        # Without measurements, never merge: splitting is what the measurements come from
+        replan_cost = self.get_search_cost((len(ma1) + len(ma2)) / 2)
+        split_cost = None if replan_cost is None else 2 ** (conflicts + 1) * replan_cost
+
+        merge = split_cost is not None and joint_cost < split_cost
+        if merge:
+            self.pending_projection = projection
+
+        decision = {
+            'ma1': ma1,
+            'ma2': ma2,
+            'conflicts': conflicts,
+            'joint_cost': joint_cost,
+            'split_cost': split_cost,
+            'merge': merge
+        }
+        self.decisions.append(decision)
+
+        print('> Adaptive merge of {} and {} after {} conflicts: joint search {:.0f}, splitting {}: {}'.format(
+            set(ma1), set(ma2), conflicts, joint_cost,
+            'unknown' if split_cost is None else '{:.0f}'.format(split_cost), 'merge' if merge else 'split'))
+
+        return merge
@@ -7,6 +7,12 @@ Functions
 ---------
 do_benchmark()
     Run the benchmark specified by Dr. Atzmon.
+run_benchmark_tasks()
+    Run a list of (file, splitting strategy, seed) tasks on a pool of isolated worker processes.
+get_task_key()
+    Get the checkpoint key of a task.
+get_splitting_flags()
+    Get the find_solution() flags of a splitting strategy.
 
 Notes
 -----
@@ -22,18 +28,66 @@ The following metrics will be recorded for each instance:
 - LL Nodes generated
 - Total runtime
 - Solution cost
+- The time spent in each phase of the search (heuristics, root planning, low-level search, collision detection,
+  constraint combination, node copying and cardinal detection). Phases nest, so these don't sum to the runtime.
+
+Every instance is run in its own process, so a crash or a runaway instance can't take the rest of the sweep down
+with it. The process is killed if it runs past its timeout, and its address space can be limited with a memory
+limit. Results are appended to the output file as soon as each instance finishes.
+
+Every result is also recorded in a checkpoint in the output directory. If a sweep is interrupted, running it again
+with --resume skips the instances that already have a result under the same timeout and memory limit, and reruns only
+the missing or failed ones.
+
+With --seeds, every instance is run once per seed with each strategy, so the strategies can be compared on paired
+seeds. The seed of every run is recorded in the output file, the checkpoint and the results store.
+
+The results are also written to a typed results store in the output directory (results.parquet, or results.sqlite
+if no Parquet engine is installed), which results_analysis.py can summarize without any cleaning.
+
+With --profile, the search of every instance is profiled. The profiles are saved in the profiles/ subdirectory of the
+output directory (see profiling.py), and the hottest functions across the sweep are reported at the end.
 '''
 
 import argparse
 import time
 import os
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
 
 from run_experiments import import_mapf_instance
 from cbs_basic import CBSSolver
 from single_agent_planner import get_sum_of_cost
+from checkpoint import Checkpoint
+from phase_timer import PHASES
+from profiling import profile_call, report_profiles
+from results_store import ResultsStore, metrics_to_row
 
 from tqdm import tqdm
 
+SPLITTING_STRATEGIES = ['standard', 'disjoint', 'tuvya_splitting', 'tuvya_splitting_imbalanced']
+
+# Seconds a worker may overrun its timeout, so the solver can return its own statistics before it is killed
+KILL_GRACE_PERIOD = 5
+
+CHECKPOINT_FILENAME = 'checkpoint.jsonl'
+
+# The typed results store of the output directory (results.parquet, or results.sqlite without a Parquet engine)
+RESULTS_STORE = 'results'
+
+PROFILE_DIRECTORY = 'profiles'
+
+# The columns holding the time spent in each phase of the search
+PHASE_COLUMNS = [f'{phase} time' for phase in PHASES]
+
+METRICS_HEADER = 'File,Splitting strategy,HL Nodes expanded,HL Nodes generated,LL Nodes expanded,LL Nodes generated,Total runtime,Solution cost,' + ','.join(PHASE_COLUMNS) + ',Seed\n'
+
 def do_benchmark(args):
     '''
     Run the benchmark specified by Dr. Atzmon. Saves the output to a file.
@@ -50,15 +104,258 @@ def do_benchmark(args):
 
     # Get the files to run the benchmark on
     files = get_benchmark_files(args.instance_type)
+    seeds = args.seeds if args.seeds else [None]
+    tasks = [(file, args.splitting_strategy, seed) for file in files for seed in seeds]
+
+    # Run each file through the algorithm specified, and log the metrics as they come in
+    run_benchmark_tasks(tasks, args.output_directory, args.timeout, workers=args.workers, memory_limit=args.memory_limit,
+                        resume=args.resume, profile=args.profile)
+
+def run_benchmark_tasks(tasks, output_directory, timeout, workers=1, memory_limit=None, resume=False, profile=False):
+    '''
+    Run every task in its own process, with up to `workers` processes at a time. A process that runs longer than
+    the timeout (plus a short grace period) is killed. The metrics of each task are appended to the output file
+    and to the checkpoint as soon as the task finishes.
+
+    When resuming, the tasks that already have a (non-failed) result in the checkpoint aren't run again. Their
+    recorded metrics are copied to the output file so that it still covers the whole sweep.
+
+    Parameters
+    ----------
+    tasks : list
+        The (file, splitting strategy, seed) triples to run. A seed of None runs the solver unseeded.
+    output_directory : str
+        The directory to save the output to.
+    timeout : int
+        The timeout for each instance in seconds. None means no timeout.
+    workers : int
+        The number of tasks to run in parallel, at least 1. Default is 1.
+    memory_limit : int
+        The maximum address space of each worker process in megabytes. None means no limit. Default is None.
+    resume : bool
+        Whether to skip the tasks that already have a result in the checkpoint. Default is False.
+    profile : bool
+        Whether to profile the search of every task, and report the hottest functions at the end. Default is False.
+
+    Returns
+    -------
+    str
+        The file the metrics were written to.
+    '''
+
+    # Without a worker, no task would ever start
+    if workers < 1:
+        raise ValueError(f'At least one worker is needed, not {workers}')
+
+    filename = create_metrics_file(output_directory)
+    run_id = os.path.splitext(os.path.basename(filename))[0]
+
+    profile_directory = None
+    if profile:
+        profile_directory = os.path.join(output_directory, PROFILE_DIRECTORY)
+    checkpoint = Checkpoint(os.path.join(output_directory, CHECKPOINT_FILENAME))
+    store = ResultsStore(os.path.join(output_directory, RESULTS_STORE))
+
+    pending = deque()
+    running = {} # connection -> (process, task, deadline)
+
+    with open(filename, 'a') as f, checkpoint, store:
+        # Copy over the results of the tasks that are already complete
+        for task in tasks:
+            key = get_task_key(task, timeout, memory_limit)
+            if resume and checkpoint.is_complete(key):
+                f.write(format_metrics(checkpoint.get_result(key)))
+            else:
+                pending.append(task)
+        f.flush()
+
+        if resume:
+            print(f'Resuming: {len(tasks) - len(pending)} of {len(tasks)} tasks are already complete.')
+
+        progress = tqdm(total=len(pending))
+        while pending or running:
+            # Start new workers while there is room for them
+            while pending and len(running) < workers:
+                task = pending.popleft()
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=run_benchmark_task, args=(sender, task[0], task[1], timeout, memory_limit, profile_directory, task[2]))
+                process.start()
+                sender.close()
+
+                deadline = None
+                if timeout is not None:
+                    deadline = time.time() + timeout + KILL_GRACE_PERIOD
+                running[receiver] = (process, task, deadline)
+
+            # Collect the workers that finished, or died without sending their metrics
+            for receiver in wait(list(running), timeout=1):
+                process, task, _ = running.pop(receiver)
+                try:
+                    metrics = receiver.recv()
+                except EOFError:
+                    metrics = get_unfinished_metrics(task[0], task[1], timed_out=False, seed=task[2])
+                receiver.close()
+                process.join()
+
+                record_metrics(f, checkpoint, store, task, metrics, run_id, timeout, memory_limit)
+                progress.update()
+
+            # Kill the workers that ran past their deadline
+            now = time.time()
+            for receiver, (process, task, deadline) in list(running.items()):
+                if deadline is None or now < deadline:
+                    continue
+
+                process.kill()
+                process.join()
+                receiver.close()
+                del running[receiver]
+
+                record_metrics(f, checkpoint, store, task, get_unfinished_metrics(task[0], task[1], timed_out=True, seed=task[2]), run_id, timeout, memory_limit)
+                progress.update()
+
+        progress.close()
+
+    if profile:
+        report_profiles(profile_directory)
+
+    return filename
+
+def get_task_key(task, timeout=None, memory_limit=None):
+    '''
+    Get the checkpoint key of a task. The limits are part of the key, so a sweep resumed with a larger timeout or memory
+    limit reruns the tasks that timed out under the old limits.
+
+    Parameters
+    ----------
+    task : tuple
+        The (file, splitting strategy, seed) triple.
+    timeout : int
+        The timeout of the task in seconds. Default is None.
+    memory_limit : int
+        The memory limit of the worker in megabytes. Default is None.
+
+    Returns
+    -------
+    tuple
+        The (file, strategy, solver, seed, config) key of the task.
+    '''
 
-    # Run each file through the algorithm specified, and track the metrics
-    metrics = []
-    for file in tqdm(files):
-        instance_metrics = benchmark_algorithm_on_instance(file, args.splitting_strategy, timeout=args.timeout)
-        metrics.append(instance_metrics)
+    file, splitting_strategy, seed = task
+    return Checkpoint.get_key(file, splitting_strategy, 'CBS', seed, {'timeout': timeout, 'memory_limit': memory_limit})
 
-    # Log the metrics to a file
-    log_metrics(metrics, args.output_directory)
+def record_metrics(f, checkpoint, store, task, metrics, run_id=None, timeout=None, memory_limit=None):
+    '''
+    Append the metrics of a finished task to the output file, the checkpoint and the results store.
+
+    Parameters
+    ----------
+    f : file
+        The open output file.
+    checkpoint : Checkpoint
+        The checkpoint of the sweep.
+    store : ResultsStore
+        The results store of the output directory.
+    task : tuple
+        The (file, splitting strategy, seed) triple that finished.
+    metrics : dict
+        The metrics of the task.
+    run_id : str
+        The name of the sweep. Default is None.
+    timeout : int
+        The timeout of the task in seconds. Default is None.
+    memory_limit : int
+        The memory limit of the worker in megabytes. Default is None.
+
+    Returns
+    -------
+    None
+    '''
+
+    f.write(format_metrics(metrics))
+    f.flush()
+
+    if metrics['Timeout']:
+        status = 'Timeout'
+    elif metrics['Failed']:
+        status = 'Failed'
+    else:
+        status = 'Solved'
+    checkpoint.record(get_task_key(task, timeout, memory_limit), status, metrics)
+    store.append(metrics_to_row(metrics, run_id, solver='CBS', seed=task[2], timeout_limit=timeout))
+
+def run_benchmark_task(connection, file, splitting_strategy, timeout, memory_limit, profile_directory=None, seed=None):
+    '''
+    The entry point of a worker process. Runs a single instance and sends its metrics back to the parent.
+
+    Parameters
+    ----------
+    connection : multiprocessing.connection.Connection
+        The connection to send the metrics through.
+    file : str
+        The file to run the algorithm on.
+    splitting_strategy : str
+        The splitting strategy to use.
+    timeout : int
+        The timeout for the instance in seconds.
+    memory_limit : int
+        The maximum address space of the process in megabytes, or None.
+    profile_directory : str
+        The directory to save the profile of the search to, or None to not profile it. Default is None.
+    seed : int
+        The seed of the solver, or None to leave it unseeded. Default is None.
+
+    Returns
+    -------
+    None
+    '''
+
+    if memory_limit is not None and resource is not None:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    try:
+        metrics = benchmark_algorithm_on_instance(file, splitting_strategy, timeout=timeout, profile_directory=profile_directory, seed=seed)
+    except MemoryError:
+        metrics = get_unfinished_metrics(file, splitting_strategy, timed_out=False, seed=seed)
+
+    connection.send(metrics)
+    connection.close()
+
+def get_unfinished_metrics(file, splitting_strategy, timed_out, seed=None):
+    '''
+    Get the metrics of an instance whose worker was killed or failed before it could report its own metrics.
+
+    Parameters
+    ----------
+    file : str
+        The file the algorithm was run on.
+    splitting_strategy : str
+        The splitting strategy that was used.
+    timed_out : bool
+        Whether the worker was killed for running past its timeout, as opposed to crashing.
+    seed : int
+        The seed of the solver. Default is None.
+
+    Returns
+    -------
+    dict
+        The metrics for the instance.
+    '''
+
+    return {
+        'File': file,
+        'Splitting strategy': splitting_strategy,
+        'HL Nodes expanded': None,
+        'HL Nodes generated': None,
+        'LL Nodes expanded': None,
+        'LL Nodes generated': None,
+        'Total runtime': "Timeout" if timed_out else "Failed",
+        'Solution cost': None,
+        'Timeout': timed_out,
+        'Failed': not timed_out,
+        'Seed': seed
+    }
 
 def get_benchmark_files(instance_type):
     '''
@@ -92,7 +389,7 @@ def get_benchmark_files(instance_type):
 
     return files
 
-def benchmark_algorithm_on_instance(file, splitting_strategy, timeout=60):
+def benchmark_algorithm_on_instance(file, splitting_strategy, timeout=60, profile_directory=None, seed=None):
     '''
     Run the algorithm on the given file and track the metrics. The following metrics will be recorded:
     - HL Nodes expanded
@@ -108,6 +405,12 @@ def benchmark_algorithm_on_instance(file, splitting_strategy, timeout=60):
         The file to run the algorithm on.
     splitting_strategy : str
         The splitting strategy to use.
+    timeout : int
+        The timeout in seconds. Default is 60.
+    profile_directory : str
+        The directory to save the profile of the search to, or None to not profile it. Default is None.
+    seed : int
+        The seed of the solver, or None to leave it unseeded. Default is None.
 
     Returns
     -------
@@ -119,23 +422,24 @@ def benchmark_algorithm_on_instance(file, splitting_strategy, timeout=60):
     map, starts, goals = import_mapf_instance(file)
 
     # Run the algorithm
-    cbs = CBSSolver(map, starts, goals, timeout=timeout)
+    cbs = CBSSolver(map, starts, goals, timeout=timeout, time_phases=True, seed=seed)
 
-    disjoint, tuvya_splitting, imbalanced = False, False, False
-    if splitting_strategy == 'disjoint':
-        disjoint = True
-    elif splitting_strategy == 'tuvya_splitting':
-        tuvya_splitting = True
-    elif splitting_strategy == 'tuvya_splitting_imbalanced':
-        tuvya_splitting = True
-        imbalanced = True
+    disjoint, tuvya_splitting, imbalanced = get_splitting_flags(splitting_strategy)
 
     start_time = time.time()
-    result = cbs.find_solution(disjoint=disjoint, do_tuvya_splitting=tuvya_splitting, balanced_tuvya_splitting=not imbalanced)
+    if profile_directory is None:
+        result = cbs.find_solution(disjoint=disjoint, do_tuvya_splitting=tuvya_splitting, balanced_tuvya_splitting=not imbalanced)
+    else:
+        name = os.path.splitext(os.path.basename(file))[0]
+        name = f'{os.path.basename(os.path.dirname(file))}-{name}-{splitting_strategy}'
+        if seed is not None:
+            name = f'{name}-seed{seed}'
+        result = profile_call(profile_directory, name, cbs.find_solution,
+                              disjoint=disjoint, do_tuvya_splitting=tuvya_splitting, balanced_tuvya_splitting=not imbalanced)
     end_time = time.time()
 
-    # Check if the algorithm timed out
-    if result is None:
+    # Check if the algorithm timed out (or, if it gave up without a solution, treat it as a timeout as well)
+    if result is None or result[0] is None:
         metrics = {
             'File': file,
             'Splitting strategy': splitting_strategy,
@@ -145,8 +449,11 @@ def benchmark_algorithm_on_instance(file, splitting_strategy, timeout=60):
             'LL Nodes generated': cbs.ll_num_of_generated,
             'Total runtime': "Timeout",
             'Solution cost': None,
-            'Timeout': True
+            'Timeout': True,
+            'Failed': False,
+            'Seed': seed
         }
+        metrics.update(get_phase_metrics(cbs))
 
         return metrics
     
@@ -162,11 +469,57 @@ def benchmark_algorithm_on_instance(file, splitting_strategy, timeout=60):
         'LL Nodes generated': cbs.ll_num_of_generated,
         'Total runtime': end_time - start_time,
         'Solution cost': get_sum_of_cost(paths),
-        'Timeout': False
+        'Timeout': False,
+        'Failed': False,
+        'Seed': seed
     }
+    metrics.update(get_phase_metrics(cbs))
 
     return metrics
 
+def get_splitting_flags(splitting_strategy):
+    '''
+    Get the find_solution() flags of a splitting strategy.
+
+    Parameters
+    ----------
+    splitting_strategy : str
+        One of SPLITTING_STRATEGIES.
+
+    Returns
+    -------
+    tuple
+        Whether to use disjoint splitting, whether to use Tuvya splitting and whether the Tuvya splitting is imbalanced.
+    '''
+
+    disjoint, tuvya_splitting, imbalanced = False, False, False
+    if splitting_strategy == 'disjoint':
+        disjoint = True
+    elif splitting_strategy == 'tuvya_splitting':
+        tuvya_splitting = True
+    elif splitting_strategy == 'tuvya_splitting_imbalanced':
+        tuvya_splitting = True
+        imbalanced = True
+
+    return disjoint, tuvya_splitting, imbalanced
+
+def get_phase_metrics(cbs):
+    '''
+    Get the time the solver spent in each phase of the search.
+
+    Parameters
+    ----------
+    cbs : CBSSolver
+        The solver, after it was run with time_phases=True.
+
+    Returns
+    -------
+    dict
+        The time spent in each phase in seconds, keyed by the column names in PHASE_COLUMNS.
+    '''
+
+    return {column: cbs.phase_times[phase] for phase, column in zip(PHASES, PHASE_COLUMNS)}
+
 def log_metrics(metrics, output_directory):
     '''
     Log the metrics to a file.
@@ -183,6 +536,28 @@ def log_metrics(metrics, output_directory):
     None
     '''
 
+    filename = create_metrics_file(output_directory)
+
+    # Write the metrics
+    with open(filename, 'a') as f:
+        for metric in metrics:
+            f.write(format_metrics(metric))
+
+def create_metrics_file(output_directory):
+    '''
+    Create a new metrics file, named after the current date and time, and write the header to it.
+
+    Parameters
+    ----------
+    output_directory : str
+        The directory to save the output to.
+
+    Returns
+    -------
+    str
+        The name of the file.
+    '''
+
     # Attempt to create the output directory if it doesn't exist
     try:
         os.makedirs(output_directory)
@@ -193,66 +568,85 @@ def log_metrics(metrics, output_directory):
     date_time = time.strftime('%m-%d-%Y_%H-%M-%S')
     filename = f'{output_directory}/{date_time}.csv'
 
-    # Write the metrics to the file
     with open(filename, 'w') as f:
-        # First write the header
-        header = 'File,Splitting strategy,HL Nodes expanded,HL Nodes generated,LL Nodes expanded,LL Nodes generated,Total runtime,Solution cost\n'
-        f.write(header)
+        f.write(METRICS_HEADER)
 
-        # Write the metrics
-        for metric in metrics:
-            file = metric['File']
-            splitting_strategy = metric['Splitting strategy']
-            hl_nodes_expanded = metric['HL Nodes expanded']
-            hl_nodes_generated = metric['HL Nodes generated']
-            ll_nodes_expanded = metric['LL Nodes expanded']
-            ll_nodes_generated = metric['LL Nodes generated']
-            total_runtime = metric['Total runtime']
-            solution_cost = metric['Solution cost']
-
-            if metric['Timeout']:
-                f.write(f'{file},{splitting_strategy},{hl_nodes_expanded},{hl_nodes_generated},{ll_nodes_expanded},{ll_nodes_generated},{total_runtime},Timeout\n')
-            else:
-                f.write(f'{file},{splitting_strategy},{hl_nodes_expanded},{hl_nodes_generated},{ll_nodes_expanded},{ll_nodes_generated},{total_runtime},{solution_cost}\n')
+    return filename
 
-def run_full_benchmark():
+def format_metrics(metric):
+    '''
+    Format the metrics of one instance as a line of the metrics file.
+
+    Parameters
+    ----------
+    metric : dict
+        The metrics to format.
+
+    Returns
+    -------
+    str
+        The line, including the trailing newline.
+    '''
+
+    file = metric['File']
+    splitting_strategy = metric['Splitting strategy']
+    hl_nodes_expanded = metric['HL Nodes expanded']
+    hl_nodes_generated = metric['HL Nodes generated']
+    ll_nodes_expanded = metric['LL Nodes expanded']
+    ll_nodes_generated = metric['LL Nodes generated']
+    total_runtime = metric['Total runtime']
+    solution_cost = metric['Solution cost']
+
+    if metric['Timeout']:
+        solution_cost = 'Timeout'
+    elif metric['Failed']:
+        solution_cost = 'Failed'
+
+    # Workers that were killed have no phase times
+    phase_times = ','.join(str(metric.get(column)) for column in PHASE_COLUMNS)
+
+    # Results recorded before the seed was, and unseeded runs, have an empty seed
+    seed = metric.get('Seed')
+    if seed is None:
+        seed = ''
+
+    return f'{file},{splitting_strategy},{hl_nodes_expanded},{hl_nodes_generated},{ll_nodes_expanded},{ll_nodes_generated},{total_runtime},{solution_cost},{phase_times},{seed}\n'
+
+def run_full_benchmark(workers=1, memory_limit=None, resume=False, profile=False, seeds=None):
     '''
     Run the full benchmark specified by Dr. Atzmon. This function will run the benchmark on both empty and 10-percent instances with every splitting strategy.
 
+    Every (instance, splitting strategy) pair is handed to the same pool of workers, so the whole sweep is written to a single file.
+
+    Parameters
+    ----------
+    workers : int
+        The number of instances to run in parallel. Default is 1.
+    memory_limit : int
+        The maximum address space of each worker process in megabytes. None means no limit. Default is None.
+    resume : bool
+        Whether to skip the runs that already have a result from an earlier, interrupted sweep. Default is False.
+    profile : bool
+        Whether to profile every run. Default is False.
+    seeds : list
+        The seeds to run every instance with. Default is None (a single, unseeded run).
+
     Returns
     -------
     None
     '''
 
-    # Run the benchmark on the standard splitting strategy
-    print('Running the benchmark on empty instances with the standard splitting strategy. This may take a while...')
-    run_benchmark_with_these_args('standard', 'empty', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on empty instances with the standard splitting strategy.')
-    run_benchmark_with_these_args('standard', '10-percent', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on 10-percent instances with the standard splitting strategy.')
-
-    # Run the benchmark on the disjoint splitting strategy
-    print('Running the benchmark on empty instances with the disjoint splitting strategy. This may take a while...')
-    run_benchmark_with_these_args('disjoint', 'empty', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on empty instances with the disjoint splitting strategy.')
-    run_benchmark_with_these_args('disjoint', '10-percent', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on 10-percent instances with the disjoint splitting strategy.')
-
-    # Run the benchmark on the tuvya splitting strategy
-    print('Running the benchmark on empty instances with the tuvya splitting strategy. This may take a while...')
-    run_benchmark_with_these_args('tuvya_splitting', 'empty', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on empty instances with the tuvya splitting strategy.')
-    run_benchmark_with_these_args('tuvya_splitting', '10-percent', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on 10-percent instances with the tuvya splitting strategy.')
-
-    # Run the benchmark on the tuvya splitting strategy with imbalanced splitting
-    print('Running the benchmark on empty instances with the tuvya splitting strategy with imbalanced splitting. This may take a while...')
-    run_benchmark_with_these_args('tuvya_splitting_imbalanced', 'empty', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on empty instances with the tuvya splitting strategy with imbalanced splitting.')
-    run_benchmark_with_these_args('tuvya_splitting_imbalanced', '10-percent', 'atzmon_benchmark_results', 60)
-    print('Finished running the benchmark on 10-percent instances with the tuvya splitting strategy with imbalanced splitting.')
-
-def run_benchmark_with_these_args(splitting_strategy, instance_type, output_directory, timeout):
+    files = get_benchmark_files('all')
+    if not seeds:
+        seeds = [None]
+    tasks = [(file, splitting_strategy, seed) for splitting_strategy in SPLITTING_STRATEGIES for file in files for seed in seeds]
+
+    print(f'Running the full benchmark ({len(tasks)} runs on {workers} worker(s)). This may take a while...')
+    filename = run_benchmark_tasks(tasks, 'atzmon_benchmark_results', 60, workers=workers, memory_limit=memory_limit, resume=resume,
+                                   profile=profile)
+    print(f'Finished running the full benchmark. The results were saved to {filename}.')
+
+def run_benchmark_with_these_args(splitting_strategy, instance_type, output_directory, timeout, workers=1, memory_limit=None, resume=False, profile=False, seeds=None):
     '''
     Run the benchmark with the given arguments. This method allows you to run the benchmark with the given arguments
     from a script or another function without having to use the command line.
@@ -267,13 +661,24 @@ def run_benchmark_with_these_args(splitting_strategy, instance_type, output_dire
         The directory to save the output to.
     timeout : int
         The timeout for each instance in seconds.
+    workers : int
+        The number of instances to run in parallel. Default is 1.
+    memory_limit : int
+        The maximum address space of each worker process in megabytes. None means no limit. Default is None.
+    resume : bool
+        Whether to skip the instances that already have a result from an earlier, interrupted run. Default is False.
+    profile : bool
+        Whether to profile every instance. Default is False.
+    seeds : list
+        The seeds to run every instance with. Default is None (a single, unseeded run).
 
     Returns
     -------
     None
     '''
 
-    args = argparse.Namespace(splitting_strategy=splitting_strategy, instance_type=instance_type, output_directory=output_directory, timeout=timeout)
+    args = argparse.Namespace(splitting_strategy=splitting_strategy, instance_type=instance_type, output_directory=output_directory, timeout=timeout,
+                              workers=workers, memory_limit=memory_limit, resume=resume, profile=profile, seeds=seeds)
     do_benchmark(args)
 
 if __name__ == '__main__':
@@ -284,11 +689,19 @@ if __name__ == '__main__':
     parser.add_argument('--output_directory', '-o', type=str, default='atzmon_benchmark_results', help='The directory to save the output to. Default is "atzmon_benchmark_results".')
     parser.add_argument('--timeout', '-t', type=int, default=60, help='The timeout for each instance in seconds. Default is 60 seconds.')
     parser.add_argument('--run_full_benchmark', action='store_true', help='Run the full benchmark specified by Dr. Atzmon. This will run the benchmark on both empty and 10-percent instances with every splitting strategy.')
+    parser.add_argument('--workers', '-w', type=int, default=1, help='The number of instances to run in parallel, each in its own process. Default is 1.')
+    parser.add_argument('--memory_limit', type=int, default=None, help='The maximum address space of each worker process in megabytes. Default is no limit.')
+    parser.add_argument('--resume', action='store_true', help='Skip the instances that already have a result in the checkpoint of the output directory under the same timeout and memory limit, and rerun only the missing or failed ones.')
+    parser.add_argument('--profile', action='store_true', help='Profile the search of every instance. The .prof files and collapsed stacks are saved in the profiles/ subdirectory of the output directory.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None, help='Run every instance once per seed, with the solver seeded. The seed is recorded with every result. Default is a single, unseeded run.')
 
     args = parser.parse_args()
 
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
     if args.run_full_benchmark:
-        run_full_benchmark()
+        run_full_benchmark(args.workers, args.memory_limit, args.resume, args.profile, args.seeds)
         exit()
 
     do_benchmark(args)
\ No newline at end of file
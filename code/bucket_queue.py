@@ -0,0 +1,163 @@
+'''
+This file contains a bucketed priority queue for the open lists of the solvers. The costs used by the searches
+(sum of costs in the high-level search, f-values in the low-level search) are small integers, so nodes can be
+kept in buckets keyed by their priority instead of in a binary heap. This avoids the tuple comparisons of heapq,
+which fall back to comparing the nodes themselves when all earlier fields tie.
+
+Classes
+-------
+BucketQueue
+    A two-level bucket priority queue with insertion-order tie-breaking.
+'''
+
+from collections import deque
+
+
+class BucketQueue(object):
+    '''
+    A priority queue ordered by an integer primary priority, then an integer secondary priority, then insertion order.
+
+    Entries are stored as (primary, secondary, id, item) tuples so that pop() returns the same tuples that
+    were previously pushed onto the heap-based open lists. Only the integer keys are ever compared.
+
+    Push is O(1). Pop is O(1) amortized: the smallest non-empty bucket is found by scanning upwards from the
+    previous minimum, which only moves over the (small) gaps between the integer priorities in use.
+    '''
+
+    def __init__(self):
+        # primary -> {secondary -> deque of entries}
+        self.buckets = dict()
+
+        # The smallest primary priority in use, and the smallest secondary priority in use for each primary
+        self.min_primary = None
+        self.min_secondary = dict()
+
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, primary, secondary, id, item):
+        '''
+        Add an item to the queue.
+
+        Parameters
+        ----------
+        primary : int
+            The primary priority of the item (lower is popped first).
+        secondary : int
+            The secondary priority of the item, used to break ties in the primary priority.
+        id : int
+            An identifier for the item, returned together with it by pop().
+        item : object
+            The item to store.
+
+        Returns
+        -------
+        None
+        '''
+
+        bucket = self.buckets.get(primary)
+        if bucket is None:
+            bucket = dict()
+            self.buckets[primary] = bucket
+            self.min_secondary[primary] = secondary
+            if self.min_primary is None or primary < self.min_primary:
+                self.min_primary = primary
+        elif secondary < self.min_secondary[primary]:
+            self.min_secondary[primary] = secondary
+
+        entries = bucket.get(secondary)
+        if entries is None:
+            entries = deque()
+            bucket[secondary] = entries
+
+        entries.append((primary, secondary, id, item))
+        self.size += 1
+
+    def pop(self):
+        '''
+        Remove and return the entry with the lowest priority. Ties are broken in insertion order.
+
+        Returns
+        -------
+        tuple
+            The (primary, secondary, id, item) entry that was pushed.
+        '''
+
+        if self.size == 0:
+            raise IndexError('pop from an empty bucket queue')
+
+        primary = self.min_primary
+        bucket = self.buckets[primary]
+        secondary = self.min_secondary[primary]
+        entries = bucket[secondary]
+
+        entry = entries.popleft()
+        self.size -= 1
+
+        if not entries:
+            del bucket[secondary]
+
+            if bucket:
+                # Advance to the next secondary priority in use
+                while secondary not in bucket:
+                    secondary += 1
+                self.min_secondary[primary] = secondary
+            else:
+                del self.buckets[primary]
+                del self.min_secondary[primary]
+
+                # Advance to the next primary priority in use
+                if self.buckets:
+                    while primary not in self.buckets:
+                        primary += 1
+                    self.min_primary = primary
+                else:
+                    self.min_primary = None
+
+        return entry
+
+    def min_priority(self):
+        '''
+        Returns the lowest primary priority in the queue, or None if the queue is empty.
+        '''
+
+        return self.min_primary
+
+    def prune(self, bound):
+        '''
+        Remove every item whose primary priority exceeds the given bound.
+
+        Parameters
+        ----------
+        bound : int
+            The largest primary priority to keep.
+
+        Returns
+        -------
+        int
+            The number of items removed.
+        '''
+
+        removed = 0
+        for primary in [p for p in self.buckets if p > bound]:
+            removed += sum(len(entries) for entries in self.buckets[primary].values())
+            del self.buckets[primary]
+            del self.min_secondary[primary]
+
+        self.size -= removed
+        if not self.buckets:
+            self.min_primary = None
+
+        return removed
+
+    def clear(self):
+        '''
+        Remove every item from the queue.
+        '''
+
+        self.buckets.clear()
+        self.min_secondary.clear()
+        self.min_primary = None
+        self.size = 0
@@ -0,0 +1,219 @@
+'''
+This file contains the resource budget shared by the high-level solvers and the low-level searches. A budget limits
+the wall time, the number of high-level nodes, the number of low-level nodes and the resident memory of a run. The
+solvers check it once per high-level iteration and the low-level searches once per expansion, so a run stops soon
+after any limit is reached, even in the middle of a long low-level search.
+
+When a limit is reached, BudgetExhausted is raised. The @budgeted decorator on find_solution() catches it and makes
+the solver return (None, num_of_generated, num_of_expanded), with the reason and the partial statistics stored in
+solver.budget_report.
+
+Classes
+-------
+Budget
+    The limits of a run and the resources used so far.
+BudgetExhausted
+    Raised when a limit of the budget is reached.
+
+Functions
+---------
+budgeted()
+    Decorator for the find_solution() method of a solver.
+'''
+
+import functools
+import os
+import time as timer
+
+try:
+    import psutil
+except ImportError: # optional, only needed where /proc is not available
+    psutil = None
+
+# The file the current resident set size is read from on Linux
+STATM_FILE = '/proc/self/statm'
+
+# The number of high-level nodes the ICBS-family solvers used to stop at
+DEFAULT_MAX_HL_NODES = 50000
+
+# The time and memory limits are only checked every this many low-level expansions
+LL_CHECK_INTERVAL = 64
+
+
+class BudgetExhausted(Exception):
+    '''
+    Raised when a limit of the budget is reached. The reason is one of "wall_time", "hl_nodes", "ll_nodes" or "rss_bytes".
+    '''
+
+    def __init__(self, reason):
+        super().__init__('Budget exhausted: ' + reason)
+        self.reason = reason
+
+
+class Budget(object):
+    '''
+    The limits of a run, and the resources used so far. A limit of None means no limit.
+
+    A budget is stateful (it tracks the start time and the low-level nodes used), so every solver needs its own.
+    '''
+
+    def __init__(self, wall_time=None, hl_nodes=None, ll_nodes=None, rss_bytes=None):
+        '''
+        Parameters
+        ----------
+        wall_time : float
+            The maximum wall time in seconds, counted from the call to find_solution().
+        hl_nodes : int
+            The maximum number of high-level nodes generated.
+        ll_nodes : int
+            The maximum number of low-level nodes expanded, over all low-level searches.
+        rss_bytes : int
+            The maximum current resident set size of the process in bytes. Memory freed by earlier runs in the same
+            process doesn't count against it.
+        '''
+
+        if rss_bytes is not None and get_rss() is None:
+            raise ValueError('Memory budgets are not supported on this platform')
+
+        self.wall_time = wall_time
+        self.hl_nodes = hl_nodes
+        self.ll_nodes = ll_nodes
+        self.rss_bytes = rss_bytes
+
+        self.start_time = timer.time()
+        self.ll_nodes_used = 0
+
+    def start(self):
+        '''
+        Start counting the wall time and the low-level nodes from zero.
+        '''
+
+        self.start_time = timer.time()
+        self.ll_nodes_used = 0
+
+    def check(self, hl_nodes=None):
+        '''
+        Check every limit of the budget. Called once per high-level iteration.
+
+        Parameters
+        ----------
+        hl_nodes : int
+            The number of high-level nodes generated so far, or None to skip the high-level node limit.
+
+        Raises
+        ------
+        BudgetExhausted
+            If a limit has been reached.
+        '''
+
+        if self.hl_nodes is not None and hl_nodes is not None and hl_nodes > self.hl_nodes:
+            raise BudgetExhausted('hl_nodes')
+
+        if self.ll_nodes is not None and self.ll_nodes_used > self.ll_nodes:
+            raise BudgetExhausted('ll_nodes')
+
+        self.check_time_and_memory()
+
+    def expand_ll(self):
+        '''
+        Count one low-level expansion and check the budget. Called once per low-level expansion, so the time and
+        memory limits are only checked every LL_CHECK_INTERVAL calls.
+
+        Raises
+        ------
+        BudgetExhausted
+            If a limit has been reached.
+        '''
+
+        self.ll_nodes_used += 1
+
+        if self.ll_nodes is not None and self.ll_nodes_used > self.ll_nodes:
+            raise BudgetExhausted('ll_nodes')
+
+        if self.ll_nodes_used % LL_CHECK_INTERVAL == 0:
+            self.check_time_and_memory()
+
+    def check_time_and_memory(self):
+        if self.wall_time is not None and timer.time() - self.start_time > self.wall_time:
+            raise BudgetExhausted('wall_time')
+
+        if self.rss_bytes is not None and get_rss() > self.rss_bytes:
+            raise BudgetExhausted('rss_bytes')
+
+    def elapsed(self):
+        '''
+        Returns the wall time in seconds since the budget was started.
+        '''
+
+        return timer.time() - self.start_time
+
+    def report(self, reason, hl_generated, hl_expanded):
+        '''
+        Get the statistics of a run that used this budget.
+
+        Parameters
+        ----------
+        reason : str
+            The limit that was reached, or None if the run finished within the budget.
+        hl_generated : int
+            The number of high-level nodes generated.
+        hl_expanded : int
+            The number of high-level nodes expanded.
+
+        Returns
+        -------
+        dict
+            The report, with keys "exhausted", "reason", "wall_time", "hl_generated", "hl_expanded" and "ll_expanded".
+        '''
+
+        return {
+            'exhausted': reason is not None,
+            'reason': reason,
+            'wall_time': self.elapsed(),
+            'hl_generated': hl_generated,
+            'hl_expanded': hl_expanded,
+            'll_expanded': self.ll_nodes_used
+        }
+
+
+def get_rss():
+    '''
+    Returns the current resident set size of the process in bytes, or None if it can't be measured on this platform.
+    '''
+
+    # The second field of statm is the resident set size in pages
+    if os.path.exists(STATM_FILE):
+        with open(STATM_FILE) as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+
+    return None
+
+
+def budgeted(find_solution):
+    '''
+    Decorator for the find_solution() method of a solver. The solver must have `budget`, `num_of_generated` and
+    `num_of_expanded` attributes.
+
+    Starts the budget when the search starts. If the budget runs out, the search is stopped and
+    (None, num_of_generated, num_of_expanded) is returned, or (incumbent, ...) if the solver has an `incumbent`
+    solution from before the search (e.g. CBS with a warm start). Either way, the statistics of the run are stored in
+    solver.budget_report.
+    '''
+
+    @functools.wraps(find_solution)
+    def wrapper(self, *args, **kwargs):
+        self.budget.start()
+
+        try:
+            result = find_solution(self, *args, **kwargs)
+        except BudgetExhausted as e:
+            self.budget_report = self.budget.report(e.reason, self.num_of_generated, self.num_of_expanded)
+            return getattr(self, 'incumbent', None), self.num_of_generated, self.num_of_expanded
+
+        self.budget_report = self.budget.report(None, self.num_of_generated, self.num_of_expanded)
+        return result
+
+    return wrapper
@@ -1,11 +1,22 @@
 import time as timer
-import heapq
 import random
+from functools import partial
 
 from a_star_class import A_Star, get_location, get_sum_of_cost, compute_heuristics
+from bucket_queue import BucketQueue
+from budget import Budget, budgeted
+from group_partition import GEOMETRIC_POLICIES, GroupPartitioner
+from phase_timer import PhaseTimer
+from prioritized import plan_prioritized
 
 DEBUG = False
 
+# The ways Tuvya splitting can divide the agents into two groups (see get_tuvya_splitting())
+PARTITION_POLICIES = ['random', 'imbalanced'] + GEOMETRIC_POLICIES
+
+# The number of random orderings prioritized planning tries when warm-starting CBS (see CBSSolver.find_incumbent())
+WARM_START_ORDERINGS = 4
+
 def detect_collision(path1, path2):
     ##############################
     # Task 3.1: Return the first collision that occurs between two robot paths (or None if there is no collision)
@@ -82,12 +93,13 @@ def standard_splitting(collision):
                             })
     return constraints
 
-def disjoint_splitting(collision):
+def disjoint_splitting(collision, rng = random):
     '''
     Create constraints based on a collision using disjoint splitting.
 
     Parameters:
         collision (dict): The collision to resolve.
+        rng (random.Random): The random number generator that chooses the agent. Default is the random module.
 
     Returns:
         list: A list of constraints to resolve the collision.
@@ -104,7 +116,7 @@ def disjoint_splitting(collision):
     constraints = []
 
     # Choose an agent randomly. (This code will assign either "a1" or "a2" to the variable "a")
-    agent = random.randint(0,1)
+    agent = rng.randint(0,1)
     a = 'a' + str(agent + 1)
 
     if len(collision['loc']) == 1: # If the length of the location is 1, it is a vertex collision
@@ -148,7 +160,7 @@ def disjoint_splitting(collision):
             
     return constraints
 
-def get_tuvya_splitting(num_agents, balanced = True):
+def get_tuvya_splitting(num_agents, balanced = True, partition_policy = None, my_map = None, starts = None, rng = random):
     '''
     Returns a function that creates constraints based on a collision using Tuvya's splitting.
 
@@ -156,20 +168,37 @@ def get_tuvya_splitting(num_agents, balanced = True):
         num_agents (int): The number of agents in the problem. This is needed information for Tuvya splitting.
         balanced (bool): Whether to split the agents into two groups of equal size or not. If not,
         then one group will only have one agent and the other group will have the rest of the agents. Default is True.
+        partition_policy (str): How to divide the agents into the two groups, one of PARTITION_POLICIES. If None,
+        "random" is used if balanced is True and "imbalanced" otherwise. The geometry-aware policies (see
+        group_partition.py) need my_map and starts.
+        my_map (list): The map. Default is None.
+        starts (list): The start locations of the agents. Default is None.
+        rng (random.Random): The random number generator that divides the agents. Default is the random module.
 
     Returns:
         function: A function that creates constraints based on a collision using Tuvya's splitting.
     '''
 
-    def tuvya_splitting(collision):
+    if partition_policy is None:
+        partition_policy = 'random' if balanced else 'imbalanced'
+    if partition_policy not in PARTITION_POLICIES:
+        raise ValueError(f'Unknown partition policy: {partition_policy}')
+
+    partitioner = None
+    if partition_policy in GEOMETRIC_POLICIES:
+        partitioner = GroupPartitioner(my_map, starts, partition_policy, rng=rng)
+
+    def tuvya_splitting(collision, paths = None):
         '''
         Create constraints based on a collision using Tuvya's splitting.
 
         Parameters:
             collision (dict): The collision to resolve.
+            paths (list): The paths of the node being split. Needed by the spatial and path_overlap policies.
 
         Returns:
-            list[dict], list[dict]: Two lists of constraints to resolve the collision.
+            list[dict], list[dict]: Two lists of constraints to resolve the collision. Each holds a single group
+            constraint, {agents, loc, timestep, positive}, that applies to every agent of the group.
         '''
 
         constraints = [[], []]
@@ -179,58 +208,45 @@ def get_tuvya_splitting(num_agents, balanced = True):
         agent2 = collision['a2']
 
         # Divide the agents into two groups
-        group1, group2 = divide_agents(agent1, agent2, num_agents, balanced)
+        if partitioner is None:
+            group1, group2 = divide_agents(agent1, agent2, num_agents, partition_policy == 'random', rng)
+        else:
+            group1, group2 = partitioner.divide(collision, paths)
+
+        # The edge constraints of group1 are oriented as agent1 traverses the edge, so group1 must contain agent1
+        if agent1 not in group1:
+            group1, group2 = group2, group1
 
         # Print the groups of agents
         # print('Group 1:', group1)
         # print('Group 2:', group2)
 
-        # Create constraints
+        # Create one group constraint for each group
         if len(collision['loc']) == 1: # aka vertex collision
-
-            # Add the constraints for group1
-            for agent in group1:
-                constraints[0].append({
-                    'agent': agent,
-                    'loc': collision['loc'],
-                    'timestep': collision['timestep'],
-                    'positive': False
-                })
-
-            # Add the constraints for group2
-            for agent in group2:
-                constraints[1].append({
-                    'agent': agent,
-                    'loc': collision['loc'],
-                    'timestep': collision['timestep'],
-                    'positive': False
-                })
-
-        else: # aka edge collision
-
-            # Add the constraints for group1
-            for agent in group1:
-                constraints[0].append({
-                    'agent': agent,
-                    'loc': [collision['loc'][0], collision['loc'][1]], # The location of the edge has two points
-                    'timestep': collision['timestep'],
-                    'positive': False
-                })
-
-            # Add the constraints for group2
-            for agent in group2:
-                constraints[1].append({
-                    'agent': agent,
-                    'loc': [collision['loc'][1], collision['loc'][0]], # The location of the edge has two points
-                    'timestep': collision['timestep'],
-                    'positive': False
-                })
+            loc1 = collision['loc']
+            loc2 = collision['loc']
+        else: # aka edge collision, the location of the edge has two points
+            loc1 = [collision['loc'][0], collision['loc'][1]]
+            loc2 = [collision['loc'][1], collision['loc'][0]]
+
+        constraints[0].append({
+            'agents': frozenset(group1),
+            'loc': loc1,
+            'timestep': collision['timestep'],
+            'positive': False
+        })
+        constraints[1].append({
+            'agents': frozenset(group2),
+            'loc': loc2,
+            'timestep': collision['timestep'],
+            'positive': False
+        })
 
         return constraints
 
     return tuvya_splitting
 
-def divide_agents(a1, a2, num_agents, balanced=True):
+def divide_agents(a1, a2, num_agents, balanced=True, rng=random):
     '''
     Divides the agents into two groups for Tuvya splitting.
 
@@ -239,6 +255,7 @@ def divide_agents(a1, a2, num_agents, balanced=True):
         a2 (int): The second agent involved in the collision.
         num_agents (int): The total number of agents.
         balanced (bool): Whether to split the agents into two groups of equal size or not. Default is True.
+        rng (random.Random): The random number generator that divides the agents. Default is the random module.
 
     Returns:
         list[int], list[int]: Two lists of agents.
@@ -250,7 +267,7 @@ def divide_agents(a1, a2, num_agents, balanced=True):
     if balanced:
         # Split the rest of the agents into two groups
         all_other_agents = [i for i in range(num_agents) if i != a1 and i != a2]
-        random.shuffle(all_other_agents)
+        rng.shuffle(all_other_agents)
         group1 = all_other_agents[:num_agents // 2]
         group2 = all_other_agents[num_agents // 2:]
 
@@ -262,7 +279,7 @@ def divide_agents(a1, a2, num_agents, balanced=True):
     
     else:
         # Choose one agent randomly to be alone and the rest will be in the other group
-        lone_agent = random.choice([a1, a2])
+        lone_agent = rng.choice([a1, a2])
 
         # Split the rest of the agents into two groups
         other_agents = [i for i in range(num_agents) if i != lone_agent]
@@ -270,6 +287,109 @@ def divide_agents(a1, a2, num_agents, balanced=True):
         return [lone_agent], other_agents
 
 
+def get_constraint_agents(constraint):
+    '''
+    Returns the agents a constraint applies to.
+
+    Parameters:
+        constraint (dict): The constraint, or a group constraint (Tuvya splitting) with the set of its agents in "agents".
+
+    Returns:
+        collection: The agents of the constraint.
+    '''
+
+    if 'agents' in constraint:
+        return constraint['agents']
+    return [constraint['agent']]
+
+def get_constraint_key(constraint):
+    '''
+    Returns a canonical, hashable representation of a constraint.
+
+    Parameters:
+        constraint (dict): The constraint.
+
+    Returns:
+        tuple: The agent (or the frozenset of agents of a group constraint), location, timestep and sign of the constraint.
+    '''
+
+    agent = constraint['agents'] if 'agents' in constraint else constraint['agent']
+    return (agent, tuple(constraint['loc']), constraint['timestep'], constraint['positive'])
+
+def update_constraint_hash(constraint_hash, constraint_keys, new_constraints):
+    '''
+    Incrementally updates the hash of a constraint set. The hash of a set is the XOR of the hashes of its
+    constraints, so it does not depend on the order in which the constraints were added. Only the new constraints
+    are hashed, so the cost does not grow with the size of the set.
+
+    Parameters:
+        constraint_hash (int): The hash of the existing constraint set.
+        constraint_keys (frozenset): The keys (see get_constraint_key()) of the existing constraint set.
+        new_constraints (list[dict]): The constraints being added to the set.
+
+    Returns:
+        int: The hash of the combined constraint set.
+    '''
+
+    added_keys = set()
+    for constraint in new_constraints:
+        key = get_constraint_key(constraint)
+
+        # Constraints that are already in the set must not be hashed twice
+        if key in constraint_keys or key in added_keys:
+            continue
+
+        added_keys.add(key)
+        constraint_hash ^= hash(key)
+
+    return constraint_hash
+
+def combine_constraints(constraints, constraint_keys, new_constraints):
+    '''
+    Adds new constraints to a constraint set, skipping those that are already in it.
+
+    Parameters:
+        constraints (list[dict]): The existing constraint set. It is not modified, so it can stay shared with the parent.
+        constraint_keys (frozenset): The keys (see get_constraint_key()) of the existing constraint set.
+        new_constraints (list[dict]): The constraints being added to the set.
+
+    Returns:
+        list[dict]: The combined constraint set, the new constraints first.
+        frozenset: The keys of the combined constraint set.
+    '''
+
+    added = []
+    added_keys = set()
+    for constraint in new_constraints:
+        key = get_constraint_key(constraint)
+        if key in constraint_keys or key in added_keys:
+            continue
+        added.append(constraint)
+        added_keys.add(key)
+
+    return added + constraints, constraint_keys.union(added_keys)
+
+
+def path_matches_constraint(path, constraint):
+    '''
+    Returns True if a path is at the location (vertex constraint) or traverses the edge (edge constraint) of a
+    constraint at its timestep.
+
+    Parameters:
+        path (list): The path of the agent.
+        constraint (dict): The constraint.
+
+    Returns:
+        bool: Whether the path matches the constraint. A path violates a positive constraint that it doesn't match,
+        and a negative constraint that it matches.
+    '''
+
+    timestep = constraint['timestep']
+    if len(constraint['loc']) == 1:
+        return get_location(path, timestep) == constraint['loc'][0]
+    return [get_location(path, timestep - 1), get_location(path, timestep)] == list(constraint['loc'])
+
+
 def paths_violate_constraint(constraint, paths):
     assert constraint['positive'] is True
     rst = []
@@ -291,12 +411,16 @@ def paths_violate_constraint(constraint, paths):
 class CBSSolver(object):
     """The high-level search of CBS."""
 
-    def __init__(self, my_map, starts, goals, timeout = None):
+    def __init__(self, my_map, starts, goals, timeout = None, budget = None, time_phases = False, heuristics = None, seed = None):
         """
         my_map   - list of lists specifying obstacle positions
         starts      - [(x1, y1), (x2, y2), ...] list of start locations
         goals       - [(x1, y1), (x2, y2), ...] list of goal locations
         timeout     - timeout for the algorithm counted in seconds
+        budget      - Budget limiting the search. If None, a budget with the given timeout is used
+        time_phases - whether to measure the time spent in each phase of the search (see self.phase_times)
+        heuristics  - precomputed heuristic tables of the agents, in the order of the goals. If None, they are computed
+        seed        - seed of the random number generator of the splitters. If None, they use the random module
         """
 
         self.my_map = my_map
@@ -304,36 +428,252 @@ class CBSSolver(object):
         self.goals = goals
         self.num_of_agents = len(goals)
 
-        self.timeout = timeout
+        # The splitters draw from their own generator, so a seeded run can be reproduced
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(seed)
+
+        if budget is None:
+            budget = Budget(wall_time=timeout)
+        self.budget = budget
+        self.budget_report = None
 
         # Variables to track the low-level search
         self.ll_num_of_generated = 0
         self.ll_num_of_expanded = 0
+        self.ll_num_of_pruned = 0 # children the low-level searches skipped for exceeding their cost or time bound
+        self.ll_num_of_collapsed = 0 # children the low-level searches dropped as revisits after the last constraint
 
         self.num_of_generated = 0
         self.num_of_expanded = 0
+        self.num_of_pushed = 0 # unique tie-breaker for the open list
         self.CPU_time = 0
 
-        self.open_list = []
+        self.open_list = BucketQueue()
 
-        # compute heuristics for the low-level search
-        self.heuristics = []
-        for goal in self.goals:
-            self.heuristics.append(compute_heuristics(my_map, goal))
+        # Constraint sets that were already generated, keyed by their hash
+        self.seen_constraint_sets = dict()
+        self.num_of_duplicates = 0
+
+        # The best solution known before the search (see find_incumbent()), and the nodes pruned because they can't
+        # beat it
+        self.incumbent = None
+        self.incumbent_cost = None
+        self.num_of_pruned = 0
+
+        # Time spent in each phase of the search, in seconds
+        self.phase_timer = PhaseTimer(time_phases)
+        self.phase_times = self.phase_timer.times
 
-    def push_node(self, node):
-        heapq.heappush(self.open_list, (node['cost'], len(node['collisions']), self.num_of_generated, node))
+        # compute heuristics for the low-level search
+        self.heuristics = heuristics
+        if self.heuristics is None:
+            self.heuristics = []
+            with self.phase_timer.phase('heuristics'):
+                for goal in self.goals:
+                    self.heuristics.append(compute_heuristics(my_map, goal))
+
+    def push_node(self, node, reinsert=False):
+        # The solutions below a node cost at least as much as the node, so a node that can't beat the incumbent is dropped
+        if self.incumbent_cost is not None and node['cost'] >= self.incumbent_cost:
+            self.num_of_pruned += 1
+            return
+
+        self.open_list.push(node['cost'], len(node['collisions']), self.num_of_pushed, node)
         # print("Generate node {}".format(self.num_of_generated))
-        self.num_of_generated += 1
+        self.num_of_pushed += 1
+
+        # A lazy node that is put back after its evaluation was already counted when it was generated
+        if not reinsert:
+            self.num_of_generated += 1
 
     def pop_node(self):
-        _, _, id, node = heapq.heappop(self.open_list)
+        _, _, id, node = self.open_list.pop()
         # print("Expand node {}".format(id))
         self.num_of_expanded += 1
         return node
 
+    def is_duplicate(self, constraint_hash, constraint_keys, new_constraints):
+        '''
+        Check if a child with the given constraint set was already generated, and remember it otherwise.
+
+        Parameters:
+            constraint_hash (int): The hash of the child's constraint set.
+            constraint_keys (frozenset): The constraint keys of the parent node.
+            new_constraints (list[dict]): The constraints added to the child by the splitter.
+
+        Returns:
+            bool: True if an identical constraint set was already generated.
+        '''
+
+        if constraint_hash not in self.seen_constraint_sets:
+            self.seen_constraint_sets[constraint_hash] = (constraint_keys, new_constraints)
+            return False
+
+        # Compare the actual constraint sets, since different sets can share a hash
+        seen_keys, seen_new_constraints = self.seen_constraint_sets[constraint_hash]
+        seen_keys = seen_keys.union(get_constraint_key(c) for c in seen_new_constraints)
+        keys = constraint_keys.union(get_constraint_key(c) for c in new_constraints)
+        return seen_keys == keys
+
+    def find_path(self, agent, constraints, max_cost=None):
+        '''
+        Run the low-level search for a single agent and track its metrics.
+
+        Parameters:
+            agent (int): The agent to find a path for.
+            constraints (list[dict]): The constraints the path must satisfy.
+            max_cost (int): The largest cost of a path that is of use (see get_max_cost()). Default is None (no bound).
+
+        Returns:
+            list: The path of the agent, or None if no path exists (within max_cost).
+        '''
+
+        with self.phase_timer.phase('low_level_search'):
+            astar = A_Star(self.my_map, self.starts, self.goals, self.heuristics, agent, constraints, budget=self.budget, max_cost=max_cost)
+            path = astar.find_paths()
+
+        # Adjust the metrics for tracking the low-level search
+        self.ll_num_of_generated += astar.num_generated
+        self.ll_num_of_expanded += astar.num_expanded
+        self.ll_num_of_pruned += astar.num_pruned
+        self.ll_num_of_collapsed += astar.num_collapsed
+
+        if path is None:
+            return None
+        return path[0]
+
+    def get_max_cost(self, paths, agent):
+        '''
+        Get the largest cost of a new path of an agent with which a node could still beat the incumbent.
+
+        Parameters:
+            paths (list): The paths of the node.
+            agent (int): The agent being replanned.
+
+        Returns:
+            int: The largest cost, or None if there is no incumbent.
+        '''
+
+        if self.incumbent_cost is None:
+            return None
+        return self.incumbent_cost - 1 - (get_sum_of_cost(paths) - (len(paths[agent]) - 1))
 
-    def find_solution(self, disjoint, do_tuvya_splitting = False, balanced_tuvya_splitting = True, print_results=False) -> tuple[list, int, int]:
+    def find_incumbent(self, num_of_orderings=WARM_START_ORDERINGS):
+        '''
+        Run prioritized planning with random orderings of the agents, and keep the cheapest collision-free solution
+        as the incumbent. The low-level searches are charged to the budget of the solver.
+
+        Parameters:
+            num_of_orderings (int): The number of orderings to try. Default is WARM_START_ORDERINGS.
+
+        Returns:
+            int: The cost of the incumbent, or None if no ordering gave a collision-free solution.
+        '''
+
+        order = list(range(self.num_of_agents))
+        for _ in range(num_of_orderings):
+            self.rng.shuffle(order)
+
+            with self.phase_timer.phase('low_level_search'):
+                paths, num_generated, num_expanded = plan_prioritized(self.my_map, self.starts, self.goals, self.heuristics, order, self.budget)
+            self.ll_num_of_generated += num_generated
+            self.ll_num_of_expanded += num_expanded
+
+            if paths is None or detect_collisions(paths):
+                continue
+
+            cost = get_sum_of_cost(paths)
+            if self.incumbent_cost is None or cost < self.incumbent_cost:
+                self.incumbent = paths
+                self.incumbent_cost = cost
+
+        return self.incumbent_cost
+
+    def generate_child(self, parent_constraints, parent_keys, parent_paths, new_constraints, constraint_hash, group_splitting=False):
+        '''
+        Create a child node by adding new constraints to those of the parent and replanning the affected agents.
+
+        Parameters:
+            parent_constraints (list[dict]): The constraints of the parent node.
+            parent_keys (frozenset): The constraint keys of the parent node.
+            parent_paths (list): The paths of the parent node.
+            new_constraints (list[dict]): The constraints added to the child by the splitter.
+            constraint_hash (int): The hash of the child's constraint set.
+            group_splitting (bool): Whether the new constraints constrain a group of agents (Tuvya splitting). Only the
+                agents of the group whose paths violate them are then replanned: the paths of the others satisfy them
+                and stay optimal. Default is False.
+
+        Returns:
+            dict: The child node, or None if an agent has no path under the child's constraints.
+        '''
+
+        with self.phase_timer.phase('node_copying'):
+            q = {'cost': 0,
+                 'constraints': None,
+                 'constraint_keys': None,
+                 'constraint_hash': constraint_hash,
+                 'paths': list(parent_paths),
+                 'collisions': [],
+                 'pending': None
+            }
+
+        # Copy the constraints from the parent node
+        with self.phase_timer.phase('constraint_combination'):
+            q['constraints'], q['constraint_keys'] = combine_constraints(parent_constraints, parent_keys, new_constraints)
+
+        if group_splitting:
+            agents = [agent for constraint in new_constraints for agent in get_constraint_agents(constraint)
+                      if path_matches_constraint(parent_paths[agent], constraint) != constraint['positive']]
+        else:
+            agents = [constraint['agent'] for constraint in new_constraints]
+
+        # Find a new path for every affected agent
+        for a in agents:
+            path = self.find_path(a, q['constraints'], self.get_max_cost(q['paths'], a))
+            if path is None:
+                return None
+            q['paths'][a] = path
+
+        # Agents that violate a positive constraint have to be replanned as well
+        for constraint in new_constraints:
+            if not constraint['positive']:
+                continue
+            for v in paths_violate_constraint(constraint, q['paths']):
+                path_v = self.find_path(v, q['constraints'], self.get_max_cost(q['paths'], v))
+                if path_v is None:
+                    return None
+                q['paths'][v] = path_v
+
+        with self.phase_timer.phase('collision_detection'):
+            q['collisions'] = detect_collisions(q['paths'])
+        q['cost'] = get_sum_of_cost(q['paths'])
+        return q
+
+    def generate_lazy_child(self, parent, new_constraints, constraint_hash):
+        '''
+        Create a child node whose low-level search is deferred until it is popped from the open list.
+        The node is queued with the cost of its parent, which is a lower bound on its real cost.
+
+        Parameters:
+            parent (dict): The node being expanded.
+            new_constraints (list[dict]): The constraints added to the child by the splitter.
+            constraint_hash (int): The hash of the child's constraint set.
+
+        Returns:
+            dict: The unevaluated child node.
+        '''
+
+        return {'cost': parent['cost'],
+                'constraints': parent['constraints'],
+                'constraint_keys': parent['constraint_keys'],
+                'constraint_hash': constraint_hash,
+                'paths': parent['paths'],
+                'collisions': parent['collisions'],
+                'pending': new_constraints
+        }
+
+    @budgeted
+    def find_solution(self, disjoint, do_tuvya_splitting = False, balanced_tuvya_splitting = True, print_results=False, lazy=False, detect_duplicates=True, partition_policy=None, warm_start=False) -> tuple[list, int, int]:
         """
         Finds paths for all agents from their start locations to their goal locations
 
@@ -342,9 +682,17 @@ class CBSSolver(object):
             do_tuvya_splitting (bool): Whether to use Tuvya's splitting or not
             balanced_tuvya_splitting (bool): Whether to split the agents into two groups of equal size or not. Default is True.
             print_results (bool): Whether to print the results or not. Default is False.
+            lazy (bool): Whether to defer the low-level search of a child until it is popped from the open list. Default is False.
+            detect_duplicates (bool): Whether to drop children whose constraint set was already generated. Default is True.
+            partition_policy (str): How Tuvya's splitting divides the agents, one of PARTITION_POLICIES. If None, it
+                follows balanced_tuvya_splitting. Default is None.
+            warm_start (bool): Whether to find an incumbent with prioritized planning first (see find_incumbent()).
+                Nodes and low-level searches that can't beat it are pruned, and it is returned if the budget runs out.
+                Default is False.
 
         Returns:
             paths (list): A list of paths for all agents from their start locations to their goal locations.
+                None if the budget runs out (or the incumbent, with warm_start); the reason is then in self.budget_report.
             num_of_generated (int): The number of nodes generated.
             num_of_expanded (int): The number of nodes expanded.
         """
@@ -352,41 +700,44 @@ class CBSSolver(object):
         self.start_time = timer.time()
         
         if disjoint:
-            splitter = disjoint_splitting
+            splitter = partial(disjoint_splitting, rng=self.rng)
         elif do_tuvya_splitting:
-            splitter = get_tuvya_splitting(self.num_of_agents, balanced_tuvya_splitting)
+            splitter = get_tuvya_splitting(self.num_of_agents, balanced_tuvya_splitting, partition_policy, self.my_map, self.starts, self.rng)
         else:
             splitter = standard_splitting
 
         if DEBUG:
             print("USING: ", splitter)
 
-        AStar = A_Star
-
         # Generate the root node
         # constraints   - list of constraints
         # paths         - list of paths, one for each agent
         #               [[(x11, y11), (x12, y12), ...], [(x21, y21), (x22, y22), ...], ...]
+        # constraint_keys - frozenset of the keys of the constraints, shared with the children
         # collisions     - list of collisions in paths
+        # pending       - constraints added to a lazy node that has not been evaluated yet
         root = {'cost': 0,
                 'constraints': [],
+                'constraint_keys': frozenset(),
+                'constraint_hash': 0,
                 'paths': [],
-                'collisions': []}
+                'collisions': [],
+                'pending': None}
 
-        for i in range(self.num_of_agents):  # Find initial path for each agent
-            astar = AStar(self.my_map, self.starts, self.goals, self.heuristics,i, root['constraints'])
-            path = astar.find_paths()
+        with self.phase_timer.phase('root_planning'):
+            for i in range(self.num_of_agents):  # Find initial path for each agent
+                path = self.find_path(i, root['constraints'])
 
-            if path is None:
-                raise BaseException('No solutions')
-            root['paths'].append(path[0])
-
-            # Adjust the metrics for tracking the low-level search
-            self.ll_num_of_generated += astar.num_expanded
-            self.ll_num_of_expanded += astar.num_generated
+                if path is None:
+                    raise BaseException('No solutions')
+                root['paths'].append(path)
 
         root['cost'] = get_sum_of_cost(root['paths'])
-        root['collisions'] = detect_collisions(root['paths'])
+        with self.phase_timer.phase('collision_detection'):
+            root['collisions'] = detect_collisions(root['paths'])
+
+        if warm_start and root['collisions']:
+            self.find_incumbent()
         self.push_node(root)
 
 
@@ -401,125 +752,74 @@ class CBSSolver(object):
         #           Ensure to create a copy of any objects that your child nodes might inherit
 
         while len(self.open_list) > 0:
-            # Check if the timeout has been reached
-            if self.timeout_reached():
-                #print('Timeout reached. Returning...')
-                return None
+            # Stop if the budget (e.g. the timeout) has run out
+            self.budget.check(hl_nodes=self.num_of_generated)
 
             # if self.num_of_generated > 50000:
             #     print('reached maximum number of nodes. Returning...')
             #     return None
             p = self.pop_node()
+
+            # Evaluate a lazy node now that it has reached the front of the open list
+            if p['pending'] is not None:
+                lower_bound = p['cost']
+                p = self.generate_child(p['constraints'], p['constraint_keys'], p['paths'], p['pending'], p['constraint_hash'], do_tuvya_splitting)
+
+                # If a path is not found for an agent, skip the node
+                if p is None:
+                    self.num_of_expanded -= 1
+                    continue
+
+                # If its real cost is higher than its bound, other nodes may come first
+                if p['cost'] > lower_bound:
+                    self.num_of_expanded -= 1
+                    self.push_node(p, reinsert=True)
+                    continue
+
             if p['collisions'] == []:
                 if print_results:
                     self.print_results(p)
                 return p['paths'], self.num_of_generated, self.num_of_expanded # number of nodes generated/expanded for comparing implementations
 
-            collision = p['collisions'].pop(0)
+            collision = p['collisions'][0]
 
             # constraints = standard_splitting(collision)
             # constraints = disjoint_splitting(collision)
-            constraints = splitter(collision)
-
-            if do_tuvya_splitting:
-                for constraint_set in constraints:
-                    # Set flag to skip node if a path is not found
-                    skip_node = False
-
-                    # Create a new node with the constraint set
-                    q = {'cost': 0,
-                        'constraints': constraint_set,
-                        'paths': [],
-                        'collisions': []
-                    }
-
-                    # Copy the constraints and paths from the parent node
-                    for c in p['constraints']:
-                        if c not in q['constraints']:
-                            q['constraints'].append(c)
-                    for pa in p['paths']:
-                        q['paths'].append(pa)
-
-                    # For each agent, find a path
-                    for a in range(self.num_of_agents):
-                        astar = AStar(self.my_map, self.starts, self.goals, self.heuristics, a, q['constraints'])
-                        path = astar.find_paths()
-
-                        # Adjust the metrics for tracking the low-level search
-                        self.ll_num_of_generated += astar.num_expanded
-                        self.ll_num_of_expanded += astar.num_generated
-
-                        if path is None:
-                            break
-                        q['paths'][a] = path[0]
-
-                    # If a path is not found for an agent, skip the node
-                    if skip_node:
-                        continue
-
-                    # Check for collisions
-                    q['collisions'] = detect_collisions(q['paths'])
-                    q['cost'] = get_sum_of_cost(q['paths'])
-                    self.push_node(q)
-
+            if do_tuvya_splitting and not disjoint:
+                constraints = splitter(collision, p['paths'])
             else:
-                for constraint in constraints:
-                    q = {'cost':0,
-                        'constraints': [constraint],
-                        'paths':[],
-                        'collisions':[]
-                    }
-                    for c in p['constraints']:
-                        if c not in q['constraints']:
-                            q['constraints'].append(c)
-                    for pa in p['paths']:
-                        q['paths'].append(pa)
-
-                    ai = constraint['agent']
-                    astar = AStar(self.my_map,self.starts, self.goals,self.heuristics,ai,q['constraints'])
-                    path = astar.find_paths()
-
-                    # Adjust the metrics for tracking the low-level search
-                    self.ll_num_of_generated += astar.num_expanded
-                    self.ll_num_of_expanded += astar.num_generated
-
-                    if path is not None:
-                        q['paths'][ai]= path[0]
-                        # task 4
-                        continue_flag = False
-                        if constraint['positive']:
-                            vol = paths_violate_constraint(constraint,q['paths'])
-                            for v in vol:
-                                astar_v = AStar(self.my_map,self.starts, self.goals,self.heuristics,v,q['constraints'])
-                                path_v = astar_v.find_paths()
-
-                                # Adjust the metrics for tracking the low-level search
-                                self.ll_num_of_generated += astar_v.num_expanded
-                                self.ll_num_of_expanded += astar_v.num_generated
-
-                                if path_v  is None:
-                                    continue_flag =True
-                                else:
-                                    q['paths'][v] = path_v[0]
-                            if continue_flag:
-                                continue
-                        q['collisions'] = detect_collisions(q['paths'])
-                        q['cost'] = get_sum_of_cost(q['paths'])
-                        self.push_node(q)     
+                constraints = splitter(collision)
+
+            for constraint_set in constraints:
+                # Tuvya splitting returns a list of constraints for each child, the other splitters a single constraint
+                if not do_tuvya_splitting:
+                    constraint_set = [constraint_set]
+
+                # Skip children whose constraint set was already generated on another branch
+                constraint_hash = update_constraint_hash(p['constraint_hash'], p['constraint_keys'], constraint_set)
+                if detect_duplicates and self.is_duplicate(constraint_hash, p['constraint_keys'], constraint_set):
+                    self.num_of_duplicates += 1
+                    continue
+
+                if lazy:
+                    self.push_node(self.generate_lazy_child(p, constraint_set, constraint_hash))
+                    continue
+
+                q = self.generate_child(p['constraints'], p['constraint_keys'], p['paths'], constraint_set, constraint_hash, do_tuvya_splitting)
+
+                # If a path is not found for an agent, skip the node
+                if q is None:
+                    continue
+
+                self.push_node(q)
+
+        # Every other node was pruned, so no solution is cheaper than the incumbent
+        if self.incumbent is not None:
+            if print_results:
+                self.print_results({'paths': self.incumbent})
+            return self.incumbent, self.num_of_generated, self.num_of_expanded
         return None
     
-    def timeout_reached(self):
-        '''
-        Check if the timeout has been reached.
-        '''
-        # Check if the timeout has been set
-        if self.timeout is None:
-            return False
-        
-        time_elapsed = timer.time() - self.start_time
-        if time_elapsed > self.timeout:
-            return True
-
     def print_results(self, node, show_paths = False):
         print("\n Found a solution! \n")
         CPU_time = timer.time() - self.start_time
@@ -527,6 +827,14 @@ class CBSSolver(object):
         print("Sum of costs:    {}".format(get_sum_of_cost(node['paths'])))
         print("Expanded nodes:  {}".format(self.num_of_expanded))
         print("Generated nodes: {}".format(self.num_of_generated))
+        print("Duplicate nodes: {}".format(self.num_of_duplicates))
+        if self.incumbent_cost is not None:
+            print("Incumbent cost:  {}".format(self.incumbent_cost))
+            print("Pruned nodes:    {}".format(self.num_of_pruned))
+        if self.ll_num_of_pruned:
+            print("LL pruned nodes: {}".format(self.ll_num_of_pruned))
+        if self.ll_num_of_collapsed:
+            print("LL collapsed:    {}".format(self.ll_num_of_collapsed))
 
         if show_paths:
             print("Solution:")
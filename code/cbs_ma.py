@@ -1,10 +1,16 @@
 import time as timer
-import heapq
 import random
+from functools import partial
 from multi_agent_planner import ma_star,get_sum_of_cost, compute_heuristics, get_location
+from bucket_queue import BucketQueue
+from budget import Budget, budgeted, DEFAULT_MAX_HL_NODES
+from meta_agent_partition import MetaAgentPartition
+from conflict_history import ConflictHistory
 import copy
 
-import numpy
+# The number of conflicts two meta-agents may have before they are merged (the merge bound B of MA-CBS)
+MERGE_THRESHOLD = 0
+
 
 '''
 # Developer's cNOTE regarding Python's mutable default arguments:
@@ -44,7 +50,7 @@ def detect_collision(path1, path2, pos=None):
     return None
 
 
-def detect_collisions(paths, ma_list, collisions=None):
+def detect_collisions(paths, partition, collisions=None):
     ##############################
     # Task 3.1: Return a list of first collisions between all robot pairs.
     #           A collision can be represented as dictionary that contains the id of the two robots, the vertex or edge
@@ -54,21 +60,21 @@ def detect_collisions(paths, ma_list, collisions=None):
     if collisions is None:
         collisions = []
     for ai in range(len(paths)-1):
+        ma_i = partition.group_of(ai)
         for aj in range(ai+1,len(paths)):
-            if detect_collision(paths[ai],paths[aj]) !=None:
-                position,t = detect_collision(paths[ai],paths[aj])
-
-                assert isinstance(ma_list , list)
-                ma_i = get_ma_of_agent(ai, ma_list)
-                assert isinstance(ma_list , list)
-                ma_j = get_ma_of_agent(aj, ma_list)
-
-                # check if internal collision in the same meta-agent
-                if ma_i != ma_j:
-                    collisions.append({'a1':ai, 'ma1':ma_i,
-                                    'a2':aj, 'ma2':ma_j,
-                                    'loc':position,
-                                    'timestep':t+1})
+            ma_j = partition.group_of(aj)
+
+            # skip internal collisions in the same meta-agent
+            if ma_i is ma_j:
+                continue
+
+            collision = detect_collision(paths[ai],paths[aj])
+            if collision is not None:
+                position,t = collision
+                collisions.append({'a1':ai, 'ma1':ma_i,
+                                'a2':aj, 'ma2':ma_j,
+                                'loc':position,
+                                'timestep':t+1})
     return collisions
 
 def count_all_collisions_pair(path1, path2):
@@ -135,7 +141,7 @@ def standard_splitting(collision, constraints=None):
     return constraints
 
 
-def disjoint_splitting(collision, constraints=None):
+def disjoint_splitting(collision, constraints=None, rng=random):
     ##############################
     # Task 4.1: Return a list of (two) constraints to resolve the given collision
     #           Vertex collision: the first constraint enforces one agent to be at the specified location at the
@@ -144,11 +150,11 @@ def disjoint_splitting(collision, constraints=None):
     #           Edge collision: the first constraint enforces one agent to traverse the specified edge at the
     #                          specified timestep, and the second constraint prevents the same agent to traverse the
     #                          specified edge at the specified timestep
-    #           Choose the agent randomly
+    #           Choose the agent randomly (with rng, the random module unless the solver is seeded)
     if constraints is None:
         constraints = []
 
-    a = random.choice([('a1','ma1'), ('a2','ma2')]) # chosen agent
+    a = rng.choice([('a1','ma1'), ('a2','ma2')]) # chosen agent
     agent = a[0]
     meta_agent = a[1]
 
@@ -196,28 +202,16 @@ def disjoint_splitting(collision, constraints=None):
                                 })
     return constraints
 
-# get the meta-agent an agent is a part of
-# do NOT use for constraints, use key 'meta-agent' in constraint
-def get_ma_of_agent(agent, ma_list):
-
-    assert isinstance(ma_list , list)
-    for ma in ma_list:
-        # print(ma, ma_list)
-        if agent in ma:
-            # print(agent, ma)
-            return ma
-    raise BaseException('No meta-agent found for agent')
-                        
-
 # find meta-agents of the agents that violates constraint
-def meta_agents_violate_constraint(constraint, paths, ma_list, violating_ma=None):
+# the meta-agent of an agent comes from the partition; for constraints, use key 'meta_agent' in constraint
+def meta_agents_violate_constraint(constraint, paths, partition, violating_ma=None):
     assert constraint['positive'] is True
     if violating_ma is None:
         violating_ma = []
 
     for i in range(len(paths)):
 
-        ma_i = get_ma_of_agent(i, ma_list)
+        ma_i = partition.group_of(i)
 
         if ma_i == constraint['meta_agent'] or ma_i in violating_ma:
             continue
@@ -283,12 +277,23 @@ def bypass_found(curr_cost, new_cost, curr_collisions_num, new_collisions_num):
 class CBSSolver(object):
     """The high-level search of CBS."""
 
-    def __init__(self, my_map, starts, goals):
+    def __init__(self, my_map, starts, goals, budget=None, seed=None):
         """my_map   - list of lists specifying obstacle positions
         starts      - [(x1, y1), (x2, y2), ...] list of start locations
         goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        budget      - Budget limiting the search. Defaults to DEFAULT_MAX_HL_NODES high-level nodes
+        seed        - seed of the random number generator of the splitter. If None, it uses the random module
         """
 
+        # The splitter draws from its own generator, so a seeded run can be reproduced
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(seed)
+
+        if budget is None:
+            budget = Budget(hl_nodes=DEFAULT_MAX_HL_NODES)
+        self.budget = budget
+        self.budget_report = None
+
         self.my_map = my_map
         self.starts = starts
         self.goals = goals
@@ -298,7 +303,7 @@ class CBSSolver(object):
         self.num_of_expanded = 0
         self.CPU_time = 0
 
-        self.open_list = []
+        self.open_list = BucketQueue()
 
         # compute heuristics for the low-level search
         self.heuristics = []
@@ -307,14 +312,14 @@ class CBSSolver(object):
 
     def push_node(self, node):
 
-        heapq.heappush(self.open_list, (node['cost'], len(node['ma_collisions']), self.num_of_generated, node))
+        self.open_list.push(node['cost'], len(node['ma_collisions']), self.num_of_generated, node)
         print("> Generate node {} with cost {}".format(self.num_of_generated, node['cost']))
 
         self.num_of_generated += 1
         
 
     def pop_node(self):
-        _, _, id, node = heapq.heappop(self.open_list)
+        _, _, id, node = self.open_list.pop()
         print("> Expand node {} with cost {}".format(id, node['cost']))
 
         self.num_of_expanded += 1
@@ -323,6 +328,7 @@ class CBSSolver(object):
     def empty_tree(self):
         self.open_list.clear()
 
+    @budgeted
     def find_solution(self, disjoint):
         """ Finds paths for all agents from their start locations to their goal locations
 
@@ -332,7 +338,7 @@ class CBSSolver(object):
         self.start_time = timer.time()
         
         if disjoint:
-            splitter = disjoint_splitting
+            splitter = partial(disjoint_splitting, rng=self.rng)
         else:
             splitter = standard_splitting
         print("USING: ", splitter)
@@ -347,24 +353,22 @@ class CBSSolver(object):
             'constraints': [],
             'paths': [],
             'ma_collisions': [],
-            'agent_collisions': None, # matrix of collisions in history between pairs of (meta-)agents
-            'ma_list': [] # [{a1,a2}, ... ]
+            'conflict_history': ConflictHistory(), # collisions in history between pairs of simple agents
+            'partition': MetaAgentPartition(self.num_of_agents) # every agent starts as its own meta-agent
         }       
         
         for i in range(self.num_of_agents):  # Find initial path for each agent
 
             path = ma_star(self.my_map, self.starts, self.goals, self.heuristics,
-                          [i], root['constraints'])
+                          [i], root['constraints'], budget=self.budget)
 
             if path is None:
                 raise BaseException('No solutions')
-            root['ma_list'].append({i})
             root['paths'].extend(path)
 
 
         root['cost'] = get_sum_of_cost(root['paths'])
-        root['ma_collisions'] = detect_collisions(root['paths'], root['ma_list'])
-        root['agent_collisions'] = numpy.zeros((self.num_of_agents, self.num_of_agents))
+        root['ma_collisions'] = detect_collisions(root['paths'], root['partition'])
         self.push_node(root)
 
         # algorithm for detecting cardinality
@@ -383,7 +387,7 @@ class CBSSolver(object):
 
             assert temp_constraints[0]['meta_agent'] == ma1
             path1_constraints = combined_constraints(p['constraints'], temp_constraints[0])
-            alt_paths1 = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(ma1),path1_constraints)
+            alt_paths1 = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(ma1),path1_constraints, budget=self.budget)
 
             # get current paths of meta-agent
             curr_paths = []
@@ -416,7 +420,7 @@ class CBSSolver(object):
 
             assert temp_constraints[1]['meta_agent'] == ma2
             path2_constraints = combined_constraints(p['constraints'], temp_constraints[1])
-            alt_paths2 = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(ma2),path2_constraints)
+            alt_paths2 = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(ma2),path2_constraints, budget=self.budget)
             curr_paths = []
             for a2 in ma2:                
                 not_nested_list = p['paths'][a2]
@@ -445,41 +449,24 @@ class CBSSolver(object):
             return cardinality        
 
 
-        def should_merge(collision, p, N=0):
-            CM = 0
-            ma1 = collision['ma1']
-            ma2 = collision['ma2']
-            
-            # check it is same meta-agent
-            for ai in ma1:
-                for aj in ma2:
-                    if ai > aj:
-                        ai, aj = aj, ai
-                    CM += p['agent_collisions'][ai][aj]
-            if CM > N:
-                print('> Merge meta-agents {}, {} into one meta-agent'.format(ma1, ma2))
-                return True
-            return False
-
-            
-        def generate_child(constraints, paths, agent_collisions, ma_list):
+        def generate_child(constraints, paths, conflict_history, partition):
 
-            assert isinstance(ma_list , list)
+            assert isinstance(partition, MetaAgentPartition)
 
-            collisions = detect_collisions(paths, ma_list)
+            collisions = detect_collisions(paths, partition)
             cost = get_sum_of_cost(paths)
             child_node = {
                 'cost':cost,
                 'constraints': copy.deepcopy(constraints),
                 'paths': copy.deepcopy(paths), # {0: {'path':[..path...]}, ... , n: {'path':[..path...]} # not sure if other keys are needed
                 'ma_collisions': collisions,
-                'agent_collisions':copy.deepcopy(agent_collisions), # matrix of collisions in history between pairs of simple agents
-                'ma_list': copy.deepcopy(ma_list) # [{a1,a2}, ... ]
+                'conflict_history': conflict_history, # immutable, so it is shared with the parent instead of copied
+                'partition': partition # immutable, so it is shared with the parent instead of copied
             }
             return child_node
 
-        # returns new merged agents (the meta-agent), and updated list of ma_list
-        def merge_agents(self, collision, ma_list):
+        # returns new merged agents (the meta-agent), and the updated partition
+        def merge_agents(self, collision, partition):
 
             # constraints = standard_splitting(collision)
             
@@ -489,23 +476,16 @@ class CBSSolver(object):
             ma1 = collision['ma1']
             ma2 = collision['ma2']
 
-            meta_agent = set.union(ma1, ma2)
+            meta_agent, partition = partition.merge(ma1, ma2)
 
             print('new merged meta_agent ', meta_agent)
 
-            assert meta_agent not in ma_list
-
-            ma_list.remove(ma1)
-            ma_list.remove(ma2)
-            ma_list.append(meta_agent)
-
-            return meta_agent, ma_list
+            return meta_agent, partition
 
         # normal CBS with disjoint and standard splitting
         while len(self.open_list) > 0:
-            if self.num_of_generated > 50000:
-                print('reached maximum number of nodes. Returning...')
-                return None 
+            # Stop if the budget has run out (by default, after DEFAULT_MAX_HL_NODES nodes)
+            self.budget.check(hl_nodes=self.num_of_generated)
             print('\n')  
 
             p = self.pop_node()
@@ -561,12 +541,7 @@ class CBSSolver(object):
 
 
             # keep track of collisions in history (aSh)
-            chosen_a1 = chosen_collision['a1']
-            chosen_a2 = chosen_collision['a2']
-            if chosen_a1 > chosen_a2:
-                # swap to only fill half of the matrix
-                chosen_a1, chosen_a2 = chosen_a2, chosen_a1
-            p['agent_collisions'][chosen_a1][chosen_a2] += 1
+            p['conflict_history'] = p['conflict_history'].record(chosen_collision)
 
             new_constraints = splitter(chosen_collision)
 
@@ -582,11 +557,7 @@ class CBSSolver(object):
             bypass_successful = False
             for constraint in new_constraints:
                 updated_constraints = combined_constraints(p['constraints'], constraint)
-                q = generate_child(updated_constraints, p['paths'], p['agent_collisions'], p['ma_list'])
-
-
-                assert isinstance(p['ma_list'] , list)
-                assert isinstance(q['ma_list'] , list)
+                q = generate_child(updated_constraints, p['paths'], p['conflict_history'], p['partition'])
 
                 ma = constraint['meta_agent']
 
@@ -597,7 +568,7 @@ class CBSSolver(object):
                     print (q['paths'][a])
 
                 # skip this if constraint is positive
-                path = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(ma),q['constraints']) 
+                path = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(ma),q['constraints'], budget=self.budget) 
 
                 if constraint['positive']:
                     assert path
@@ -614,7 +585,7 @@ class CBSSolver(object):
                     # task 4
                     # continue_flag = False
                     if constraint['positive']:
-                        violating_ma_list = meta_agents_violate_constraint(constraint, q['paths'], q['ma_list'])
+                        violating_ma_list = meta_agents_violate_constraint(constraint, q['paths'], q['partition'])
                         no_solution = False
                         for v_ma in violating_ma_list:
                             
@@ -626,7 +597,7 @@ class CBSSolver(object):
 
 
                             v_ma_list = list(v_ma) # should use same list for all uses
-                            path_v_ma = ma_star(self.my_map,self.starts,self.goals,self.heuristics,v_ma_list,q['constraints'])
+                            path_v_ma = ma_star(self.my_map,self.starts,self.goals,self.heuristics,v_ma_list,q['constraints'], budget=self.budget)
                             
                             # replace paths of meta-agent with new paths found
                             if path_v_ma is not None:
@@ -648,7 +619,7 @@ class CBSSolver(object):
                         if no_solution:
                             continue # move on to the next constraint
 
-                    q['ma_collisions'] = detect_collisions(q['paths'],q['ma_list'])
+                    q['ma_collisions'] = detect_collisions(q['paths'],q['partition'])
 
                     assert chosen_collision not in q['ma_collisions']
 
@@ -677,8 +648,9 @@ class CBSSolver(object):
             assert not bypass_successful
 
             # MA-CBS
-            if should_merge(collision,p):
-                meta_agent, updated_ma_list = merge_agents(self, collision, p['ma_list'])
+            if p['conflict_history'].should_merge(chosen_collision, MERGE_THRESHOLD):
+                print('> Merge meta-agents {}, {} into one meta-agent'.format(chosen_collision['ma1'], chosen_collision['ma2']))
+                meta_agent, updated_partition = merge_agents(self, chosen_collision, p['partition'])
 
                 # print('Sending newly merged meta_agent {} to A* '.format(meta_agent))
                 # print('\twith constraints ', p['constraints'])
@@ -688,7 +660,7 @@ class CBSSolver(object):
 
 
                 # Update paths
-                meta_agent_paths = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(meta_agent),p['constraints'])
+                meta_agent_paths = ma_star(self.my_map,self.starts, self.goals,self.heuristics,list(meta_agent),p['constraints'], budget=self.budget)
 
                 # if can be 
                 if meta_agent_paths:
@@ -705,7 +677,7 @@ class CBSSolver(object):
                         updated_paths[agent] = meta_agent_paths[i]
 
                     # Update collisions, cost
-                    updated_node = generate_child(p['constraints'], updated_paths, p['agent_collisions'], updated_ma_list) 
+                    updated_node = generate_child(p['constraints'], updated_paths, p['conflict_history'], updated_partition) 
 
 
                     # print('agents {}, {} merged into agent {}'.format(collision['a1'], a2, meta_agent))
@@ -714,7 +686,7 @@ class CBSSolver(object):
                     # restart with only updated node with merged agents
                     self.empty_tree()
 
-                    assert self.open_list == []
+                    assert len(self.open_list) == 0
 
                     self.push_node(updated_node)    
 
@@ -0,0 +1,123 @@
+'''
+This file contains the checkpoint used to make benchmark sweeps resumable. Every finished task is appended to a
+JSON-lines file as soon as it completes, keyed by (file, strategy, solver, seed, config). If a sweep is interrupted, it
+can be restarted with --resume, which skips the tasks that already have a result and reruns only the missing or failed
+ones. The config holds the solver settings and the limits of the run, so a sweep resumed with other settings doesn't
+reuse the results recorded under the old ones.
+
+Classes
+-------
+Checkpoint
+    An append-only record of the finished tasks of a sweep.
+'''
+
+import json
+import os
+
+
+class Checkpoint(object):
+    '''
+    An append-only record of the finished tasks of a benchmark sweep.
+
+    Each line of the file is a JSON object {"key": [file, strategy, solver, seed, config], "status": ..., "result": ...}.
+    The status is "Solved", "Timeout" or "Failed". When a key appears more than once, the last line wins, so a
+    task that is rerun simply overrides its previous result. The file is never truncated, so sweeps that share a
+    checkpoint (e.g. one per splitting strategy) don't erase each other's results.
+    '''
+
+    def __init__(self, filename):
+        '''
+        Parameters
+        ----------
+        filename : str
+            The file to record the results in. The results already in the file are loaded.
+        '''
+
+        self.filename = filename
+        self.records = dict()
+
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # The last line may be cut off if the sweep was killed while writing it
+                        continue
+                    self.records[tuple(record['key'])] = record
+
+        self.file = open(filename, 'a')
+
+        # Start on a new line if the last record was cut off
+        if self.file.tell() > 0:
+            with open(filename, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    self.file.write('\n')
+
+    @staticmethod
+    def get_key(file, strategy, solver, seed=None, config=None):
+        '''
+        Returns the key of a task. The config is a dict of the settings and limits the result depends on; it is stored
+        as canonical JSON, so the key can be written to and read back from the file.
+        '''
+
+        if config is not None:
+            config = json.dumps(config, sort_keys=True)
+        return (file, strategy, solver, seed, config)
+
+    def is_complete(self, key):
+        '''
+        Returns True if the task has a result that doesn't need to be rerun, i.e. it was solved or timed out.
+        '''
+
+        record = self.records.get(key)
+        return record is not None and record['status'] != 'Failed'
+
+    def get_result(self, key):
+        '''
+        Returns the recorded result of a task, or None if it has none.
+        '''
+
+        record = self.records.get(key)
+        if record is None:
+            return None
+        return record['result']
+
+    def record(self, key, status, result):
+        '''
+        Record the result of a task, and write it to disk before returning.
+
+        Parameters
+        ----------
+        key : tuple
+            The key of the task, as returned by get_key().
+        status : str
+            "Solved", "Timeout" or "Failed".
+        result : dict
+            The result of the task. Must be JSON serializable.
+
+        Returns
+        -------
+        None
+        '''
+
+        record = {'key': list(key), 'status': status, 'result': result}
+        self.records[key] = record
+
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,163 @@
+'''
+This file contains the conflict history used by MA-CBS (icbs_complete.py and cbs_ma.py) to decide when to merge two
+meta-agents: the number of conflicts found between every pair of agents on the branch of the constraint tree leading to
+a node.
+
+A history is persistent: recording a conflict returns a new history that points to its parent and holds only the pair
+of agents that conflicted, so every expanded node adds a few bytes instead of a copy of the counts. Children share
+their parent's history.
+
+Looking up the count of two meta-agents walks up the branch, and the total is cached at every history on the way. A
+lookup is therefore O(1) when an ancestor was already asked about the same meta-agents (the usual case, since the same
+pair keeps conflicting along a branch), and O(depth of the branch) the first time a pair of meta-agents is asked about,
+e.g. right after a merge.
+
+The history is kept per branch rather than globally because the merge in icbs_complete.py restarts the search from
+the merged node: a count gathered on another branch could trigger a merge that discards the branch of the optimal
+solution.
+
+Classes
+-------
+ConflictHistory
+    An immutable, persistent count of the conflicts between pairs of agents.
+'''
+
+
+class ConflictHistory(object):
+    '''
+    An immutable, persistent count of the conflicts between pairs of agents. Pairs are stored as (a1, a2) with a1 < a2.
+    '''
+
+    __slots__ = ('_parent', '_pair', '_totals')
+
+    def __init__(self, parent=None, pair=None):
+        '''
+        Parameters
+        ----------
+        parent : ConflictHistory
+            The history before the conflict. Used by record() to build the updated history. Default is None (no
+            conflicts).
+        pair : tuple
+            The pair of agents (a1, a2), with a1 < a2, of the conflict added to the parent. Default is None.
+        '''
+
+        self._parent = parent
+        self._pair = pair
+
+        # frozenset({ma1, ma2}) -> the number of conflicts between the meta-agents, filled in by count()
+        self._totals = None
+
+    @staticmethod
+    def get_pair(a1, a2):
+        if a1 > a2:
+            a1, a2 = a2, a1
+        return a1, a2
+
+    def record(self, collision):
+        '''
+        Count a conflict between two agents. The history itself is not changed.
+
+        Parameters
+        ----------
+        collision : dict
+            The collision, with the agents in "a1" and "a2".
+
+        Returns
+        -------
+        ConflictHistory
+            The updated history.
+        '''
+
+        return ConflictHistory(self, self.get_pair(collision['a1'], collision['a2']))
+
+    def count(self, ma1, ma2):
+        '''
+        Get the number of conflicts between two meta-agents: the sum of the conflicts of the pairs of agents across
+        them.
+
+        Parameters
+        ----------
+        ma1 : frozenset
+            A meta-agent.
+        ma2 : frozenset
+            Another meta-agent, disjoint from ma1.
+
+        Returns
+        -------
+        int
+            The number of conflicts.
+        '''
+
+        key = frozenset((ma1, ma2))
+
+        # Walk up to the first history that knows the total (or past the root)
+        uncached = []
+        history = self
+        while history is not None and (history._totals is None or key not in history._totals):
+            uncached.append(history)
+            history = history._parent
+        total = 0 if history is None else history._totals[key]
+
+        # Fill in the totals on the way back down
+        for history in reversed(uncached):
+            if history._pair is not None:
+                a1, a2 = history._pair
+                if (a1 in ma1 and a2 in ma2) or (a1 in ma2 and a2 in ma1):
+                    total += 1
+            if history._totals is None:
+                history._totals = {}
+            history._totals[key] = total
+
+        return total
+
+    def should_merge(self, collision, threshold):
+        '''
+        Returns True if the meta-agents of a collision have conflicted more than threshold times.
+
+        Parameters
+        ----------
+        collision : dict
+            The collision, with the meta-agents in "ma1" and "ma2".
+        threshold : int
+            The merge bound: the number of conflicts two meta-agents may have without being merged.
+
+        Returns
+        -------
+        bool
+            Whether to merge the meta-agents.
+        '''
+
+        return self.count(collision['ma1'], collision['ma2']) > threshold
+
+    def get_counts(self):
+        '''
+        Returns a dict of the number of conflicts of every pair of agents (a1, a2) that conflicted. Walks the whole
+        branch, so it is meant for printing and comparing histories, not for the search.
+        '''
+
+        counts = {}
+        history = self
+        while history is not None:
+            if history._pair is not None:
+                counts[history._pair] = counts.get(history._pair, 0) + 1
+            history = history._parent
+        return counts
+
+    # Histories are immutable, so copies (e.g. when a whole node is deep-copied) can share them
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __len__(self):
+        return len(self.get_counts())
+
+    def __eq__(self, other):
+        return isinstance(other, ConflictHistory) and self.get_counts() == other.get_counts()
+
+    def __hash__(self):
+        return hash(frozenset(self.get_counts().items()))
+
+    def __repr__(self):
+        return 'ConflictHistory({})'.format(self.get_counts())
@@ -0,0 +1,126 @@
+'''
+This file contains the geometry-aware partition policies of Tuvya splitting (see cbs_basic.get_tuvya_splitting()).
+A policy divides the agents into the two groups that the children of a split constrain away from the conflict.
+
+Any two disjoint groups, one with each of the colliding agents, give a complete split: at most one agent can be at the
+conflict location at the conflict timestep, so every solution satisfies the constraints of one of the groups. Agents
+can therefore be left out of both groups. A constraint on an agent that can't be at the conflict location at the
+conflict timestep prunes nothing, so leaving such agents out gives the same pruning without the extra constraints.
+
+The policies are:
+    spatial      - every agent, sorted by the distance of its location at the conflict timestep to the conflict
+                   location. The nearer half is grouped with the first colliding agent, the farther half with the second
+    path_overlap - only the agents whose paths pass within a distance of the conflict location at the conflict timestep,
+                   divided at random
+    reachable    - only the agents that can reach the conflict location by the conflict timestep (from the distances of
+                   their start locations), divided at random
+
+The random and imbalanced policies, which divide every agent, are in cbs_basic.divide_agents().
+
+Classes
+-------
+GroupPartitioner
+    Divides the agents into two groups for Tuvya splitting with a geometry-aware policy.
+'''
+
+import random
+
+from a_star_class import compute_heuristics, get_location
+
+# The policies implemented by GroupPartitioner
+GEOMETRIC_POLICIES = ['spatial', 'path_overlap', 'reachable']
+
+# The distance from the conflict location within which the path_overlap policy constrains an agent
+DEFAULT_OVERLAP_DISTANCE = 2
+
+
+class GroupPartitioner(object):
+    '''
+    Divides the agents into two groups for Tuvya splitting with a geometry-aware policy.
+    '''
+
+    def __init__(self, my_map, starts, policy, overlap_distance=DEFAULT_OVERLAP_DISTANCE, rng=random):
+        '''
+        Parameters
+        ----------
+        my_map : list
+            The map.
+        starts : list
+            The start locations of the agents.
+        policy : str
+            The policy, one of GEOMETRIC_POLICIES.
+        overlap_distance : int
+            The distance from the conflict location within which the path_overlap policy constrains an agent. Default
+            is DEFAULT_OVERLAP_DISTANCE.
+        rng : random.Random
+            The random number generator that divides the agents. Default is the random module.
+        '''
+
+        if policy not in GEOMETRIC_POLICIES:
+            raise ValueError(f'Unknown partition policy: {policy}')
+
+        self.my_map = my_map
+        self.starts = starts
+        self.policy = policy
+        self.overlap_distance = overlap_distance
+        self.rng = rng
+
+        # location -> the distances of every location from it, computed the first time a conflict happens there
+        self.distance_tables = dict()
+
+    def get_distance(self, loc, other):
+        '''
+        Get the length of the shortest path between two locations (infinite if there is none).
+        '''
+
+        if loc not in self.distance_tables:
+            self.distance_tables[loc] = compute_heuristics(self.my_map, loc)
+        return self.distance_tables[loc].get(other, float('inf'))
+
+    def get_conflict_distance(self, collision, loc):
+        '''
+        Get the distance of a location to the conflict location (the nearest end of an edge conflict).
+        '''
+
+        return min(self.get_distance(conflict_loc, loc) for conflict_loc in collision['loc'])
+
+    def divide(self, collision, paths):
+        '''
+        Divide the agents into two groups for a collision.
+
+        Parameters
+        ----------
+        collision : dict
+            The collision.
+        paths : list
+            The paths of the agents in the node being split. Required by the spatial and path_overlap policies.
+
+        Returns
+        -------
+        list, list
+            The two groups. The first group contains the first agent of the collision and the second group the second.
+        '''
+
+        a1, a2 = collision['a1'], collision['a2']
+        timestep = collision['timestep']
+        others = [i for i in range(len(self.starts)) if i != a1 and i != a2]
+
+        if self.policy == 'spatial':
+            if paths is None:
+                raise ValueError('The spatial partition policy needs the paths of the agents')
+            distances = {i: self.get_conflict_distance(collision, get_location(paths[i], timestep)) for i in others}
+            others.sort(key=lambda i: (distances[i], i))
+            half = len(others) // 2
+            return [a1] + others[:half], [a2] + others[half:]
+
+        if self.policy == 'path_overlap':
+            if paths is None:
+                raise ValueError('The path_overlap partition policy needs the paths of the agents')
+            candidates = [i for i in others
+                          if self.get_conflict_distance(collision, get_location(paths[i], timestep)) <= self.overlap_distance]
+        else:
+            candidates = [i for i in others if self.get_conflict_distance(collision, self.starts[i]) <= timestep]
+
+        self.rng.shuffle(candidates)
+        half = len(candidates) // 2
+        return [a1] + candidates[:half], [a2] + candidates[half:]
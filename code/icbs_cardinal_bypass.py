@@ -1,7 +1,9 @@
 import time as timer
-import heapq
 import random
+from functools import partial
 from single_agent_planner import  a_star, compute_heuristics, get_location, get_sum_of_cost
+from bucket_queue import BucketQueue
+from budget import Budget, budgeted, DEFAULT_MAX_HL_NODES
 import math
 import copy
 import numpy
@@ -123,7 +125,7 @@ def standard_splitting(collision, constraints=None):
     # pass
 
 
-def disjoint_splitting(collision, constraints=None):
+def disjoint_splitting(collision, constraints=None, rng=random):
     ##############################
     # Task 4.1: Return a list of (two) constraints to resolve the given collision
     #           Vertex collision: the first constraint enforces one agent to be at the specified location at the
@@ -132,11 +134,11 @@ def disjoint_splitting(collision, constraints=None):
     #           Edge collision: the first constraint enforces one agent to traverse the specified edge at the
     #                          specified timestep, and the second constraint prevents the same agent to traverse the
     #                          specified edge at the specified timestep
-    #           Choose the agent randomly
+    #           Choose the agent randomly (with rng, the random module unless the solver is seeded)
     if constraints is None:
         constraints = []
 
-    agent = random.choice(['a1','a2']) # chosen agent
+    agent = rng.choice(['a1','a2']) # chosen agent
     if len(collision['loc'])==1:
         constraints.append({'agent':collision[agent],
                             'loc':collision['loc'],
@@ -214,12 +216,23 @@ def combined_constraints(constraints, new_constraints, updated_constraints=None)
 class ICBS_CB_Solver(object):
     """The high-level search of CBS."""
 
-    def __init__(self, my_map, starts, goals):
+    def __init__(self, my_map, starts, goals, budget=None, seed=None):
         """my_map   - list of lists specifying obstacle positions
         starts      - [(x1, y1), (x2, y2), ...] list of start locations
         goals       - [(x1, y1), (x2, y2), ...] list of goal locations
+        budget      - Budget limiting the search. Defaults to DEFAULT_MAX_HL_NODES high-level nodes
+        seed        - seed of the random number generator of the splitter. If None, it uses the random module
         """
 
+        # The splitter draws from its own generator, so a seeded run can be reproduced
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(seed)
+
+        if budget is None:
+            budget = Budget(hl_nodes=DEFAULT_MAX_HL_NODES)
+        self.budget = budget
+        self.budget_report = None
+
         self.my_map = my_map
         self.starts = starts
         self.goals = goals
@@ -228,7 +241,7 @@ class ICBS_CB_Solver(object):
         self.num_of_expanded = 0
         self.CPU_time = 0
 
-        self.open_list = []
+        self.open_list = BucketQueue()
 
         # compute heuristics for the low-level search
         self.heuristics = []
@@ -236,27 +249,29 @@ class ICBS_CB_Solver(object):
             self.heuristics.append(compute_heuristics(my_map, goal))
 
     def push_node(self, node):
-        heapq.heappush(self.open_list, (node['cost'], len(node['collisions']), self.num_of_generated, node))
+        self.open_list.push(node['cost'], len(node['collisions']), self.num_of_generated, node)
         print("> Generate node {} with cost {}".format(self.num_of_generated, node['cost']))
         self.num_of_generated += 1
         
 
     def pop_node(self):
-        _, _, id, node = heapq.heappop(self.open_list)
+        _, _, id, node = self.open_list.pop()
         print("> Expand node {} with cost {}".format(id, node['cost']))
         self.num_of_expanded += 1
         return node
 
-    def find_solution(self, disjoint):
+    @budgeted
+    def find_solution(self, disjoint, print_results=True):
         """ Finds paths for all agents from their start locations to their goal locations
 
-        disjoint    - use disjoint splitting or not
+        disjoint        - use disjoint splitting or not
+        print_results   - print the solution and the statistics of the search when it is found
         """
 
         self.start_time = timer.time()
         
         if disjoint:
-            splitter = disjoint_splitting
+            splitter = partial(disjoint_splitting, rng=self.rng)
         else:
             splitter = standard_splitting
         print("USING: ", splitter)
@@ -272,7 +287,7 @@ class ICBS_CB_Solver(object):
                 'collisions': []}
         for i in range(self.num_of_agents):  # Find initial path for each agent
             path = a_star(self.my_map, self.starts[i], self.goals[i], self.heuristics[i],
-                          i, root['constraints'])
+                          i, root['constraints'], budget=self.budget)
             if path is None:
                 raise BaseException('No solutions')
             root['paths'].append(path)
@@ -319,7 +334,7 @@ class ICBS_CB_Solver(object):
                     temp_constraints.append(c)
                         
             a1 = collision['a1'] #agent a1
-            alt_path1 = a_star(self.my_map,self.starts[a1], self.goals[a1],self.heuristics[a1],a1,temp_constraints)
+            alt_path1 = a_star(self.my_map,self.starts[a1], self.goals[a1],self.heuristics[a1],a1,temp_constraints, budget=self.budget)
             print(alt_path1)
             if not alt_path1 or len(alt_path1) > len(p['paths'][a1]):
                 cardinality = 'semi-cardinal'
@@ -327,7 +342,7 @@ class ICBS_CB_Solver(object):
                 print('alt_path1 takes longer or is empty. at least semi-cardinal.')
                 
             a2 = collision['a2'] #agent a2
-            alt_path2 = a_star(self.my_map,self.starts[a2], self.goals[a2],self.heuristics[a2],a2,temp_constraints)
+            alt_path2 = a_star(self.my_map,self.starts[a2], self.goals[a2],self.heuristics[a2],a2,temp_constraints, budget=self.budget)
             print(alt_path2)
             if not alt_path2 or len(alt_path2) > len(p['paths'][a2]):
                 if cardinality == 'semi-cardinal':
@@ -373,7 +388,7 @@ class ICBS_CB_Solver(object):
                 ###########
                 # Find cardinality for positive constraint
                 # search for path for agent with positive constraint
-                alt_path_chosen = a_star(self.my_map,self.starts[chosen_agent],self.goals[chosen_agent],self.heuristics[chosen_agent],chosen_agent,all_constraints_pos)
+                alt_path_chosen = a_star(self.my_map,self.starts[chosen_agent],self.goals[chosen_agent],self.heuristics[chosen_agent],chosen_agent,all_constraints_pos, budget=self.budget)
                 
                 # constraint can be met by chosen agent (must traverse conflict location/edge)                
                 assert alt_path_chosen and len(alt_path_chosen) == len(p['paths'][chosen_agent]) # if the collision occured, path which caused it likely exists
@@ -390,7 +405,7 @@ class ICBS_CB_Solver(object):
 
                 
                 for v in alt_path_vols:
-                    path_v = a_star(self.my_map,self.starts[v], self.goals[v],self.heuristics[v],v,all_constraints_pos)
+                    path_v = a_star(self.my_map,self.starts[v], self.goals[v],self.heuristics[v],v,all_constraints_pos, budget=self.budget)
                     if path_v  is None :
                         path_failed = True
                         break
@@ -417,7 +432,7 @@ class ICBS_CB_Solver(object):
 
                 # negative constraint
                 print('neg constraint ', new_constraints[1])
-                alt_path_chosen = a_star(self.my_map,self.starts[chosen_agent], self.goals[chosen_agent],self.heuristics[chosen_agent],chosen_agent,all_constraints_neg)
+                alt_path_chosen = a_star(self.my_map,self.starts[chosen_agent], self.goals[chosen_agent],self.heuristics[chosen_agent],chosen_agent,all_constraints_neg, budget=self.budget)
                 # new_paths = copy.deepcopy(p['paths'])
                 # new_paths[chosen_agent] = copy.deepcopy(alt_path_chosen)
 
@@ -449,13 +464,13 @@ class ICBS_CB_Solver(object):
 
         # normal CBS with disjoint and standard splitting
         while len(self.open_list) > 0:
-            if self.num_of_generated > 50000:
-                print('reached maximum number of nodes. Returning...')
-                return None
+            # Stop if the budget has run out (by default, after DEFAULT_MAX_HL_NODES nodes)
+            self.budget.check(hl_nodes=self.num_of_generated)
             print('\n')
             p = self.pop_node()
             if p['collisions'] == []:
-                self.print_results(p)
+                if print_results:
+                    self.print_results(p)
 
                 return p['paths'], self.num_of_generated, self.num_of_expanded # number of nodes generated/expanded for comparing implementations
 
@@ -544,7 +559,7 @@ class ICBS_CB_Solver(object):
                     q['paths'].append(pa)
                 
                 ai = constraint['agent']
-                path = a_star(self.my_map,self.starts[ai], self.goals[ai],self.heuristics[ai],ai,q['constraints'])
+                path = a_star(self.my_map,self.starts[ai], self.goals[ai],self.heuristics[ai],ai,q['constraints'], budget=self.budget)
                 
                 if path is not None:
                     q['paths'][ai]= path
@@ -553,7 +568,7 @@ class ICBS_CB_Solver(object):
                     if constraint['positive']:
                         vol = paths_violate_constraint(constraint,q['paths'])
                         for v in vol:
-                            path_v = a_star(self.my_map,self.starts[v], self.goals[v],self.heuristics[v],v,q['constraints'])
+                            path_v = a_star(self.my_map,self.starts[v], self.goals[v],self.heuristics[v],v,q['constraints'], budget=self.budget)
                             if path_v  is None:
                                 continue_flag = True
                             else:
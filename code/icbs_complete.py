@@ -1,14 +1,31 @@
 import time as timer
-import heapq
 import random
+from functools import partial
 # from single_agent_planner import compute_heuristics, a_star, get_location
 # from multi_agent_planner import ll_solver, get_sum_of_cost, compute_heuristics, get_location
 
 from a_star_class import A_Star, get_sum_of_cost, compute_heuristics, get_location
+from bucket_queue import BucketQueue
+from budget import Budget, budgeted, DEFAULT_MAX_HL_NODES
+from phase_timer import PhaseTimer
+from meta_agent_partition import MetaAgentPartition
+from conflict_history import ConflictHistory
+from adaptive_merge import AdaptiveMergePolicy
 
 import copy
 
-import numpy
+# The number of conflicts two meta-agents may have before they are merged (the merge bound B of MA-CBS). A solver
+# created with merge_threshold='adaptive' decides from the projected costs of merging and splitting instead (see
+# adaptive_merge.py)
+MERGE_THRESHOLD = 7
+
+# What the search does with the open list when two meta-agents are merged:
+#   restart           - discard the open list and continue from the merged node
+#   in_place          - push the merged node alongside the open list, in place of the children of the split
+#   restart_from_root - discard the open list and restart from a new root with the merged meta-agents, reusing the
+#                       root paths of every meta-agent but the new one
+MERGE_POLICIES = ('restart', 'in_place', 'restart_from_root')
+
 
 '''
    ## Reference to class
@@ -22,19 +39,19 @@ import numpy
 #       PEP 505 - None-aware operators: https://www.python.org/dev/peps/pep-0505/#syntax-and-semantics
 '''
 
-def generate_child(constraints, paths, agent_collisions, ma_list):
+def generate_child(constraints, paths, conflict_history, partition):
 
-    assert isinstance(ma_list , list)
+    assert isinstance(partition, MetaAgentPartition)
 
-    collisions = detect_collisions(paths, ma_list)
+    collisions = detect_collisions(paths, partition)
     cost = get_sum_of_cost(paths)
     child_node = {
         'cost':cost,
         'constraints': copy.deepcopy(constraints),
         'paths': copy.deepcopy(paths), # {0: {'path':[..path...]}, ... , n: {'path':[..path...]} # not sure if other keys are needed
         'ma_collisions': collisions,
-        'agent_collisions':copy.deepcopy(agent_collisions), # matrix of collisions in history between pairs of simple agents
-        'ma_list': copy.deepcopy(ma_list) # [{a1,a2}, ... ]
+        'conflict_history': conflict_history, # immutable, so it is shared with the parent instead of copied
+        'partition': partition # immutable, so it is shared with the parent instead of copied
     }
     return child_node
 
@@ -68,7 +85,7 @@ def detect_collision(path1, path2, pos=None):
     return None
 
 
-def detect_collisions(paths, ma_list, collisions=None):
+def detect_collisions(paths, partition, collisions=None):
     ##############################
     # Task 3.1: Return a list of first collisions between all robot pairs.
     #           A collision can be represented as dictionary that contains the id of the two robots, the vertex or edge
@@ -78,22 +95,22 @@ def detect_collisions(paths, ma_list, collisions=None):
     if collisions is None:
         collisions = []
     for ai in range(len(paths)-1):
+        # find meta-agents of agents in collision
+        ma_i = partition.group_of(ai)
         for aj in range(ai+1,len(paths)):
-            if detect_collision(paths[ai],paths[aj]) !=None:
-                position,t = detect_collision(paths[ai],paths[aj])
-
-                # find meta-agents of agents in collision 
-                assert isinstance(ma_list , list)
-                ma_i = get_ma_of_agent(ai, ma_list)
-                assert isinstance(ma_list , list)
-                ma_j = get_ma_of_agent(aj, ma_list)
-
-                # check if internal collision in the same meta-agent
-                if ma_i != ma_j:
-                    collisions.append({'a1':ai, 'ma1':ma_i,
-                                    'a2':aj, 'ma2':ma_j,
-                                    'loc':position,
-                                    'timestep':t+1})
+            ma_j = partition.group_of(aj)
+
+            # skip internal collisions in the same meta-agent
+            if ma_i is ma_j:
+                continue
+
+            collision = detect_collision(paths[ai],paths[aj])
+            if collision is not None:
+                position,t = collision
+                collisions.append({'a1':ai, 'ma1':ma_i,
+                                'a2':aj, 'ma2':ma_j,
+                                'loc':position,
+                                'timestep':t+1})
     return collisions
 
 def count_all_collisions_pair(path1, path2):
@@ -162,7 +179,7 @@ def standard_splitting(collision, constraints=None):
     # pass
 
 
-def disjoint_splitting(collision, constraints=None):
+def disjoint_splitting(collision, constraints=None, rng=random):
     ##############################
     # Task 4.1: Return a list of (two) constraints to resolve the given collision
     #           Vertex collision: the first constraint enforces one agent to be at the specified location at the
@@ -171,11 +188,11 @@ def disjoint_splitting(collision, constraints=None):
     #           Edge collision: the first constraint enforces one agent to traverse the specified edge at the
     #                          specified timestep, and the second constraint prevents the same agent to traverse the
     #                          specified edge at the specified timestep
-    #           Choose the agent randomly
+    #           Choose the agent randomly (with rng, the random module unless the solver is seeded)
     if constraints is None:
         constraints = []
 
-    a = random.choice([('a1','ma1'), ('a2','ma2')]) # chosen agent
+    a = rng.choice([('a1','ma1'), ('a2','ma2')]) # chosen agent
     agent = a[0]
     meta_agent = a[1]
 
@@ -223,27 +240,15 @@ def disjoint_splitting(collision, constraints=None):
                                 })
     return constraints
 
-# get the meta-agent an agent is a part of
-# do NOT use for constraints, use key 'meta-agent' in constraint
-def get_ma_of_agent(agent, ma_list):
-
-    assert isinstance(ma_list , list)
-    for ma in ma_list:
-        # print(ma, ma_list)
-        if agent in ma:
-            # print(agent, ma)
-            return ma
-    raise BaseException('No meta-agent found for agent')
-                        
-
 # find meta-agents of the agents that violates constraint
-def meta_agents_violate_constraint(constraint, paths, ma_list, violating_ma=None):
+# the meta-agent of an agent comes from the partition; for constraints, use key 'meta_agent' in constraint
+def meta_agents_violate_constraint(constraint, paths, partition, violating_ma=None):
     assert constraint['positive'] is True
     if violating_ma is None:
         violating_ma = []
 
     for i in range(len(paths)):
-        ma_i = get_ma_of_agent(i, ma_list)
+        ma_i = partition.group_of(i)
 
         if ma_i == constraint['meta_agent'] or ma_i in violating_ma:
             continue
@@ -309,36 +314,43 @@ def bypass_found(curr_cost, new_cost, curr_collisions_num, new_collisions_num):
         return True
     return False
 
-def should_merge(collision, p, N=0):
-    a1 = collision['a1']
-    a2 = collision['a2']
-
-    if a1 > a2:
-        a1, a2 = a2, a1
-    assert a1 < a2
-    p['agent_collisions'][a1][a2] += 1
+class ICBS_Solver(object):
+    """The high-level search of CBS."""
 
-    if p['agent_collisions'][a1][a2] > N:
-        return True
+    def __init__(self, my_map, starts, goals, budget=None, time_phases=False, merge_policy='restart', merge_threshold=None, seed=None):
+        """my_map       - list of lists specifying obstacle positions
+        starts          - [(x1, y1), (x2, y2), ...] list of start locations
+        goals           - [(x1, y1), (x2, y2), ...] list of goal locations
+        budget          - Budget limiting the search. Defaults to DEFAULT_MAX_HL_NODES high-level nodes
+        time_phases     - whether to measure the time spent in each phase of the search (see self.phase_times)
+        merge_policy    - what to do with the open list when meta-agents are merged, one of MERGE_POLICIES
+        merge_threshold - the number of conflicts before two meta-agents are merged, or 'adaptive'.
+                          Defaults to MERGE_THRESHOLD
+        seed            - seed of the random number generator of the splitter. If None, it uses the random module
+        """
 
-    ma1 = collision['ma1']
-    ma2 = collision['ma2']
-    
-    # check it is same meta-agent
-    assert ma1 != ma2
-    assert not (a2 in ma1 or a1 in ma2)
+        # The splitter draws from its own generator, so a seeded run can be reproduced
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(seed)
 
-    return False
+        if merge_policy not in MERGE_POLICIES:
+            raise ValueError('Unknown merge policy: {}'.format(merge_policy))
+        self.merge_policy = merge_policy
 
+        if merge_threshold is None:
+            merge_threshold = MERGE_THRESHOLD
+        if merge_threshold != 'adaptive' and not isinstance(merge_threshold, int):
+            raise ValueError('Unknown merge threshold: {}'.format(merge_threshold))
+        self.merge_threshold = merge_threshold
 
-class ICBS_Solver(object):
-    """The high-level search of CBS."""
+        # The merges of the search, the open-list nodes they kept (compared to restarting from the merged node) and
+        # discarded, and the low-level searches saved by reusing root paths
+        self.merge_stats = {'merges': 0, 'hl_nodes_saved': 0, 'hl_nodes_discarded': 0, 'll_searches_saved': 0}
 
-    def __init__(self, my_map, starts, goals):
-        """my_map   - list of lists specifying obstacle positions
-        starts      - [(x1, y1), (x2, y2), ...] list of start locations
-        goals       - [(x1, y1), (x2, y2), ...] list of goal locations
-        """
+        if budget is None:
+            budget = Budget(hl_nodes=DEFAULT_MAX_HL_NODES)
+        self.budget = budget
+        self.budget_report = None
 
         self.my_map = my_map
         self.starts = starts
@@ -348,21 +360,31 @@ class ICBS_Solver(object):
         self.num_of_expanded = 0
         self.CPU_time = 0
 
-        self.open_list = []
+        self.open_list = BucketQueue()
+
+        # Time spent in each phase of the search, in seconds
+        self.phase_timer = PhaseTimer(time_phases)
+        self.phase_times = self.phase_timer.times
 
         # compute heuristics for the low-level search
         self.heuristics = []
-        for goal in self.goals:
-            self.heuristics.append(compute_heuristics(my_map, goal))
+        with self.phase_timer.phase('heuristics'):
+            for goal in self.goals:
+                self.heuristics.append(compute_heuristics(my_map, goal))
+
+        # The adaptive merge policy, which measures the low-level searches of the solver
+        self.adaptive_merge = None
+        if merge_threshold == 'adaptive':
+            self.adaptive_merge = AdaptiveMergePolicy(my_map, starts, self.heuristics)
 
     def push_node(self, node):
-        heapq.heappush(self.open_list, (node['cost'], len(node['ma_collisions']), self.num_of_generated, node))
+        self.open_list.push(node['cost'], len(node['ma_collisions']), self.num_of_generated, node)
         print("> Generate node {} with cost {}".format(self.num_of_generated, node['cost']))
         self.num_of_generated += 1
         
 
     def pop_node(self):
-        _, _, id, node = heapq.heappop(self.open_list)
+        _, _, id, node = self.open_list.pop()
         print("> Expand node {} with cost {}".format(id, node['cost']))
         self.num_of_expanded += 1
         return node
@@ -386,8 +408,9 @@ class ICBS_Solver(object):
 
         assert temp_constraints[0]['meta_agent'] == ma1
         path1_constraints = combined_constraints(p['constraints'], temp_constraints[0])
-        astar_ma1 = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(ma1),path1_constraints)
-        alt_paths1 = astar_ma1.find_paths()
+        astar_ma1 = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(ma1),path1_constraints, budget=self.budget)
+        with self.phase_timer.phase('low_level_search'):
+            alt_paths1 = astar_ma1.find_paths()
 
         # get current paths of meta-agent
         curr_paths = []
@@ -423,8 +446,9 @@ class ICBS_Solver(object):
 
         assert temp_constraints[1]['meta_agent'] == ma2
         path2_constraints = combined_constraints(p['constraints'], temp_constraints[1])
-        astar_ma2 = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(ma2),path2_constraints)
-        alt_paths2 = astar_ma2.find_paths()
+        astar_ma2 = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(ma2),path2_constraints, budget=self.budget)
+        with self.phase_timer.phase('low_level_search'):
+            alt_paths2 = astar_ma2.find_paths()
 
         # if not alt_path2 or bigger:
         curr_paths = []
@@ -461,8 +485,8 @@ class ICBS_Solver(object):
             
         return cardinality        
 
-    # returns new merged agents (the meta-agent), and updated list of ma_list
-    def merge_agents(self, collision, ma_list):
+    # returns new merged agents (the meta-agent), and the updated partition
+    def merge_agents(self, collision, partition):
 
         # constraints = standard_splitting(collision)
         
@@ -472,29 +496,63 @@ class ICBS_Solver(object):
         ma1 = collision['ma1']
         ma2 = collision['ma2']
 
-        meta_agent = set.union(ma1, ma2)
+        meta_agent, partition = partition.merge(ma1, ma2)
 
         print('new merged meta_agent ', meta_agent)
 
-        assert meta_agent not in ma_list
+        return meta_agent, partition
+
+    # returns whether to merge the meta-agents of the chosen collision of node p
+    def should_merge(self, p, collision):
+        if self.adaptive_merge is None:
+            return p['conflict_history'].should_merge(collision, self.merge_threshold)
+        return self.adaptive_merge.should_merge(collision, p['paths'], p['conflict_history'])
 
-        ma_list.remove(ma1)
-        ma_list.remove(ma2)
-        ma_list.append(meta_agent)
+    # records the size of a low-level search for the adaptive merge policy
+    def record_search(self, meta_agent, astar, joint=False):
+        if self.adaptive_merge is None:
+            return
+        if joint:
+            self.adaptive_merge.record_joint_search(meta_agent, astar.num_generated)
+        else:
+            self.adaptive_merge.record_search(meta_agent, astar.num_generated)
+
+    # returns a new root node with the merged meta-agents, for the restart_from_root merge policy
+    def generate_root(self, meta_agent, partition, conflict_history):
+
+        # Only the new meta-agent is planned again; the root paths of the other meta-agents are still valid
+        with self.phase_timer.phase('root_planning'):
+            astar = A_Star(self.my_map, self.starts, self.goals, self.heuristics, list(meta_agent), [], budget=self.budget)
+            with self.phase_timer.phase('low_level_search'):
+                ma_paths = astar.find_paths()
+            self.record_search(meta_agent, astar, joint=True)
+
+        if ma_paths is None:
+            raise BaseException('No solutions')
 
-        return meta_agent, ma_list
+        paths = copy.deepcopy(self.root_paths)
+        for i, agent in enumerate(meta_agent):
+            paths[agent] = ma_paths[i]
+        self.root_paths = paths
 
+        self.merge_stats['ll_searches_saved'] += len(partition) - 1
 
-    def find_solution(self, disjoint):
+        with self.phase_timer.phase('collision_detection'):
+            return generate_child([], paths, conflict_history, partition)
+
+
+    @budgeted
+    def find_solution(self, disjoint, print_results=True):
         """ Finds paths for all agents from their start locations to their goal locations
 
         disjoint         - use disjoint splitting or not
+        print_results    - print the solution and the statistics of the search when it is found
         """
 
         self.start_time = timer.time()
         
         if disjoint:
-            splitter = disjoint_splitting
+            splitter = partial(disjoint_splitting, rng=self.rng)
         else:
             splitter = standard_splitting
 
@@ -510,39 +568,44 @@ class ICBS_Solver(object):
             'constraints': [],
             'paths': [],
             'ma_collisions': [],
-            'agent_collisions': None, # matrix of collisions in history between pairs of (meta-)agents
-            'ma_list': [] # [{a1,a2}, ... ]
+            'conflict_history': ConflictHistory(), # collisions in history between pairs of simple agents
+            'partition': MetaAgentPartition(self.num_of_agents) # every agent starts as its own meta-agent
         }       
         
-        for i in range(self.num_of_agents):  # Find initial path for each agent
-            astar = AStar(self.my_map, self.starts, self.goals, self.heuristics, [i], root['constraints'])
-            path = astar.find_paths()
+        with self.phase_timer.phase('root_planning'):
+            for i in range(self.num_of_agents):  # Find initial path for each agent
+                astar = AStar(self.my_map, self.starts, self.goals, self.heuristics, [i], root['constraints'], budget=self.budget)
+                with self.phase_timer.phase('low_level_search'):
+                    path = astar.find_paths()
+                self.record_search([i], astar)
 
 
-            if path is None:
-                raise BaseException('No solutions')
-            root['ma_list'].append({i})
-            root['paths'].extend(path)
+                if path is None:
+                    raise BaseException('No solutions')
+                root['paths'].extend(path)
 
 
 
         root['cost'] = get_sum_of_cost(root['paths'])
-        root['ma_collisions'] = detect_collisions(root['paths'], root['ma_list'])
-        root['agent_collisions'] = numpy.zeros((self.num_of_agents, self.num_of_agents))
+        with self.phase_timer.phase('collision_detection'):
+            root['ma_collisions'] = detect_collisions(root['paths'], root['partition'])
         self.push_node(root)
 
+        # The paths of the root, reused when the search restarts from the root after a merge
+        self.root_paths = copy.deepcopy(root['paths'])
+
 
 
         # ATTENTION: THE CBS LOOOOOOOOOOOOP ============@#￥#%#@￥@#%##@￥======  STARTS ---#￥%------   HERE  ---- @
         # normal CBS with disjoint and standard splitting
         while len(self.open_list) > 0:
-            if self.num_of_generated > 50000:
-                print('reached maximum number of nodes. Returning...')
-                return None 
+            # Stop if the budget has run out (by default, after DEFAULT_MAX_HL_NODES nodes)
+            self.budget.check(hl_nodes=self.num_of_generated)
             print('\n')  
             p = self.pop_node()
             if p['ma_collisions'] == []:
-                self.print_results(p)
+                if print_results:
+                    self.print_results(p)
                 # for pa in p['paths']:
                 #     # print('asfasdfasdf       ',pa)
                 return p['paths'], self.num_of_generated, self.num_of_expanded # number of nodes generated/expanded for comparing implementations
@@ -565,7 +628,8 @@ class ICBS_Solver(object):
 
                 print(collision)
 
-                collision_type = self.detect_cardinal_conflict(AStar, p, collision)
+                with self.phase_timer.phase('cardinal_detection'):
+                    collision_type = self.detect_cardinal_conflict(AStar, p, collision)
                 if collision_type == 'cardinal' and new_constraints is None:    
                     print('Detected cardinal collision. Chose it.')
                     print(collision)
@@ -576,7 +640,8 @@ class ICBS_Solver(object):
 
             else: # no cardinal collisions found
                 for collision in p['ma_collisions']:
-                    collision_type = self.detect_cardinal_conflict(AStar, p, collision)
+                    with self.phase_timer.phase('cardinal_detection'):
+                        collision_type = self.detect_cardinal_conflict(AStar, p, collision)
                     if collision_type == 'semi-cardinal':    
                         
                         print('Detected semi-cardinal collision. Chose it.')
@@ -593,12 +658,7 @@ class ICBS_Solver(object):
 
 
             # keep track of collisions in history (aSh)
-            chosen_a1 = chosen_collision['a1']
-            chosen_a2 = chosen_collision['a2']
-            if chosen_a1 > chosen_a2:
-                # swap to only fill half of the matrix
-                chosen_a1, chosen_a2 = chosen_a2, chosen_a1
-            p['agent_collisions'][chosen_a1][chosen_a2] += 1
+            p['conflict_history'] = p['conflict_history'].record(chosen_collision)
 
 
             new_constraints = splitter(chosen_collision)
@@ -616,12 +676,10 @@ class ICBS_Solver(object):
             for constraint in new_constraints:
                 print(constraint)
                 
-                updated_constraints = combined_constraints(p['constraints'], constraint)
-                q = generate_child(updated_constraints, p['paths'], p['agent_collisions'], p['ma_list'])
-
-
-                assert isinstance(p['ma_list'] , list)
-                assert isinstance(q['ma_list'] , list)
+                with self.phase_timer.phase('constraint_combination'):
+                    updated_constraints = combined_constraints(p['constraints'], constraint)
+                with self.phase_timer.phase('node_copying'):
+                    q = generate_child(updated_constraints, p['paths'], p['conflict_history'], p['partition'])
 
                 ma = constraint['meta_agent']
 
@@ -631,8 +689,10 @@ class ICBS_Solver(object):
                 for a in ma:
                     print (q['paths'][a])
 
-                astar = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(ma),q['constraints'])
-                paths = astar.find_paths()
+                astar = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(ma),q['constraints'], budget=self.budget)
+                with self.phase_timer.phase('low_level_search'):
+                    paths = astar.find_paths()
+                self.record_search(ma, astar)
 
                 if paths is not None:
                     
@@ -650,7 +710,7 @@ class ICBS_Solver(object):
 
                     if constraint['positive']:
                         # vol = paths_violate_constraint(constraint,q['paths'])
-                        violating_ma_list = meta_agents_violate_constraint(constraint, q['paths'], q['ma_list'])
+                        violating_ma_list = meta_agents_violate_constraint(constraint, q['paths'], q['partition'])
                         no_solution = False
                         for v_ma in violating_ma_list:
                             
@@ -662,8 +722,10 @@ class ICBS_Solver(object):
 
 
                             v_ma_list = list(v_ma) # should use same list for all uses
-                            astar_v_ma = AStar(self.my_map,self.starts,self.goals,self.heuristics,v_ma_list,q['constraints'])
-                            paths_v_ma = astar_v_ma.find_paths()
+                            astar_v_ma = AStar(self.my_map,self.starts,self.goals,self.heuristics,v_ma_list,q['constraints'], budget=self.budget)
+                            with self.phase_timer.phase('low_level_search'):
+                                paths_v_ma = astar_v_ma.find_paths()
+                            self.record_search(v_ma_list, astar_v_ma)
 
 
 
@@ -691,7 +753,8 @@ class ICBS_Solver(object):
                         if no_solution:
                             continue # move on to the next constraint
 
-                    q['ma_collisions'] = detect_collisions(q['paths'],q['ma_list'])
+                    with self.phase_timer.phase('collision_detection'):
+                        q['ma_collisions'] = detect_collisions(q['paths'],q['partition'])
 
                     if chosen_collision in q['ma_collisions']:
                         print(q['paths'])
@@ -716,7 +779,8 @@ class ICBS_Solver(object):
                         bypass_successful = True
                         break # break out of constraint loop
                     assert not bypass_successful
-                    child_nodes.append(copy.deepcopy(q))
+                    with self.phase_timer.phase('node_copying'):
+                        child_nodes.append(copy.deepcopy(q))
 
             if bypass_successful:
                 continue # start of while loop
@@ -724,14 +788,25 @@ class ICBS_Solver(object):
             assert not bypass_successful
 
             # MA-CBS
-            if should_merge(collision, p, 7):
+            if self.should_merge(p, chosen_collision):
                 print('> Merge meta-agents into a new')
-                # returns meta_agent, ma_list
-                meta_agent, updated_ma_list = self.merge_agents(collision, p['ma_list'])
+                # returns meta_agent, partition
+                meta_agent, updated_partition = self.merge_agents(chosen_collision, p['partition'])
+
+                if self.merge_policy == 'restart_from_root':
+                    # Merge & restart from the root, with the merged meta-agents and without any constraints
+                    updated_node = self.generate_root(meta_agent, updated_partition, p['conflict_history'])
 
+                    self.merge_stats['merges'] += 1
+                    self.merge_stats['hl_nodes_discarded'] += len(self.open_list)
+                    self.empty_tree()
+                    self.push_node(updated_node)
+
+                    continue # start of while loop
 
                 # updated constraints
-                updated_constraints = copy.deepcopy(p['constraints'])
+                with self.phase_timer.phase('constraint_combination'):
+                    updated_constraints = copy.deepcopy(p['constraints'])
                 for c in updated_constraints:
                     if c['meta_agent'].issubset(meta_agent):
                         c['meta_agent'] = meta_agent
@@ -744,8 +819,10 @@ class ICBS_Solver(object):
 
 
                 # Update paths
-                ma_astar = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(meta_agent), updated_constraints)
-                ma_paths = ma_astar.find_paths()
+                ma_astar = AStar(self.my_map,self.starts, self.goals,self.heuristics,list(meta_agent), updated_constraints, budget=self.budget)
+                with self.phase_timer.phase('low_level_search'):
+                    ma_paths = ma_astar.find_paths()
+                self.record_search(meta_agent, ma_astar, joint=True)
 
 
                 # if can be 
@@ -754,7 +831,8 @@ class ICBS_Solver(object):
                     for i in range(len(meta_agent)):
                         print (ma_paths[i])
                                         
-                    updated_paths = copy.deepcopy(p['paths'])
+                    with self.phase_timer.phase('node_copying'):
+                        updated_paths = copy.deepcopy(p['paths'])
 
                     for i, agent in enumerate(meta_agent):
                         
@@ -772,16 +850,23 @@ class ICBS_Solver(object):
                     #     print (updated_paths[a])
 
                     # Update collisions, cost
-                    updated_node = generate_child(updated_constraints, updated_paths, p['agent_collisions'], updated_ma_list) 
+                    with self.phase_timer.phase('node_copying'):
+                        updated_node = generate_child(updated_constraints, updated_paths, p['conflict_history'], updated_partition) 
 
 
                     # print('agents {}, {} merged into agent {}'.format(collision['a1'], a2, meta_agent))
 
-                    # Merge & restart
-                    # restart with only updated node with merged agents
-                    self.empty_tree()
+                    self.merge_stats['merges'] += 1
+                    if self.merge_policy == 'restart':
+                        # Merge & restart
+                        # restart with only updated node with merged agents
+                        self.merge_stats['hl_nodes_discarded'] += len(self.open_list)
+                        self.empty_tree()
 
-                    assert self.open_list == []
+                        assert len(self.open_list) == 0
+                    else:
+                        # Merge in place: the merged node replaces the children of the split
+                        self.merge_stats['hl_nodes_saved'] += len(self.open_list)
 
                     self.push_node(updated_node)    
 
@@ -809,6 +894,8 @@ class ICBS_Solver(object):
 
         print("Expanded nodes:  {}".format(self.num_of_expanded))
         print("Generated nodes: {}".format(self.num_of_generated))
+        print("Merges:          {} ({} policy, {} HL nodes saved, {} discarded)".format(
+            self.merge_stats['merges'], self.merge_policy, self.merge_stats['hl_nodes_saved'], self.merge_stats['hl_nodes_discarded']))
 
 
         print("Solution:")
@@ -3,6 +3,12 @@ import heapq
 from itertools import product
 import numpy as np
 import copy
+import os
+import sys
+
+# bucket_queue is in code/, one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bucket_queue import BucketQueue
 
 def move(loc, dir):
     directions = [(0, 0), (0, -1), (1, 0), (0, 1), (-1, 0)]
@@ -148,7 +154,7 @@ class PEA_Star(object):
         self.num_expanded = 0
         self.CPU_time = 0
 
-        self.open_list = []
+        self.open_list = BucketQueue() # ordered by F, then h, then insertion order
         self.closed_list = dict()
 
         
@@ -178,12 +184,12 @@ class PEA_Star(object):
 
         f_value = node['g_val'] + node['h_val']
         # heapq.heappush(self.open_list, (node['F_val'], f_value, node['h_val'], node['loc'], node['timestep'], self.num_generated, node))
-        heapq.heappush(self.open_list, (node['F_val'], node['h_val'], node['loc'], -node['timestep'], self.num_generated, node))
+        self.open_list.push(node['F_val'], node['h_val'], self.num_generated, node)
         # print("Generate node {}".format(self.num_of_generated))
         self.num_generated += 1
 
     def pop_node(self):
-        _, _, _, _, id, curr = heapq.heappop(self.open_list)
+        _, _, id, curr = self.open_list.pop()
         # print("> Expand node {} t=d={} with F_val {}".format(id, curr['timestep'], curr['F_val']))
         self.num_expanded += 1
         return curr
@@ -63,19 +63,23 @@ def parse_scen_line(line: str) -> str:
 
     return agent_string
 
-def get_empty_map() -> str:
+def get_empty_map(height: int = 8, width: int = 8) -> str:
     '''
-    Return a string representing an empty 8x8 grid with the dimensions at the beginning.
+    Return a string representing an empty grid with the dimensions at the beginning.
+
+    Parameters
+    ----------
+    height : int
+        The height of the grid. Default is 8.
+    width : int
+        The width of the grid. Default is 8.
 
     Returns
     -------
     str
-        A string representing an empty 8x8 grid.
+        A string representing an empty grid.
     '''
 
-    height = 8
-    width = 8
-
     map_data = ['.' * width for _ in range(height)]
 
     map = '\n'.join(map_data)
@@ -0,0 +1,484 @@
+'''
+Generate large instances from parameterized map families, as MovingAI .map and .scen files (see movingai.py), so
+the solvers can be evaluated on layouts like the ones they are used on, and not only on 8x8 grids.
+
+The map families are:
+- random: obstacles placed independently with a given density
+- warehouse: rows of shelves separated by aisles, with a free border
+- rooms: a grid of square rooms, with one door in every wall between two neighboring rooms
+- maze: a maze with corridors one cell wide, carved by a randomized depth-first search
+
+The maps are built with NumPy array operations. The start and goal of every agent are drawn from the same connected
+component of the map (found by BFS labeling), so every agent can reach its goal. Instances are generated in parallel,
+one process per seed.
+
+Usage (from the code directory):
+    python instances/generate_instances.py --family warehouse --height 64 --width 64 --agents 100 --seeds 1 2 3 4
+'''
+
+import argparse
+import os
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+MAP_FAMILIES = ['random', 'warehouse', 'rooms', 'maze']
+
+OUTPUT_DIRECTORY = 'instances/generated'
+
+
+def generate_random_map(height: int, width: int, rng: np.random.Generator, density: float = 0.1) -> np.ndarray:
+    '''
+    Generate a map with randomly placed obstacles.
+
+    Parameters
+    ----------
+    height : int
+        The height of the map.
+    width : int
+        The width of the map.
+    rng : np.random.Generator
+        The random number generator.
+    density : float
+        The probability of a cell being an obstacle. Default is 0.1.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean array of shape (height, width) that is True at the obstacles.
+    '''
+
+    return rng.random((height, width)) < density
+
+
+def generate_warehouse_map(height: int, width: int, rng: np.random.Generator, shelf_length: int = 10,
+                           shelf_depth: int = 2, aisle_width: int = 1, border: int = 2) -> np.ndarray:
+    '''
+    Generate a warehouse map: rows of shelves separated by aisles, with a free border around them. Every shelf is
+    shelf_length cells long and shelf_depth cells deep, and consecutive shelves in a row are separated by one free
+    cell so agents can cross between the aisles.
+
+    Parameters
+    ----------
+    height : int
+        The height of the map.
+    width : int
+        The width of the map.
+    rng : np.random.Generator
+        The random number generator. Unused; every warehouse of a size has the same layout.
+    shelf_length : int
+        The length of a shelf. Default is 10.
+    shelf_depth : int
+        The depth of a shelf. Default is 2.
+    aisle_width : int
+        The width of the aisles between the rows of shelves. Default is 1.
+    border : int
+        The width of the free border. Default is 2.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean array of shape (height, width) that is True at the obstacles.
+    '''
+
+    rows = np.arange(height)[:, None]
+    columns = np.arange(width)[None, :]
+
+    in_shelf_row = (rows - border) % (shelf_depth + aisle_width) < shelf_depth
+    in_shelf_column = (columns - border) % (shelf_length + 1) < shelf_length
+    inside_border = (rows >= border) & (rows < height - border) & (columns >= border) & (columns < width - border)
+
+    return in_shelf_row & in_shelf_column & inside_border
+
+
+def generate_rooms_map(height: int, width: int, rng: np.random.Generator, room_size: int = 8) -> np.ndarray:
+    '''
+    Generate a map of square rooms. Every wall between two neighboring rooms has one door at a random position.
+
+    Parameters
+    ----------
+    height : int
+        The height of the map.
+    width : int
+        The width of the map.
+    rng : np.random.Generator
+        The random number generator.
+    room_size : int
+        The distance between two walls, so the inside of a room is room_size - 1 cells wide. Default is 8.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean array of shape (height, width) that is True at the obstacles.
+    '''
+
+    rows = np.arange(height)[:, None]
+    columns = np.arange(width)[None, :]
+
+    # Walls between the rooms, but not on the border of the map
+    horizontal_walls = (rows % room_size == 0) & (rows > 0)
+    vertical_walls = (columns % room_size == 0) & (columns > 0)
+    my_map = np.broadcast_to(horizontal_walls | vertical_walls, (height, width)).copy()
+
+    # A door in every wall segment between two wall crossings
+    for wall_row in range(room_size, height, room_size):
+        for start in range(0, width, room_size):
+            end = min(start + room_size, width)
+            if end - start > 1:
+                my_map[wall_row, rng.integers(start + 1, end)] = False
+
+    for wall_column in range(room_size, width, room_size):
+        for start in range(0, height, room_size):
+            end = min(start + room_size, height)
+            if end - start > 1:
+                my_map[rng.integers(start + 1, end), wall_column] = False
+
+    return my_map
+
+
+def generate_maze_map(height: int, width: int, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Generate a maze with corridors one cell wide, carved by a randomized depth-first search from the top-left cell.
+    The cells at even coordinates are the rooms of the maze, and the cells between them are carved into corridors.
+
+    Parameters
+    ----------
+    height : int
+        The height of the map.
+    width : int
+        The width of the map.
+    rng : np.random.Generator
+        The random number generator.
+
+    Returns
+    -------
+    np.ndarray
+        A boolean array of shape (height, width) that is True at the obstacles.
+    '''
+
+    my_map = np.ones((height, width), dtype=bool)
+    cell_rows, cell_columns = (height + 1) // 2, (width + 1) // 2
+    visited = np.zeros((cell_rows, cell_columns), dtype=bool)
+
+    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+    visited[0, 0] = True
+    my_map[0, 0] = False
+    stack = [(0, 0)]
+    while stack:
+        r, c = stack[-1]
+        neighbors = [(r + dr, c + dc) for dr, dc in directions
+                     if 0 <= r + dr < cell_rows and 0 <= c + dc < cell_columns and not visited[r + dr, c + dc]]
+        if not neighbors:
+            stack.pop()
+            continue
+
+        next_r, next_c = neighbors[rng.integers(len(neighbors))]
+        visited[next_r, next_c] = True
+        my_map[2 * next_r, 2 * next_c] = False
+        my_map[r + next_r, c + next_c] = False # the cell between the two rooms
+        stack.append((next_r, next_c))
+
+    return my_map
+
+
+MAP_GENERATORS = {
+    'random': generate_random_map,
+    'warehouse': generate_warehouse_map,
+    'rooms': generate_rooms_map,
+    'maze': generate_maze_map
+}
+
+
+def label_components(my_map: np.ndarray) -> np.ndarray:
+    '''
+    Label the connected components of the free cells of a map with a BFS from every unlabeled free cell.
+
+    Parameters
+    ----------
+    my_map : np.ndarray
+        A boolean array that is True at the obstacles.
+
+    Returns
+    -------
+    np.ndarray
+        An integer array of the shape of the map, with the label (starting at 0) of the component of every free
+        cell, and -1 at the obstacles.
+    '''
+
+    height, width = my_map.shape
+    labels = np.full((height, width), -1, dtype=np.int32)
+    free = ~my_map
+
+    label = 0
+    for start_r, start_c in zip(*np.nonzero(free)):
+        if labels[start_r, start_c] != -1:
+            continue
+
+        labels[start_r, start_c] = label
+        queue = deque([(start_r, start_c)])
+        while queue:
+            r, c = queue.popleft()
+            for next_r, next_c in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= next_r < height and 0 <= next_c < width and free[next_r, next_c] and labels[next_r, next_c] == -1:
+                    labels[next_r, next_c] = label
+                    queue.append((next_r, next_c))
+        label += 1
+
+    return labels
+
+
+def get_distance(my_map: np.ndarray, start: tuple, goal: tuple) -> int:
+    '''
+    Get the length of the shortest path between two cells with a BFS.
+
+    Parameters
+    ----------
+    my_map : np.ndarray
+        A boolean array that is True at the obstacles.
+    start : tuple
+        The (row, column) of the start.
+    goal : tuple
+        The (row, column) of the goal.
+
+    Returns
+    -------
+    int
+        The length of the shortest path, or -1 if the goal can't be reached.
+    '''
+
+    height, width = my_map.shape
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        r, c = queue.popleft()
+        if (r, c) == goal:
+            return distances[goal]
+        for next_cell in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+            next_r, next_c = next_cell
+            if 0 <= next_r < height and 0 <= next_c < width and not my_map[next_r, next_c] and next_cell not in distances:
+                distances[next_cell] = distances[(r, c)] + 1
+                queue.append(next_cell)
+
+    return -1
+
+
+def draw_agents(my_map: np.ndarray, num_agents: int, rng: np.random.Generator) -> list:
+    '''
+    Draw distinct start and distinct goal locations for the agents. The goal of every agent is in the same connected
+    component as its start.
+
+    Parameters
+    ----------
+    my_map : np.ndarray
+        A boolean array that is True at the obstacles.
+    num_agents : int
+        The number of agents.
+    rng : np.random.Generator
+        The random number generator.
+
+    Returns
+    -------
+    list
+        The ((start row, start column), (goal row, goal column)) of every agent.
+    '''
+
+    labels = label_components(my_map)
+    free_cells = np.argwhere(labels >= 0)
+    if len(free_cells) < num_agents:
+        raise ValueError(f'The map only has {len(free_cells)} free cells, {num_agents} agents were requested.')
+
+    # The free cells of every component, in random order
+    order = rng.permutation(len(free_cells))
+    cells_by_label = dict()
+    for r, c in free_cells[order]:
+        cells_by_label.setdefault(labels[r, c], []).append((int(r), int(c)))
+
+    agents = []
+    used_starts, used_goals = set(), set()
+    for r, c in free_cells[rng.permutation(len(free_cells))]:
+        if len(agents) == num_agents:
+            break
+
+        start = (int(r), int(c))
+        if start in used_starts:
+            continue
+
+        # The goal is drawn from the start's own component; the first cell that isn't taken yet
+        component = cells_by_label[labels[r, c]]
+        goal = next((cell for cell in component if cell != start and cell not in used_goals), None)
+        if goal is None:
+            continue
+
+        used_starts.add(start)
+        used_goals.add(goal)
+        component.remove(goal)
+        agents.append((start, goal))
+
+    if len(agents) < num_agents:
+        raise ValueError(f'Could only place {len(agents)} of {num_agents} agents on the map.')
+
+    return agents
+
+
+def write_map(my_map: np.ndarray, filename: str):
+    '''
+    Write a map as a MovingAI .map file.
+
+    Parameters
+    ----------
+    my_map : np.ndarray
+        A boolean array that is True at the obstacles.
+    filename : str
+        The name of the output file.
+
+    Returns
+    -------
+    None
+    '''
+
+    height, width = my_map.shape
+    rows = np.where(my_map, '@', '.')
+    map_data = '\n'.join(''.join(row) for row in rows)
+
+    with open(filename, 'w') as f:
+        f.write(f'type octile\nheight {height}\nwidth {width}\nmap\n{map_data}\n')
+
+
+def write_scenario(my_map: np.ndarray, agents: list, map_name: str, filename: str):
+    '''
+    Write the agents as a MovingAI .scen file. Every agent is in bucket 0, and the last column is the length of its
+    shortest path.
+
+    Parameters
+    ----------
+    my_map : np.ndarray
+        A boolean array that is True at the obstacles.
+    agents : list
+        The ((start row, start column), (goal row, goal column)) of every agent.
+    map_name : str
+        The name of the .map file, as written in the scenario.
+    filename : str
+        The name of the output file.
+
+    Returns
+    -------
+    None
+    '''
+
+    height, width = my_map.shape
+    lines = ['version 1']
+    for (start_r, start_c), (goal_r, goal_c) in agents:
+        distance = get_distance(my_map, (start_r, start_c), (goal_r, goal_c))
+        lines.append(f'0\t{map_name}\t{width}\t{height}\t{start_c}\t{start_r}\t{goal_c}\t{goal_r}\t{distance}')
+
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def generate_instance(family: str, height: int, width: int, num_agents: int, seed: int,
+                      output_directory: str = OUTPUT_DIRECTORY, **parameters) -> tuple:
+    '''
+    Generate a map of a family and a scenario for it, and write them to the output directory as
+    <family>-<height>-<width>-<seed>.map and .scen.
+
+    Parameters
+    ----------
+    family : str
+        The map family, one of MAP_FAMILIES.
+    height : int
+        The height of the map.
+    width : int
+        The width of the map.
+    num_agents : int
+        The number of agents in the scenario.
+    seed : int
+        The seed of the random number generator.
+    output_directory : str
+        The directory to write the files to. Default is OUTPUT_DIRECTORY.
+    **parameters
+        The parameters of the map family (e.g. density for random maps).
+
+    Returns
+    -------
+    tuple
+        The names of the .map and .scen files.
+    '''
+
+    rng = np.random.default_rng(seed)
+    my_map = MAP_GENERATORS[family](height, width, rng, **parameters)
+    agents = draw_agents(my_map, num_agents, rng)
+
+    name = f'{family}-{height}-{width}-{seed}'
+    map_file = os.path.join(output_directory, name + '.map')
+    scen_file = os.path.join(output_directory, name + '.scen')
+
+    write_map(my_map, map_file)
+    write_scenario(my_map, agents, name + '.map', scen_file)
+
+    return map_file, scen_file
+
+
+def generate_instances(family: str, height: int, width: int, num_agents: int, seeds: list,
+                       output_directory: str = OUTPUT_DIRECTORY, processes: int = None, **parameters) -> list:
+    '''
+    Generate one instance per seed, in parallel.
+
+    Parameters
+    ----------
+    family : str
+        The map family, one of MAP_FAMILIES.
+    height : int
+        The height of the maps.
+    width : int
+        The width of the maps.
+    num_agents : int
+        The number of agents in every scenario.
+    seeds : list
+        The seeds of the instances.
+    output_directory : str
+        The directory to write the files to. Default is OUTPUT_DIRECTORY.
+    processes : int
+        The number of worker processes. Default is None (one per CPU).
+    **parameters
+        The parameters of the map family.
+
+    Returns
+    -------
+    list
+        The names of the .map and .scen files of every instance.
+    '''
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    tasks = [(family, height, width, num_agents, seed, output_directory) for seed in seeds]
+    with Pool(processes) as pool:
+        results = [pool.apply_async(generate_instance, task, parameters) for task in tasks]
+        return [result.get() for result in results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate large instances from parameterized map families, as MovingAI .map and .scen files.')
+
+    parser.add_argument('--family', type=str, required=True, choices=MAP_FAMILIES, help='The map family.')
+    parser.add_argument('--height', type=int, default=32, help='The height of the maps. Default is 32.')
+    parser.add_argument('--width', type=int, default=32, help='The width of the maps. Default is 32.')
+    parser.add_argument('--agents', type=int, default=50, help='The number of agents in every scenario. Default is 50.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1], help='The seeds of the instances; one instance is generated per seed. Default is 1.')
+    parser.add_argument('--output_directory', '-o', type=str, default=OUTPUT_DIRECTORY, help=f'The directory to write the instances to. Default is "{OUTPUT_DIRECTORY}".')
+    parser.add_argument('--processes', type=int, default=None, help='The number of worker processes. Default is one per CPU.')
+    parser.add_argument('--density', type=float, default=None, help='The obstacle density of random maps. Default is 0.1.')
+    parser.add_argument('--room_size', type=int, default=None, help='The size of the rooms of rooms maps. Default is 8.')
+    parser.add_argument('--shelf_length', type=int, default=None, help='The length of the shelves of warehouse maps. Default is 10.')
+
+    args = parser.parse_args()
+
+    # Only pass the parameters that were given, and that belong to the family
+    family_parameters = {'random': ['density'], 'warehouse': ['shelf_length'], 'rooms': ['room_size'], 'maze': []}
+    parameters = {name: getattr(args, name) for name in family_parameters[args.family] if getattr(args, name) is not None}
+
+    files = generate_instances(args.family, args.height, args.width, args.agents, args.seeds,
+                               args.output_directory, args.processes, **parameters)
+    for map_file, scen_file in files:
+        print(f'Wrote {map_file} and {scen_file}')
@@ -0,0 +1,255 @@
+'''
+This file contains MAC-ICBS: CBS with Tuvya (group) splitting, combined with the improvements of ICBS, conflict
+prioritization and bypassing. It is used to measure whether the node savings of Tuvya splitting stack with those of
+ICBS.
+
+The solver extends CBSSolver (cbs_basic.py) and uses the same splitters. The cardinality of a conflict is computed
+against the constraints the splitter actually adds, so with Tuvya splitting a conflict is cardinal when both groups
+are delayed by their group constraints. A child only replans the agents whose paths violate its new constraints: the
+paths of the other agents of a group satisfy the group constraint and stay optimal.
+
+Classes
+-------
+MAC_ICBS_Solver
+    The high-level search of MAC-ICBS.
+'''
+
+import time as timer
+from functools import partial
+
+from a_star_class import get_sum_of_cost
+from budget import budgeted
+from cbs_basic import CBSSolver, detect_collisions, standard_splitting, disjoint_splitting, get_tuvya_splitting, \
+    get_constraint_agents, combine_constraints, update_constraint_hash, path_matches_constraint, paths_violate_constraint
+
+# The cardinalities of a conflict, from the most to the least preferred for splitting
+CARDINALITIES = ['cardinal', 'semi-cardinal', 'non-cardinal']
+
+
+class MAC_ICBS_Solver(CBSSolver):
+    """The high-level search of MAC-ICBS."""
+
+    def __init__(self, my_map, starts, goals, timeout = None, budget = None, time_phases = False, heuristics = None, seed = None):
+        """
+        Takes the same arguments as CBSSolver.
+        """
+
+        super().__init__(my_map, starts, goals, timeout=timeout, budget=budget, time_phases=time_phases, heuristics=heuristics, seed=seed)
+
+        # The number of conflicts split of every cardinality, and of bypasses taken
+        self.num_of_cardinalities = {cardinality: 0 for cardinality in CARDINALITIES}
+        self.num_of_bypasses = 0
+
+    def evaluate_child(self, parent, new_constraints):
+        '''
+        Create a child node by adding new constraints to those of the parent and replanning the agents whose paths
+        violate them. The collisions of the child are not detected.
+
+        Parameters:
+            parent (dict): The node being expanded.
+            new_constraints (list[dict]): The constraints added to the child by the splitter.
+
+        Returns:
+            dict: The child node, or None if an agent has no path under the child's constraints.
+        '''
+
+        with self.phase_timer.phase('node_copying'):
+            paths = list(parent['paths'])
+
+        with self.phase_timer.phase('constraint_combination'):
+            constraints, constraint_keys = combine_constraints(parent['constraints'], parent['constraint_keys'], new_constraints)
+            constraint_hash = update_constraint_hash(parent['constraint_hash'], parent['constraint_keys'], new_constraints)
+
+        # Only the agents that violate their new constraint need a new path
+        for constraint in new_constraints:
+            for agent in get_constraint_agents(constraint):
+                if path_matches_constraint(paths[agent], constraint) != constraint['positive']:
+                    path = self.find_path(agent, constraints)
+                    if path is None:
+                        return None
+                    paths[agent] = path
+
+        # Agents that violate a positive constraint have to be replanned as well
+        for constraint in new_constraints:
+            if not constraint['positive']:
+                continue
+            for v in paths_violate_constraint(constraint, paths):
+                path_v = self.find_path(v, constraints)
+                if path_v is None:
+                    return None
+                paths[v] = path_v
+
+        return {'cost': get_sum_of_cost(paths),
+                'constraints': constraints,
+                'constraint_keys': constraint_keys,
+                'constraint_hash': constraint_hash,
+                'paths': paths,
+                'collisions': None
+        }
+
+    def classify_collision(self, parent, collision, splitter, group_splitting):
+        '''
+        Split a collision and find its cardinality from the costs of the children.
+
+        Parameters:
+            parent (dict): The node being expanded.
+            collision (dict): The collision.
+            splitter (function): The splitter.
+            group_splitting (bool): Whether the splitter returns a list of constraints for each child (Tuvya splitting).
+
+        Returns:
+            str: The cardinality of the collision: "cardinal" if the cost of both children is higher than the cost of
+            the parent (or a child has no solution), "semi-cardinal" if only one is, "non-cardinal" otherwise.
+            list: The constraints of every child.
+            list: The children (None for a child without a solution).
+        '''
+
+        if group_splitting:
+            constraint_sets = splitter(collision, parent['paths'])
+        else:
+            constraint_sets = [[constraint] for constraint in splitter(collision)]
+
+        children = [self.evaluate_child(parent, constraint_set) for constraint_set in constraint_sets]
+
+        delayed = sum(1 for child in children if child is None or child['cost'] > parent['cost'])
+        if delayed >= 2:
+            cardinality = 'cardinal'
+        elif delayed == 1:
+            cardinality = 'semi-cardinal'
+        else:
+            cardinality = 'non-cardinal'
+
+        return cardinality, constraint_sets, children
+
+    def choose_collision(self, parent, splitter, group_splitting, prioritize_conflicts):
+        '''
+        Choose the collision to split: the first cardinal collision, or else the first semi-cardinal collision, or else
+        the first collision.
+
+        Parameters:
+            parent (dict): The node being expanded.
+            splitter (function): The splitter.
+            group_splitting (bool): Whether the splitter returns a list of constraints for each child.
+            prioritize_conflicts (bool): Whether to prioritize the collisions by cardinality. If not, the first collision
+            is chosen.
+
+        Returns:
+            The return values of classify_collision() for the chosen collision.
+        '''
+
+        chosen = None
+        for collision in parent['collisions']:
+            classified = self.classify_collision(parent, collision, splitter, group_splitting)
+
+            if chosen is None or CARDINALITIES.index(classified[0]) < CARDINALITIES.index(chosen[0]):
+                chosen = classified
+            if not prioritize_conflicts or chosen[0] == 'cardinal':
+                break
+
+        return chosen
+
+    @budgeted
+    def find_solution(self, disjoint, do_tuvya_splitting = False, balanced_tuvya_splitting = True, print_results=False, detect_duplicates=True, prioritize_conflicts=True, bypass=True, partition_policy=None) -> tuple[list, int, int]:
+        """
+        Finds paths for all agents from their start locations to their goal locations
+
+        Parameters:
+            disjoint (bool): Whether to use disjoint splitting or not
+            do_tuvya_splitting (bool): Whether to use Tuvya's splitting or not
+            balanced_tuvya_splitting (bool): Whether to split the agents into two groups of equal size or not. Default is True.
+            print_results (bool): Whether to print the results or not. Default is False.
+            detect_duplicates (bool): Whether to drop children whose constraint set was already generated. Default is True.
+            prioritize_conflicts (bool): Whether to split cardinal, then semi-cardinal conflicts first. Default is True.
+            bypass (bool): Whether to take a bypass (adopt the paths of a child with the cost of its parent and fewer
+                collisions) instead of splitting. Default is True.
+            partition_policy (str): How Tuvya's splitting divides the agents, one of PARTITION_POLICIES (cbs_basic.py).
+                If None, it follows balanced_tuvya_splitting. Default is None.
+
+        Returns:
+            paths (list): A list of paths for all agents from their start locations to their goal locations.
+                None if the budget runs out; the reason is then in self.budget_report.
+            num_of_generated (int): The number of nodes generated.
+            num_of_expanded (int): The number of nodes expanded.
+        """
+
+        self.start_time = timer.time()
+
+        if disjoint:
+            splitter = partial(disjoint_splitting, rng=self.rng)
+        elif do_tuvya_splitting:
+            splitter = get_tuvya_splitting(self.num_of_agents, balanced_tuvya_splitting, partition_policy, self.my_map, self.starts, self.rng)
+        else:
+            splitter = standard_splitting
+        group_splitting = do_tuvya_splitting and not disjoint
+
+        root = {'cost': 0,
+                'constraints': [],
+                'constraint_keys': frozenset(),
+                'constraint_hash': 0,
+                'paths': [],
+                'collisions': []}
+
+        with self.phase_timer.phase('root_planning'):
+            for i in range(self.num_of_agents):  # Find initial path for each agent
+                path = self.find_path(i, root['constraints'])
+
+                if path is None:
+                    raise BaseException('No solutions')
+                root['paths'].append(path)
+
+        root['cost'] = get_sum_of_cost(root['paths'])
+        with self.phase_timer.phase('collision_detection'):
+            root['collisions'] = detect_collisions(root['paths'])
+        self.push_node(root)
+
+        while len(self.open_list) > 0:
+            # Stop if the budget (e.g. the timeout) has run out
+            self.budget.check(hl_nodes=self.num_of_generated)
+
+            p = self.pop_node()
+
+            if p['collisions'] == []:
+                if print_results:
+                    self.print_results(p)
+                return p['paths'], self.num_of_generated, self.num_of_expanded # number of nodes generated/expanded for comparing implementations
+
+            with self.phase_timer.phase('cardinal_detection'):
+                cardinality, constraint_sets, children = self.choose_collision(p, splitter, group_splitting, prioritize_conflicts)
+            self.num_of_cardinalities[cardinality] += 1
+
+            child_nodes = []
+            bypass_node = None
+            for constraint_set, q in zip(constraint_sets, children):
+                # If a path is not found for an agent, skip the node
+                if q is None:
+                    continue
+
+                with self.phase_timer.phase('collision_detection'):
+                    q['collisions'] = detect_collisions(q['paths'])
+
+                # Take the bypass: the child's paths have the cost of the parent and fewer collisions, so they replace
+                # the paths of the parent. The parent keeps its constraints, so no part of its subtree is lost.
+                if bypass and q['cost'] == p['cost'] and len(q['collisions']) < len(p['collisions']):
+                    bypass_node = dict(p, paths=q['paths'], collisions=q['collisions'])
+                    break
+
+                child_nodes.append((constraint_set, q))
+
+            if bypass_node is not None:
+                self.num_of_bypasses += 1
+                self.push_node(bypass_node)
+                continue
+
+            for constraint_set, q in child_nodes:
+                # Skip children whose constraint set was already generated on another branch
+                if detect_duplicates and self.is_duplicate(q['constraint_hash'], p['constraint_keys'], constraint_set):
+                    self.num_of_duplicates += 1
+                    continue
+
+                self.push_node(q)
+        return None
+
+    def print_results(self, node, show_paths = False):
+        super().print_results(node, show_paths)
+        print("Bypasses:        {}".format(self.num_of_bypasses))
+        print("Cardinalities:   {}".format(self.num_of_cardinalities))
@@ -0,0 +1,123 @@
+'''
+This file contains the partition of the agents into meta-agents used by MA-CBS (icbs_complete.py and cbs_ma.py).
+
+A partition is an array, indexed by agent, of the frozenset of the meta-agent each agent is in, so finding the
+meta-agent of an agent takes O(1). Partitions are immutable: merging two meta-agents returns a new partition and
+leaves the old one untouched. A child node in the constraint tree therefore shares its parent's partition instead of
+copying it, and only a merge creates a new one.
+
+Classes
+-------
+MetaAgentPartition
+    An immutable partition of the agents into meta-agents.
+'''
+
+
+class MetaAgentPartition(object):
+    '''
+    An immutable partition of the agents 0..N-1 into meta-agents. Every meta-agent is a frozenset of agents, and all
+    the agents of a meta-agent share the same frozenset object.
+    '''
+
+    __slots__ = ('_group_of',)
+
+    def __init__(self, num_of_agents=0, group_of=None):
+        '''
+        Parameters
+        ----------
+        num_of_agents : int
+            The number of agents. Every agent starts in a meta-agent of its own. Ignored if group_of is given.
+        group_of : tuple
+            The meta-agent of every agent. Used by merge() to build the merged partition.
+        '''
+
+        if group_of is None:
+            group_of = tuple(frozenset((agent,)) for agent in range(num_of_agents))
+        self._group_of = group_of
+
+    def group_of(self, agent):
+        '''
+        Returns the meta-agent (a frozenset of agents) the agent is in.
+        '''
+
+        return self._group_of[agent]
+
+    def same_group(self, agent1, agent2):
+        '''
+        Returns True if the two agents are in the same meta-agent.
+        '''
+
+        return self._group_of[agent1] is self._group_of[agent2]
+
+    def merge(self, group1, group2):
+        '''
+        Merge two meta-agents. The partition itself is not changed.
+
+        Parameters
+        ----------
+        group1 : frozenset
+            A meta-agent of the partition.
+        group2 : frozenset
+            Another meta-agent of the partition.
+
+        Returns
+        -------
+        tuple
+            The merged meta-agent and the new partition.
+        '''
+
+        assert group1 in self and group2 in self
+        assert group1.isdisjoint(group2)
+
+        merged = frozenset(group1 | group2)
+
+        group_of = list(self._group_of)
+        for agent in merged:
+            group_of[agent] = merged
+
+        return merged, MetaAgentPartition(group_of=tuple(group_of))
+
+    def groups(self):
+        '''
+        Returns the meta-agents of the partition, ordered by their lowest agent.
+        '''
+
+        groups = []
+        seen = set()
+        for group in self._group_of:
+            if id(group) not in seen:
+                seen.add(id(group))
+                groups.append(group)
+        return groups
+
+    @property
+    def num_of_agents(self):
+        return len(self._group_of)
+
+    # Partitions are immutable, so copies (e.g. when a whole node is deep-copied) can share them
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __contains__(self, group):
+        if not group:
+            return False
+        agent = next(iter(group))
+        return 0 <= agent < len(self._group_of) and self._group_of[agent] == group
+
+    def __iter__(self):
+        return iter(self.groups())
+
+    def __len__(self):
+        return len(self.groups())
+
+    def __eq__(self, other):
+        return isinstance(other, MetaAgentPartition) and self._group_of == other._group_of
+
+    def __hash__(self):
+        return hash(self._group_of)
+
+    def __repr__(self):
+        return 'MetaAgentPartition({})'.format([set(group) for group in self.groups()])
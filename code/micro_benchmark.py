@@ -0,0 +1,356 @@
+'''
+This file contains a micro-benchmark suite for the hot paths of the solvers. Every case is run on generated inputs
+with a fixed seed, at increasing sizes, and is timed several times. The timing distribution of every case is printed
+and saved as JSON, and can be compared against a stored baseline to flag regressions.
+
+Functions
+---------
+run_micro_benchmarks()
+    Run the suite and return the timing distribution of every case.
+compare_to_baseline()
+    Compare results to a baseline and return the cases that got slower.
+
+Notes
+-----
+The suite covers:
+- compute_heuristics on random maps
+- A_Star.find_paths for a single agent and for meta-agents of 2-4 agents
+- detect_collisions on the paths of many agents
+- A_Star.build_constraint_table with many constraints
+- One full CBSSolver.find_solution per splitting strategy, on a fixed Atzmon benchmark instance
+
+Usage (from code/):
+    python micro_benchmark.py                                   # run and save the results
+    python micro_benchmark.py --baseline <results.json>         # also compare against a baseline
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+from a_star_class import A_Star, compute_heuristics
+from cbs_basic import CBSSolver, detect_collisions
+from run_experiments import import_mapf_instance
+
+# The map sizes of the generated inputs
+SIZES = [8, 16, 32]
+
+# The fraction of blocked cells in the generated maps
+OBSTACLE_DENSITY = 0.1
+
+# The largest map each meta-agent size is run on; the joint search of large meta-agents grows quickly
+META_AGENT_MAX_SIZE = {1: 32, 2: 32, 3: 16, 4: 8}
+
+# The instance used for the full searches, relative to code/ (the script is run from there, like run_experiments.py)
+FIND_SOLUTION_INSTANCE = 'instances/atzmon_benchmark/10-percent/1-8-agents.txt'
+
+SPLITTING_STRATEGIES = ['standard', 'disjoint', 'tuvya_splitting', 'tuvya_splitting_imbalanced']
+
+# A case is a regression if its median time grew by more than this fraction
+DEFAULT_THRESHOLD = 0.1
+
+def generate_map(size, rng):
+    '''
+    Generate a square map with randomly placed obstacles.
+
+    Parameters
+    ----------
+    size : int
+        The width and height of the map.
+    rng : random.Random
+        The random number generator.
+
+    Returns
+    -------
+    list
+        The map, as a list of rows of booleans (True is an obstacle).
+    '''
+
+    return [[rng.random() < OBSTACLE_DENSITY for _ in range(size)] for _ in range(size)]
+
+def generate_agents(my_map, num_of_agents, rng):
+    '''
+    Pick distinct start and goal locations for the agents, such that every agent can reach its goal.
+
+    Parameters
+    ----------
+    my_map : list
+        The map.
+    num_of_agents : int
+        The number of agents.
+    rng : random.Random
+        The random number generator.
+
+    Returns
+    -------
+    tuple
+        The start locations, the goal locations and the heuristics of the agents.
+    '''
+
+    free_cells = [(r, c) for r in range(len(my_map)) for c in range(len(my_map[0])) if not my_map[r][c]]
+
+    starts, goals, heuristics = [], [], []
+    while len(starts) < num_of_agents:
+        start, goal = rng.sample(free_cells, 2)
+        if start in starts or goal in goals:
+            continue
+
+        h_values = compute_heuristics(my_map, goal)
+        if start not in h_values:
+            continue
+
+        starts.append(start)
+        goals.append(goal)
+        heuristics.append(h_values)
+
+    return starts, goals, heuristics
+
+def generate_constraints(my_map, num_of_agents, num_of_constraints, rng):
+    '''
+    Generate random negative vertex and edge constraints for the agents.
+    '''
+
+    constraints = []
+    for _ in range(num_of_constraints):
+        loc = (rng.randrange(len(my_map)), rng.randrange(len(my_map[0])))
+        if rng.random() < 0.5:
+            loc = [loc]
+        else:
+            loc = [loc, (loc[0], min(loc[1] + 1, len(my_map[0]) - 1))]
+
+        constraints.append({'agent': rng.randrange(num_of_agents),
+                            'loc': loc,
+                            'timestep': rng.randrange(1, 4 * len(my_map)),
+                            'positive': False})
+    return constraints
+
+def get_cases(seed):
+    '''
+    Get the cases of the suite. The inputs of every case are generated from the seed, so they are the same in every run.
+
+    Parameters
+    ----------
+    seed : int
+        The seed of the generated inputs.
+
+    Returns
+    -------
+    list
+        The cases, as (name, setup, run) tuples. setup() is called before every timed call of run(setup()), and is
+        not timed itself.
+    '''
+
+    cases = []
+
+    for size in SIZES:
+        rng = random.Random(seed * 1000 + size)
+        my_map = generate_map(size, rng)
+        starts, goals, heuristics = generate_agents(my_map, 32, rng)
+
+        # Heuristics for a single goal
+        cases.append(('compute_heuristics/{}x{}'.format(size, size),
+                      lambda: None,
+                      lambda _, my_map=my_map, goal=goals[0]: compute_heuristics(my_map, goal)))
+
+        # Low-level search for a single agent and for meta-agents
+        for meta_agent_size, max_size in META_AGENT_MAX_SIZE.items():
+            if size > max_size:
+                continue
+
+            agents = list(range(meta_agent_size)) if meta_agent_size > 1 else 0
+            cases.append(('a_star/{}x{}/agents={}'.format(size, size, meta_agent_size),
+                          lambda my_map=my_map, starts=starts, goals=goals, heuristics=heuristics, agents=agents:
+                              A_Star(my_map, starts, goals, heuristics, agents, []),
+                          lambda astar: astar.find_paths()))
+
+        # Collision detection over the shortest paths of every agent
+        for num_of_agents in [8, 16, 32]:
+            paths = []
+            for i in range(num_of_agents):
+                paths.append(A_Star(my_map, starts, goals, heuristics, i, []).find_paths()[0])
+
+            cases.append(('detect_collisions/{}x{}/agents={}'.format(size, size, num_of_agents),
+                          lambda: None,
+                          lambda _, paths=paths: detect_collisions(paths)))
+
+    # Constraint tables with many constraints
+    rng = random.Random(seed)
+    my_map = generate_map(32, rng)
+    starts, goals, heuristics = generate_agents(my_map, 8, rng)
+    for num_of_constraints in [100, 1000, 10000]:
+        constraints = generate_constraints(my_map, 8, num_of_constraints, rng)
+        cases.append(('build_constraint_table/constraints={}'.format(num_of_constraints),
+                      lambda constraints=constraints: A_Star(my_map, starts, goals, heuristics, 0, constraints),
+                      lambda astar: astar.build_constraint_table(0)))
+
+    # Full searches
+    my_map, starts, goals = import_mapf_instance(FIND_SOLUTION_INSTANCE)
+    for splitting_strategy in SPLITTING_STRATEGIES:
+        def setup(my_map=my_map, starts=starts, goals=goals):
+            return CBSSolver(my_map, starts, goals, seed=seed)
+
+        disjoint = splitting_strategy == 'disjoint'
+        tuvya_splitting = splitting_strategy.startswith('tuvya_splitting')
+        balanced = splitting_strategy != 'tuvya_splitting_imbalanced'
+        cases.append(('find_solution/{}'.format(splitting_strategy),
+                      setup,
+                      lambda cbs, disjoint=disjoint, tuvya_splitting=tuvya_splitting, balanced=balanced:
+                          cbs.find_solution(disjoint, tuvya_splitting, balanced)))
+
+    return cases
+
+def summarize(times):
+    '''
+    Summarize a list of timings.
+
+    Parameters
+    ----------
+    times : list
+        The timings in seconds.
+
+    Returns
+    -------
+    dict
+        The min, median, mean, 90th percentile and max of the timings, and the timings themselves.
+    '''
+
+    ordered = sorted(times)
+    return {
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.mean(ordered),
+        'p90': ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))],
+        'max': ordered[-1],
+        'times': times
+    }
+
+def run_micro_benchmarks(seed=0, repeats=10, case_filter=None):
+    '''
+    Run the suite and return the timing distribution of every case.
+
+    Parameters
+    ----------
+    seed : int
+        The seed of the generated inputs. Default is 0.
+    repeats : int
+        The number of timed calls of every case. Default is 10.
+    case_filter : str
+        Only run the cases whose name contains this string. Default is None (run every case).
+
+    Returns
+    -------
+    dict
+        The summary of every case (see summarize()), keyed by the name of the case.
+    '''
+
+    results = dict()
+    for name, setup, run in get_cases(seed):
+        if case_filter is not None and case_filter not in name:
+            continue
+
+        times = []
+
+        # An untimed warm-up call
+        run(setup())
+
+        for _ in range(repeats):
+            state = setup()
+            start_time = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - start_time)
+
+        results[name] = summarize(times)
+        print('{:<50} median {:>10.3f} ms   p90 {:>10.3f} ms'.format(name, results[name]['median'] * 1000, results[name]['p90'] * 1000))
+
+    return results
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    '''
+    Compare the median timings of the results to those of a baseline, and print the ratio of every case.
+
+    Parameters
+    ----------
+    results : dict
+        The results, as returned by run_micro_benchmarks().
+    baseline : dict
+        The baseline results.
+    threshold : float
+        The fraction the median may grow by before a case is a regression. Default is DEFAULT_THRESHOLD.
+
+    Returns
+    -------
+    list
+        The names of the cases that regressed.
+    '''
+
+    regressions = []
+    print('\n{:<50} {:>12} {:>12} {:>8}'.format('Case', 'Baseline ms', 'Current ms', 'Ratio'))
+    for name, summary in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = summary['median'] / baseline[name]['median']
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print('{:<50} {:>12.3f} {:>12.3f} {:>8.2f}{}'.format(name, baseline[name]['median'] * 1000, summary['median'] * 1000, ratio, flag))
+
+    return regressions
+
+def save_results(results, filename, seed, repeats):
+    '''
+    Save the results, with the settings and the platform they were measured on, as JSON.
+    '''
+
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(filename, 'w') as f:
+        json.dump({
+            'metadata': {
+                'seed': seed,
+                'repeats': repeats,
+                'python': sys.version,
+                'platform': platform.platform(),
+                'date': time.strftime('%Y-%m-%d %H:%M:%S')
+            },
+            'results': results
+        }, f, indent=2)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the micro-benchmark suite for the solver hot paths.')
+
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the generated inputs. Default is 0.')
+    parser.add_argument('--repeats', '-r', type=int, default=10, help='The number of timed calls of every case. Default is 10.')
+    parser.add_argument('--filter', type=str, default=None, help='Only run the cases whose name contains this string.')
+    parser.add_argument('--output', '-o', type=str, default=None, help='The file to save the results to. Default is micro_benchmark_results/<date>.json.')
+    parser.add_argument('--baseline', '-b', type=str, default=None, help='A results file to compare against. Exits with status 1 if a case regressed.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='The fraction the median time of a case may grow by before it is a regression. Default is 0.1.')
+
+    args = parser.parse_args()
+
+    results = run_micro_benchmarks(args.seed, args.repeats, args.filter)
+
+    output = args.output
+    if output is None:
+        output = 'micro_benchmark_results/{}.json'.format(time.strftime('%m-%d-%Y_%H-%M-%S'))
+    save_results(results, output, args.seed, args.repeats)
+    print('\nResults saved to {}'.format(output))
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print('\n{} case(s) regressed by more than {:.0%}: {}'.format(len(regressions), args.threshold, ', '.join(regressions)))
+            exit(1)
+        print('\nNo regressions.')
@@ -0,0 +1,155 @@
+'''
+This file contains loaders for the map (.map) and scenario (.scen) files of the MovingAI MAPF benchmark
+(https://movingai.com/benchmarks/mapf.html), so the solvers can run on them without converting them to the
+instance format of run_experiments.py first.
+
+Locations are returned as (row, column) tuples, like import_mapf_instance() returns them.
+
+Parsed maps are cached as compressed NumPy boolean arrays (.npz) in CACHE_DIRECTORY, keyed by the SHA-1 hash of the
+map file, so a large map is only parsed the first time it is used. Editing a map changes its hash, so a stale entry
+is never used; deleting the cache directory is always safe.
+
+Functions
+---------
+load_map()
+    Load a .map file, from the cache if it was parsed before.
+parse_map()
+    Parse the contents of a .map file.
+load_scenario()
+    Load the start and goal locations of the agents of a .scen file.
+'''
+
+import hashlib
+import os
+
+import numpy as np
+
+# The directory of the parsed map cache
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.movingai_cache')
+
+# The terrain characters that can be traversed. Every other character is an obstacle.
+PASSABLE_TERRAIN = '.GS'
+
+
+def load_map(filename, use_cache=True):
+    '''
+    Load a MovingAI .map file.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the .map file.
+    use_cache : bool
+        Whether to read the parsed map from the cache, and to add it to the cache if it isn't there. Default is True.
+
+    Returns
+    -------
+    list
+        The map, as a list of rows of booleans (True is an obstacle).
+    '''
+
+    with open(filename, 'rb') as f:
+        data = f.read()
+
+    if not use_cache:
+        return parse_map(data.decode(), filename)
+
+    cache_file = os.path.join(CACHE_DIRECTORY, hashlib.sha1(data).hexdigest() + '.npz')
+    if os.path.isfile(cache_file):
+        try:
+            with np.load(cache_file) as cached:
+                return cached['map'].tolist()
+        except (OSError, ValueError, KeyError):
+            # A corrupt entry (e.g. from a crash while writing it) is parsed again and overwritten
+            pass
+
+    my_map = parse_map(data.decode(), filename)
+
+    # Write to a temporary file first, so a concurrent run never reads a partial entry
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    temporary_file = f'{cache_file}.{os.getpid()}.tmp.npz'
+    np.savez_compressed(temporary_file, map=np.array(my_map, dtype=bool))
+    os.replace(temporary_file, cache_file)
+
+    return my_map
+
+
+def parse_map(text, filename='<map>'):
+    '''
+    Parse the contents of a MovingAI .map file.
+
+    Parameters
+    ----------
+    text : str
+        The contents of the file.
+    filename : str
+        The name of the file, for the error messages.
+
+    Returns
+    -------
+    list
+        The map, as a list of rows of booleans (True is an obstacle).
+    '''
+
+    lines = text.splitlines()
+
+    # The header is "type <type>", "height <h>", "width <w>" and "map", in this order
+    header = dict()
+    for i, line in enumerate(lines):
+        if line.strip() == 'map':
+            break
+        key, value = line.split()
+        header[key] = value
+    else:
+        raise ValueError(f'{filename} is not a MovingAI map: it has no "map" line.')
+
+    height = int(header['height'])
+    width = int(header['width'])
+
+    rows = lines[i + 1:i + 1 + height]
+    if len(rows) != height or any(len(row) < width for row in rows):
+        raise ValueError(f'{filename} is not a {height}x{width} map.')
+
+    return [[cell not in PASSABLE_TERRAIN for cell in row[:width]] for row in rows]
+
+
+def load_scenario(filename, num_agents=None):
+    '''
+    Load the start and goal locations of the agents of a MovingAI .scen file.
+
+    Parameters
+    ----------
+    filename : str
+        The path to the .scen file.
+    num_agents : int
+        Only load the first num_agents agents of the scenario. Default is None (load every agent).
+
+    Returns
+    -------
+    tuple
+        The start locations and the goal locations of the agents.
+    '''
+
+    starts = []
+    goals = []
+
+    with open(filename, 'r') as f:
+        for line in f:
+            tokens = line.split('\t') if '\t' in line else line.split()
+
+            # Skip the "version" line and empty lines
+            if len(tokens) < 8:
+                continue
+
+            if num_agents is not None and len(starts) == num_agents:
+                break
+
+            # The columns are: bucket, map, width, height, start x, start y, goal x, goal y, optimal length
+            start_x, start_y, goal_x, goal_y = [int(token) for token in tokens[4:8]]
+            starts.append((start_y, start_x))
+            goals.append((goal_y, goal_x))
+
+    if num_agents is not None and len(starts) < num_agents:
+        raise ValueError(f'{filename} only has {len(starts)} agents, {num_agents} were requested.')
+
+    return starts, goals
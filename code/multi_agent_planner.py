@@ -198,12 +198,13 @@ def compare_nodes(n1, n2):
     return n1['g_val'] + n1['h_val'] < n2['g_val'] + n2['h_val']
 
 
-def ma_star(my_map, start_locs, goal_loc, h_values, meta_agent, constraints):
+def ma_star(my_map, start_locs, goal_loc, h_values, meta_agent, constraints, budget=None):
     """ my_map      - binary obstacle map
         start_loc   - list of start position
         goal_loc    - list of goal position
         agent       - the agent that is being re-planned list of agent
         constraints - constraints defining where robot should or cannot go at each timestep
+        budget      - Budget of the high-level solver, charged once per expansion (optional)
     """
 
     ##############################
@@ -244,6 +245,8 @@ def ma_star(my_map, start_locs, goal_loc, h_values, meta_agent, constraints):
     
     while len(open_list) > 0:
         curr = pop_node(open_list)
+        if budget is not None:
+            budget.expand_ll()
 
         # print('pop node w/ f val: ', curr['g_val'] + curr['h_val'])
 
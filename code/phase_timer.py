@@ -0,0 +1,98 @@
+'''
+This file contains the timers used to measure how long the high-level solvers spend in each phase of the search.
+A solver owns one PhaseTimer and wraps each phase in a `with self.phase_timer.phase(name):` block. The times are
+accumulated over the whole run and exposed as solver.phase_times.
+
+When timing is disabled (the default), phase() returns a shared no-op context manager, so an instrumented solver
+costs close to nothing more than an uninstrumented one.
+
+Phases may nest: for example, root planning includes the low-level searches of the root, and cardinal detection
+includes the low-level searches it runs. Every phase's time is therefore inclusive, and the times don't sum to the
+total runtime.
+
+Classes
+-------
+PhaseTimer
+    Accumulates the time spent in each phase of a search.
+'''
+
+import time as timer
+
+# The phases measured by the solvers. Solvers that don't have a phase (e.g. cardinal detection in CBS) report 0.
+PHASES = [
+    'heuristics',
+    'root_planning',
+    'low_level_search',
+    'collision_detection',
+    'constraint_combination',
+    'node_copying',
+    'cardinal_detection'
+]
+
+
+class NullPhase(object):
+    '''
+    The context manager returned by a disabled timer. Does nothing.
+    '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+NULL_PHASE = NullPhase()
+
+
+class Phase(object):
+    '''
+    A context manager that adds the time spent inside it to a phase of a timer.
+    '''
+
+    def __init__(self, times, name):
+        self.times = times
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = timer.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.times[self.name] += timer.perf_counter() - self.start_time
+        return False
+
+
+class PhaseTimer(object):
+    '''
+    Accumulates the time spent in each phase of a search, in seconds.
+    '''
+
+    def __init__(self, enabled=False):
+        '''
+        Parameters
+        ----------
+        enabled : bool
+            Whether to measure the phases. If False, phase() is a no-op and every time stays 0. Default is False.
+        '''
+
+        self.enabled = enabled
+        self.times = {phase: 0.0 for phase in PHASES}
+
+    def phase(self, name):
+        '''
+        Returns a context manager that measures a phase.
+
+        Parameters
+        ----------
+        name : str
+            The name of the phase. Must be one of PHASES.
+
+        Returns
+        -------
+        Phase or NullPhase
+            The context manager.
+        '''
+
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self.times, name)
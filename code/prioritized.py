@@ -1,5 +1,56 @@
 import time as timer
 from single_agent_planner import compute_heuristics, a_star, get_sum_of_cost
+from a_star_class import A_Star
+
+
+def plan_prioritized(my_map, starts, goals, heuristics, order, budget=None):
+    """
+    Plan the agents one at a time, in the given order. Every agent avoids the paths of the agents planned before it,
+    including their goals for a while after they arrive (until the sum of the distances of all agents). The result is
+    not checked for collisions: an agent can still run into the goal of an earlier agent after that horizon.
+
+    Parameters:
+        my_map (list): The map.
+        starts (list): The start locations of the agents.
+        goals (list): The goal locations of the agents.
+        heuristics (list): The heuristic tables of the agents.
+        order (list): The order in which the agents are planned.
+        budget (Budget): Budget charged by the low-level searches (optional).
+
+    Returns:
+        list: The paths of the agents, in the order of the agents (not of the planning), or None if an agent has no
+            path around the earlier agents.
+        int: The number of low-level nodes generated.
+        int: The number of low-level nodes expanded.
+    """
+
+    horizon = sum(heuristics[a][starts[a]] for a in order) + len(order)
+
+    paths = [None] * len(order)
+    constraints = []
+    num_generated = num_expanded = 0
+    for i, agent in enumerate(order):
+        astar = A_Star(my_map, starts, goals, heuristics, agent, constraints, budget=budget)
+        result = astar.find_paths()
+        num_generated += astar.num_generated
+        num_expanded += astar.num_expanded
+        if result is None:
+            return None, num_generated, num_expanded
+        path = result[0]
+        paths[agent] = path
+
+        # The agents that are planned later avoid the path, as a group constraint (see cbs_basic.get_tuvya_splitting())
+        later = frozenset(order[i + 1:])
+        if not later:
+            break
+        for t in range(len(path)):
+            constraints.append({'agents': later, 'loc': [path[t]], 'timestep': t, 'positive': False})
+            if t > 0:
+                constraints.append({'agents': later, 'loc': [path[t], path[t - 1]], 'timestep': t, 'positive': False})
+        for t in range(len(path), horizon + 1):
+            constraints.append({'agents': later, 'loc': [path[-1]], 'timestep': t, 'positive': False})
+
+    return paths, num_generated, num_expanded
 
 
 class PrioritizedPlanningSolver(object):
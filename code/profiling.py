@@ -0,0 +1,179 @@
+'''
+This file contains the profiling hook used by the --profile option of run_experiments.py and atzmon_benchmark.py.
+Every profiled call produces two files in the profile directory:
+
+- <name>.prof: the cProfile statistics, which can be opened with pstats, snakeviz, etc.
+- <name>.collapsed: the call stacks in the collapsed format ("outer;inner;innermost <count>" per line), which can be
+  turned into a flamegraph with flamegraph.pl or speedscope.
+
+On platforms with signal.setitimer, the collapsed stacks are collected by sampling the stack of the running thread
+every SAMPLE_INTERVAL seconds of CPU time. Elsewhere, they are built from the caller/callee pairs recorded by cProfile,
+so they are only two frames deep.
+
+Functions
+---------
+profile_call()
+    Call a function under the profiler and save its profile.
+report_profiles()
+    Aggregate the profiles in a directory and report the hottest functions.
+'''
+
+import cProfile
+import glob
+import io
+import os
+import pstats
+import signal
+from collections import Counter
+
+# Seconds of CPU time between two samples of the stack
+SAMPLE_INTERVAL = 0.001
+
+# The number of functions in the aggregate report
+TOP_N = 30
+
+
+class StackSampler(object):
+    '''
+    Samples the call stack of the main thread on a CPU-time timer and counts the collapsed stacks. The stacks start
+    at the profiled function; the frames of its callers are left out.
+    '''
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+
+    def sample(self, signum, frame):
+        stack = []
+        while frame is not None and frame.f_code is not profile_call.__code__:
+            code = frame.f_code
+            stack.append('{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        self.stacks[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return self
+
+    def __exit__(self, *args):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self.previous_handler)
+        return False
+
+
+def can_sample():
+    '''
+    Returns True if the stacks can be sampled on this platform.
+    '''
+
+    return hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+
+def get_function_name(function):
+    filename, line, name = function
+    return '{} ({}:{})'.format(name, os.path.basename(filename), line)
+
+
+def get_call_edges(stats):
+    '''
+    Build two-frame collapsed stacks from the caller/callee pairs of a cProfile run. The count of a stack is the time
+    spent in the callee when called from the caller, in microseconds.
+    '''
+
+    stacks = Counter()
+    for function, (_, _, total_time, _, callers) in stats.stats.items():
+        callee = get_function_name(function)
+        if not callers:
+            stacks[callee] += int(total_time * 1e6)
+        for caller, (_, _, caller_total_time, _) in callers.items():
+            stacks[get_function_name(caller) + ';' + callee] += int(caller_total_time * 1e6)
+    return stacks
+
+
+def profile_call(profile_directory, name, function, *args, **kwargs):
+    '''
+    Call a function under the profiler, save its profile and return its result.
+
+    Parameters
+    ----------
+    profile_directory : str
+        The directory to save the profile to.
+    name : str
+        The name of the profile. The files are saved as <name>.prof and <name>.collapsed.
+    function : callable
+        The function to profile.
+    *args, **kwargs
+        The arguments of the function.
+
+    Returns
+    -------
+    object
+        The return value of the function.
+    '''
+
+    os.makedirs(profile_directory, exist_ok=True)
+
+    sampler = None
+    if can_sample():
+        sampler = StackSampler()
+
+    profile = cProfile.Profile()
+    try:
+        if sampler is not None:
+            with sampler:
+                result = profile.runcall(function, *args, **kwargs)
+        else:
+            result = profile.runcall(function, *args, **kwargs)
+    finally:
+        # Save the profile even if the function raised, so failing instances can be inspected too
+        path = os.path.join(profile_directory, name)
+        profile.dump_stats(path + '.prof')
+
+        if sampler is not None:
+            stacks = sampler.stacks
+        else:
+            stacks = get_call_edges(pstats.Stats(profile))
+
+        with open(path + '.collapsed', 'w') as f:
+            for stack, count in stacks.items():
+                f.write('{} {}\n'.format(stack, count))
+
+    return result
+
+
+def report_profiles(profile_directory, top_n=TOP_N):
+    '''
+    Aggregate every profile in a directory and report the functions with the highest total (own) time. The report is
+    printed and saved to summary.txt in the directory.
+
+    Parameters
+    ----------
+    profile_directory : str
+        The directory with the .prof files.
+    top_n : int
+        The number of functions to report. Default is TOP_N.
+
+    Returns
+    -------
+    str
+        The report, or None if the directory has no profiles.
+    '''
+
+    files = sorted(glob.glob(os.path.join(profile_directory, '*.prof')))
+    if not files:
+        return None
+
+    output = io.StringIO()
+    stats = pstats.Stats(*files, stream=output)
+
+    # Don't list every file in the header of the report
+    stats.files = []
+    stats.sort_stats('tottime').print_stats(top_n)
+
+    report = 'Aggregate profile of {} runs\n{}'.format(len(files), output.getvalue())
+    with open(os.path.join(profile_directory, 'summary.txt'), 'w') as f:
+        f.write(report)
+
+    print(report)
+    return report
@@ -0,0 +1,159 @@
+'''
+This file contains the aggregations used to compare the splitting strategies, computed with vectorized group-bys on
+the results of a results store (see results_store.py). All the functions take the DataFrame returned by
+ResultsStore.load() or load_results().
+
+Functions
+---------
+success_rate_curves()
+    The success rate of every strategy at every number of agents.
+strategy_medians()
+    The median runtime, cost and node counts of every strategy.
+node_ratios()
+    The node counts of every strategy relative to a baseline strategy, on the instances both solved.
+
+Usage:
+    python results_analysis.py <store>.parquet|<store>.sqlite|<metrics>.csv
+'''
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from results_store import load_csv_results, load_results
+
+# The columns summarized by strategy_medians()
+MEDIAN_COLUMNS = ['runtime', 'solution_cost', 'hl_expanded', 'hl_generated', 'll_expanded', 'll_generated']
+
+
+def success_rate_curves(results, by='num_agents'):
+    '''
+    Get the success rate of every strategy at every value of a column.
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        The results.
+    by : str
+        The column of the x axis of the curves. Default is "num_agents".
+
+    Returns
+    -------
+    pd.DataFrame
+        The success rates, with one row per value of the column and one column per strategy.
+    '''
+
+    rates = results.groupby(['splitting_strategy', by], observed=True)['solved'].mean()
+    return rates.astype('float64').unstack('splitting_strategy')
+
+
+def strategy_medians(results, by=None, solved_only=True):
+    '''
+    Get the median runtime, cost and node counts of every strategy.
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        The results.
+    by : list
+        More columns to group by (e.g. ["num_agents"]). Default is None (group by strategy only).
+    solved_only : bool
+        Whether to only include the runs that were solved. Default is True.
+
+    Returns
+    -------
+    pd.DataFrame
+        The medians of MEDIAN_COLUMNS, with one row per group, and the number of runs in the "runs" column.
+    '''
+
+    if solved_only:
+        results = results[results['solved'].fillna(False)]
+
+    groups = ['splitting_strategy'] + list(by or [])
+    grouped = results.groupby(groups, observed=True)
+
+    medians = grouped[MEDIAN_COLUMNS].median()
+    medians['runs'] = grouped.size()
+    return medians
+
+
+def node_ratios(results, baseline='standard', column='hl_expanded', by=None):
+    '''
+    Get the node counts of every strategy relative to a baseline strategy, on the instances solved by both. A ratio
+    below 1 means the strategy needed fewer nodes than the baseline.
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        The results.
+    baseline : str
+        The baseline strategy. Default is "standard".
+    column : str
+        The node count to compare. Default is "hl_expanded".
+    by : list
+        More columns to group by (e.g. ["num_agents"]). Default is None (group by strategy only).
+
+    Returns
+    -------
+    pd.DataFrame
+        The median and the geometric mean of the ratios, and the number of instances compared, per group.
+    '''
+
+    # Runs without a seed are grouped together; group-bys drop null keys
+    solved = results[results['solved'].fillna(False)]
+    solved = solved.assign(seed=solved['seed'].fillna(-1))
+    keys = ['file', 'solver', 'seed']
+
+    # One column per strategy, one row per instance
+    counts = solved.pivot_table(index=keys, columns='splitting_strategy', values=column, aggfunc='last', dropna=False)
+    if baseline not in counts.columns:
+        raise ValueError(f'The results have no solved runs with the baseline strategy "{baseline}".')
+
+    ratios = counts.div(counts[baseline], axis=0).drop(columns=baseline)
+    ratios = ratios.stack().rename('ratio').reset_index()
+    ratios = ratios[ratios['ratio'].notna() & (ratios['ratio'] > 0)]
+
+    if by:
+        info = solved.drop_duplicates(keys).set_index(keys)[list(by)]
+        ratios = ratios.join(info, on=keys)
+
+    ratios['log_ratio'] = np.log(ratios['ratio'].astype('float64'))
+
+    grouped = ratios.groupby(['splitting_strategy'] + list(by or []), observed=True)
+    summary = pd.DataFrame({
+        'median_ratio': grouped['ratio'].median(),
+        'geometric_mean_ratio': np.exp(grouped['log_ratio'].mean()),
+        'instances': grouped.size()
+    })
+    return summary
+
+
+def load(path):
+    '''
+    Load results from a store (.parquet directory or .sqlite file) or from a metrics CSV file.
+    '''
+
+    if path.endswith('.csv'):
+        return load_csv_results(path)
+    return load_results(path.rstrip('/'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize the results of a benchmark.')
+
+    parser.add_argument('results', type=str, help='The results store (<store>.parquet or <store>.sqlite) or a metrics CSV file.')
+    parser.add_argument('--baseline', type=str, default='standard', help='The baseline strategy of the node ratios. Default is "standard".')
+
+    args = parser.parse_args()
+
+    results = load(args.results)
+
+    pd.set_option('display.width', 200)
+    print(f'{len(results)} runs\n')
+    print('Success rate by number of agents:')
+    print(success_rate_curves(results).to_string(float_format='{:.2f}'.format))
+    print('\nMedians of the solved runs:')
+    print(strategy_medians(results).to_string(float_format='{:.4g}'.format))
+    print(f'\nHL nodes expanded relative to {args.baseline}:')
+    print(node_ratios(results, args.baseline).to_string(float_format='{:.3f}'.format))
@@ -0,0 +1,365 @@
+'''
+This file contains the typed results store of the benchmarks. Every run is one row with a fixed schema (SCHEMA):
+the solver configuration, a timeout flag and a failure flag, a nullable runtime and cost, the node counts and the
+phase times. Unlike the CSV files, where "Timeout" shares a column with the runtimes, every column has one type, so
+the results can be loaded straight into a DataFrame and aggregated without any cleaning (see results_analysis.py).
+
+The store is a Parquet dataset (a directory of part files, one per flush) when pyarrow or fastparquet is installed,
+and a SQLite database otherwise. Both are append-only: a task that is rerun adds a new row, and load() keeps the
+latest row of every (file, strategy, solver, seed) by default.
+
+Classes
+-------
+ResultsStore
+    An append-only, typed store of benchmark results.
+
+Functions
+---------
+get_backend()
+    Get the best backend available.
+metrics_to_row()
+    Convert the metrics of a benchmark run to a row of the store.
+load_csv_results()
+    Load a metrics CSV file written by atzmon_benchmark.py, with the schema of the store.
+'''
+
+import glob
+import importlib.util
+import os
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+from phase_timer import PHASES
+
+# The columns of the store and their pandas types. The nullable types hold the values of runs that didn't finish.
+SCHEMA = {
+    'run_id': 'string',
+    'recorded_at': 'float64',
+    'file': 'string',
+    'instance_type': 'string',
+    'num_agents': 'Int64',
+    'solver': 'string',
+    'splitting_strategy': 'string',
+    'seed': 'Int64',
+    'timeout_limit': 'float64',
+    'solved': 'boolean',
+    'timeout': 'boolean',
+    'failed': 'boolean',
+    'runtime': 'Float64',
+    'solution_cost': 'Int64',
+    'hl_expanded': 'Int64',
+    'hl_generated': 'Int64',
+    'll_expanded': 'Int64',
+    'll_generated': 'Int64',
+}
+SCHEMA.update({f'{phase}_time': 'Float64' for phase in PHASES})
+
+# The SQLite type of every pandas type
+SQLITE_TYPES = {'string': 'TEXT', 'float64': 'REAL', 'Float64': 'REAL', 'Int64': 'INTEGER', 'boolean': 'INTEGER'}
+
+# The columns that identify a task; load() keeps the latest row of each
+KEY_COLUMNS = ['file', 'splitting_strategy', 'solver', 'seed']
+
+# The number of rows a Parquet store buffers before it writes a part file
+PARQUET_BATCH_SIZE = 1000
+
+
+def get_backend():
+    '''
+    Get the best backend available: "parquet" if pyarrow or fastparquet is installed, "sqlite" otherwise.
+    '''
+
+    if importlib.util.find_spec('pyarrow') is not None or importlib.util.find_spec('fastparquet') is not None:
+        return 'parquet'
+    return 'sqlite'
+
+
+class ResultsStore(object):
+    '''
+    An append-only, typed store of benchmark results. Rows are dicts with the keys of SCHEMA; missing keys are null.
+
+    Rows are written to SQLite as soon as they are appended. A Parquet store buffers them and writes a part file
+    every PARQUET_BATCH_SIZE rows and when it is closed, so the buffered rows of a crashed run are lost (the
+    checkpoint of the sweep still has them).
+    '''
+
+    def __init__(self, path, backend=None):
+        '''
+        Parameters
+        ----------
+        path : str
+            The path of the store, without an extension. The Parquet store is the directory <path>.parquet and the
+            SQLite store is the file <path>.sqlite.
+        backend : str
+            "parquet" or "sqlite". Default is None (the best backend available, see get_backend()).
+        '''
+
+        if backend is None:
+            backend = get_backend()
+        if backend not in ('parquet', 'sqlite'):
+            raise ValueError(f'Unknown results store backend: {backend}')
+
+        self.backend = backend
+        self.buffer = []
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if backend == 'parquet':
+            self.path = path + '.parquet'
+            os.makedirs(self.path, exist_ok=True)
+            self.connection = None
+        else:
+            self.path = path + '.sqlite'
+            self.connection = sqlite3.connect(self.path)
+            columns = ', '.join(f'"{column}" {SQLITE_TYPES[dtype]}' for column, dtype in SCHEMA.items())
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS results ({columns})')
+            self.connection.commit()
+
+    def append(self, row):
+        '''
+        Append a row to the store.
+
+        Parameters
+        ----------
+        row : dict
+            The values of the row, keyed by the columns of SCHEMA.
+
+        Returns
+        -------
+        None
+        '''
+
+        values = [row.get(column) for column in SCHEMA]
+
+        if self.backend == 'sqlite':
+            placeholders = ', '.join('?' for _ in SCHEMA)
+            self.connection.execute(f'INSERT INTO results VALUES ({placeholders})', values)
+            self.connection.commit()
+            return
+
+        self.buffer.append(values)
+        if len(self.buffer) >= PARQUET_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write the buffered rows of a Parquet store to a new part file.
+        '''
+
+        if not self.buffer:
+            return
+
+        frame = apply_schema(pd.DataFrame(self.buffer, columns=list(SCHEMA)))
+        part = os.path.join(self.path, f'part-{time.time_ns()}-{os.getpid()}.parquet')
+        frame.to_parquet(part, index=False)
+        self.buffer = []
+
+    def load(self, latest_only=True):
+        '''
+        Load the results in the store.
+
+        Parameters
+        ----------
+        latest_only : bool
+            Whether to keep only the latest row of every task (see KEY_COLUMNS). Default is True.
+
+        Returns
+        -------
+        pd.DataFrame
+            The results, with the types of SCHEMA.
+        '''
+
+        self.flush()
+        return load_results(self.path, latest_only)
+
+    def close(self):
+        self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+def apply_schema(frame):
+    '''
+    Give a DataFrame the columns and the types of SCHEMA. Missing columns are filled with nulls.
+    '''
+
+    for column in SCHEMA:
+        if column not in frame.columns:
+            frame[column] = None
+    return frame[list(SCHEMA)].astype(SCHEMA)
+
+
+def load_results(path, latest_only=True):
+    '''
+    Load the results of a store, without opening it for writing.
+
+    Parameters
+    ----------
+    path : str
+        The path of the store, with its extension (<path>.parquet or <path>.sqlite).
+    latest_only : bool
+        Whether to keep only the latest row of every task (see KEY_COLUMNS). Default is True.
+
+    Returns
+    -------
+    pd.DataFrame
+        The results, with the types of SCHEMA.
+    '''
+
+    if path.endswith('.sqlite'):
+        with sqlite3.connect(path) as connection:
+            frame = pd.read_sql('SELECT * FROM results', connection)
+    elif glob.glob(os.path.join(path, '*.parquet')):
+        frame = pd.read_parquet(path)
+    else:
+        frame = pd.DataFrame(columns=list(SCHEMA))
+
+    frame = apply_schema(frame)
+
+    if latest_only:
+        frame = frame.sort_values('recorded_at', kind='stable').drop_duplicates(KEY_COLUMNS, keep='last')
+        frame = frame.reset_index(drop=True)
+
+    return frame
+
+
+def get_instance_info(file):
+    '''
+    Get the instance type (the name of the directory of the file) and the number of agents (from an
+    "<n>-<agents>-agents" file name) of an instance. The number of agents is None for other file names.
+    '''
+
+    match = re.search(r'(\d+)-agents', os.path.basename(file))
+    num_agents = int(match.group(1)) if match else None
+    return os.path.basename(os.path.dirname(file)), num_agents
+
+
+def metrics_to_row(metrics, run_id=None, solver='CBS', seed=None, timeout_limit=None):
+    '''
+    Convert the metrics of a benchmark run (see atzmon_benchmark.benchmark_algorithm_on_instance()) to a row of the
+    store.
+
+    Parameters
+    ----------
+    metrics : dict
+        The metrics of the run.
+    run_id : str
+        The name of the sweep the run belongs to. Default is None.
+    solver : str
+        The high-level solver. Default is "CBS".
+    seed : int
+        The random seed of the run. Default is None.
+    timeout_limit : float
+        The timeout of the run in seconds. Default is None.
+
+    Returns
+    -------
+    dict
+        The row.
+    '''
+
+    instance_type, num_agents = get_instance_info(metrics['File'])
+    timed_out, failed = bool(metrics['Timeout']), bool(metrics['Failed'])
+    finished = not timed_out and not failed
+
+    row = {
+        'run_id': run_id,
+        'recorded_at': time.time(),
+        'file': metrics['File'],
+        'instance_type': instance_type,
+        'num_agents': num_agents,
+        'solver': solver,
+        'splitting_strategy': metrics['Splitting strategy'],
+        'seed': seed,
+        'timeout_limit': timeout_limit,
+        'solved': finished and metrics['Solution cost'] is not None,
+        'timeout': timed_out,
+        'failed': failed,
+        'runtime': metrics['Total runtime'] if finished else None,
+        'solution_cost': metrics['Solution cost'],
+        'hl_expanded': metrics['HL Nodes expanded'],
+        'hl_generated': metrics['HL Nodes generated'],
+        'll_expanded': metrics['LL Nodes expanded'],
+        'll_generated': metrics['LL Nodes generated'],
+    }
+
+    # Workers that were killed have no phase times
+    for phase in PHASES:
+        row[f'{phase}_time'] = metrics.get(f'{phase} time')
+
+    return row
+
+
+def load_csv_results(filename, run_id=None):
+    '''
+    Load a metrics CSV file written by atzmon_benchmark.py, with the schema of the store. The "Timeout" and
+    "Failed" markers of the runtime and cost columns become the timeout and failed flags.
+
+    Parameters
+    ----------
+    filename : str
+        The CSV file.
+    run_id : str
+        The name of the sweep. Default is None (the name of the file).
+
+    Returns
+    -------
+    pd.DataFrame
+        The results, with the types of SCHEMA.
+    '''
+
+    csv = pd.read_csv(filename, dtype=str)
+
+    if run_id is None:
+        run_id = os.path.splitext(os.path.basename(filename))[0]
+
+    runtime = pd.to_numeric(csv['Total runtime'], errors='coerce')
+    cost = pd.to_numeric(csv['Solution cost'], errors='coerce')
+    timed_out = (csv['Total runtime'] == 'Timeout') | (csv['Solution cost'] == 'Timeout')
+    failed = (csv['Total runtime'] == 'Failed') | (csv['Solution cost'] == 'Failed')
+
+    info = csv['File'].map(get_instance_info)
+
+    frame = pd.DataFrame({
+        'run_id': run_id,
+        'recorded_at': os.path.getmtime(filename),
+        'file': csv['File'],
+        'instance_type': info.str[0],
+        'num_agents': info.str[1],
+        'solver': 'CBS',
+        'splitting_strategy': csv['Splitting strategy'],
+        'solved': ~timed_out & ~failed & cost.notna(),
+        'timeout': timed_out,
+        'failed': failed,
+        'runtime': runtime.where(~timed_out & ~failed),
+        'solution_cost': cost,
+        'hl_expanded': pd.to_numeric(csv['HL Nodes expanded'], errors='coerce'),
+        'hl_generated': pd.to_numeric(csv['HL Nodes generated'], errors='coerce'),
+        'll_expanded': pd.to_numeric(csv['LL Nodes expanded'], errors='coerce'),
+        'll_generated': pd.to_numeric(csv['LL Nodes generated'], errors='coerce'),
+    })
+
+    # Files written before the seeds were recorded don't have a seed column
+    if 'Seed' in csv.columns:
+        frame['seed'] = pd.to_numeric(csv['Seed'], errors='coerce')
+
+    # Files written before the phase times were recorded don't have these columns
+    for phase in PHASES:
+        column = f'{phase} time'
+        if column in csv.columns:
+            frame[f'{phase}_time'] = pd.to_numeric(csv[column], errors='coerce')
+
+    return apply_schema(frame)
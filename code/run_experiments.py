@@ -2,22 +2,32 @@
 import argparse
 import glob
 from pathlib import Path
-from cbs_basic import CBSSolver # original cbs with standard/disjoint splitting
+from cbs_basic import CBSSolver, PARTITION_POLICIES # original cbs with standard/disjoint splitting
 
 # cbs with different improvements
 from icbs_cardinal_bypass import ICBS_CB_Solver # only cardinal dectection and bypass
-from icbs_complete import ICBS_Solver # all improvements including MA-CBS
+from icbs_complete import ICBS_Solver, MERGE_POLICIES # all improvements including MA-CBS
+from mac_icbs import MAC_ICBS_Solver # Tuvya splitting with cardinal detection and bypass
 
 
 from independent import IndependentSolver
 from prioritized import PrioritizedPlanningSolver
 from visualize import Animation
 from single_agent_planner import get_sum_of_cost
+from checkpoint import Checkpoint
+from budget import Budget
+from profiling import profile_call, report_profiles
+from movingai import load_map, load_scenario
 
 HLSOLVER = "CBS"
 
+BENCHMARK_CHECKPOINT = "benchmark_checkpoint.jsonl"
+
 LLSOLVER = "a_star"
 
+# The solvers that support Tuvya splitting
+TUVYA_SOLVERS = ["CBS", "MAC_ICBS"]
+
 def print_mapf_instance(my_map, starts, goals):
     print('Start locations')
     print_locations(my_map, starts)
@@ -89,6 +99,26 @@ def import_mapf_instance(filename):
     f.close()
     return my_map, starts, goals
 
+def load_instance(file, args):
+    '''
+    This function loads an instance, either from a file in the format above or, if --map is set, from a MovingAI
+    scenario file of that map.
+
+    Parameters:
+        file: The name of the instance file, or of the .scen file if --map is set
+        args: The arguments from the command line
+
+    Returns:
+        A tuple containing the map, the start locations and the goal locations (see import_mapf_instance)
+    '''
+
+    if args.map is None:
+        return import_mapf_instance(file)
+
+    my_map = load_map(args.map)
+    starts, goals = load_scenario(file, args.agents)
+    return my_map, starts, goals
+
 def run_all_tests(args):
     '''
     This command runs all the tests in the instances folder and prints out a summary of the results.
@@ -144,6 +174,128 @@ def get_actual_results(filename):
 
     return actual
 
+def get_budget(args):
+    '''
+    Create the budget for a single solver run from the command line arguments.
+
+    Parameters:
+        args: The arguments from the command line
+
+    Returns:
+        A new Budget, or None if no limit was given (so the solver uses its default budget)
+    '''
+
+    if args.timeout is None and args.max_hl_nodes is None and args.max_ll_nodes is None and args.max_memory is None:
+        return None
+
+    rss_bytes = None
+    if args.max_memory is not None:
+        rss_bytes = args.max_memory * 1024 * 1024
+
+    return Budget(wall_time=args.timeout, hl_nodes=args.max_hl_nodes, ll_nodes=args.max_ll_nodes, rss_bytes=rss_bytes)
+
+def parse_merge_threshold(value):
+    '''
+    Parse the --merge_threshold argument: a number of conflicts, or "adaptive".
+    '''
+
+    if value == 'adaptive':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('must be a number of conflicts or "adaptive", not "{}"'.format(value))
+
+def budget_exhausted(solver):
+    '''
+    If the last search of a solver stopped because it ran out of budget, print the reason and the partial statistics
+    (see Budget.report()) and return the reason. Returns None if the search wasn't stopped by the budget.
+    '''
+
+    report = solver.budget_report
+    if report is None or not report["exhausted"]:
+        return None
+
+    print("Budget exhausted ({}) after {:.2f} s: {} HL nodes generated, {} HL nodes expanded, {} LL nodes expanded".format(
+        report["reason"], report["wall_time"], report["hl_generated"], report["hl_expanded"], report["ll_expanded"]))
+    return report["reason"]
+
+def get_seed(args):
+    '''
+    Returns the seed of the solvers of a single run: the first seed given with --seeds, or None.
+    '''
+
+    if args.seeds:
+        return args.seeds[0]
+    return None
+
+def get_cbs_arguments(args):
+    '''
+    Returns the keyword arguments of find_solution() that only CBS supports: lazy child evaluation and the warm start.
+    '''
+
+    if args.hlsolver == "CBS":
+        return {"lazy": args.lazy, "warm_start": args.warm_start}
+    return {}
+
+def get_merge_arguments(args):
+    '''
+    Returns the keyword arguments of ICBS_Solver that were set on the command line: the merge policy and threshold.
+    '''
+
+    arguments = {"merge_policy": args.merge_policy, "merge_threshold": args.merge_threshold}
+    return {name: value for name, value in arguments.items() if value is not None}
+
+def get_checkpoint_config(args):
+    '''
+    Returns the settings and limits of a benchmark run that its results depend on, for the checkpoint keys. A run
+    resumed with other settings then doesn't reuse the results recorded under the old ones.
+    '''
+
+    return {"lazy": args.lazy,
+            "warm_start": args.warm_start,
+            "partition_policy": args.partition_policy,
+            "imbalanced_tuvya_splitting": args.imbalanced_tuvya_splitting,
+            "repeats": args.repeats,
+            "timeout": args.timeout,
+            "max_hl_nodes": args.max_hl_nodes,
+            "max_ll_nodes": args.max_ll_nodes,
+            "max_memory": args.max_memory}
+
+def solve(solver, file, method, args, *solver_args, **solver_kwargs):
+    '''
+    Run solver.find_solution() with the given arguments. If --profile is set, the search is profiled and the profile is
+    saved in the profile directory as <instance>-<solver>-<method>.prof and .collapsed.
+
+    Parameters:
+        solver: The solver to run
+        file: The name of the instance file
+        method: The name of the splitting method, used to name the profile
+        args: The arguments from the command line
+
+    Returns:
+        The return value of find_solution()
+    '''
+
+    if not args.profile:
+        return solver.find_solution(*solver_args, **solver_kwargs)
+
+    name = "{}-{}-{}".format(Path(file).stem, args.hlsolver, method)
+    return profile_call(args.profile_directory, name, solver.find_solution, *solver_args, **solver_kwargs)
+
+def get_method_name(args):
+    '''
+    Returns the name of the splitting method selected on the command line.
+    '''
+
+    if args.tuvya_splitting:
+        if args.partition_policy is not None:
+            return "tuvya-" + args.partition_policy
+        return "tuvya"
+    if args.disjoint:
+        return "disjoint"
+    return "standard"
+
 def run_test(file, args, actual):
     '''
     This function runs a single test and compares the result to the expected result.
@@ -160,22 +312,29 @@ def run_test(file, args, actual):
     my_map, starts, goals = import_mapf_instance(file)
 
     if args.hlsolver == "CBS":
-        cbs = CBSSolver(my_map, starts, goals, timeout = args.timeout)
+        cbs = CBSSolver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args))
     elif args.hlsolver == "ICBS":
-        cbs = ICBS_Solver(my_map, starts, goals)
+        cbs = ICBS_Solver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args), **get_merge_arguments(args))
+    elif args.hlsolver == "MAC_ICBS":
+        cbs = MAC_ICBS_Solver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args))
     else:
         raise RuntimeError("Unknown solver!")
     
     paths = None
     if args.tuvya_splitting:
-        if not args.hlsolver == "CBS":
-            raise Exception("Tuvya splitting only works with CBS")
+        if args.hlsolver not in TUVYA_SOLVERS:
+            raise Exception("Tuvya splitting only works with CBS and MAC_ICBS")
         
-        paths, _, _ = cbs.find_solution(args.disjoint, True, balanced_tuvya_splitting= not args.imbalanced_tuvya_splitting)
+        paths, _, _ = solve(cbs, file, get_method_name(args), args, args.disjoint, True, balanced_tuvya_splitting= not args.imbalanced_tuvya_splitting, partition_policy= args.partition_policy, **get_cbs_arguments(args))
+    elif args.hlsolver == "CBS":
+        paths, _, _ = solve(cbs, file, get_method_name(args), args, args.disjoint, **get_cbs_arguments(args))
     else:
-        paths, _, _ = cbs.find_solution(args.disjoint)
+        paths, _, _ = solve(cbs, file, get_method_name(args), args, args.disjoint)
 
     if paths is None:
+        if budget_exhausted(cbs) is not None:
+            print("Test failed for file {}. The solver ran out of budget".format(file))
+            return False
         raise BaseException('No solutions')
     
     cost = get_sum_of_cost(paths)
@@ -188,14 +347,18 @@ def run_test(file, args, actual):
         return False
     
 
-def benchmark_instance(file, args, print_results=False, do_repeats = True):
+def benchmark_instance(file, args, print_results=False, do_repeats = True, seed = None):
     '''
     This function runs a single instance through the solver without disjoing splitting and compares it to that with disjoint splitting.
     It prints out the amount of nodes generated and expanded for both cases.
 
+    With --seeds, the instance is run once per seed instead of --repeats times, and the results are averaged over the
+    seeds. Every method of a run uses the same seed, so the methods are compared on paired seeds.
+
     Parameters:
         file: The name of the file to run
         args: The arguments from the command line
+        seed: The seed of the solvers of a single run. Default is None (the solvers use the random module)
 
     Returns:
         A dictionary containing the results in the following format:
@@ -219,30 +382,35 @@ def benchmark_instance(file, args, print_results=False, do_repeats = True):
     if not args.hlsolver == "CBS":
         raise Exception("Benchmarking only works with CBS")
     
-    # If the repeat parameter is set, repeat the experiment that many times
-    if args.repeats > 1 and do_repeats:
+    # If seeds are given, run the experiment once per seed. Otherwise, if the repeat parameter is set, repeat the
+    # experiment that many times
+    if (args.seeds or args.repeats > 1) and do_repeats:
+        seeds = args.seeds if args.seeds else [None] * args.repeats
         collected_results = []
-        for i in range(args.repeats):
-            collected_results.append(benchmark_instance(file, args, False, False))
+        for seed in seeds:
+            collected_results.append(benchmark_instance(file, args, print_results and seed is not None, False, seed))
+        runs = len(seeds)
 
         # Calculate the average of the results
         averaged_results = {
             "standard_splitting": {
-                "nodes_exp": sum([result["standard_splitting"]["nodes_exp"] for result in collected_results]) / args.repeats,
-                "nodes_gen": sum([result["standard_splitting"]["nodes_gen"] for result in collected_results]) / args.repeats
+                "nodes_exp": sum([result["standard_splitting"]["nodes_exp"] for result in collected_results]) / runs,
+                "nodes_gen": sum([result["standard_splitting"]["nodes_gen"] for result in collected_results]) / runs
             },
             "disjoint_splitting": {
-                "nodes_exp": sum([result["disjoint_splitting"]["nodes_exp"] for result in collected_results]) / args.repeats,
-                "nodes_gen": sum([result["disjoint_splitting"]["nodes_gen"] for result in collected_results]) / args.repeats
+                "nodes_exp": sum([result["disjoint_splitting"]["nodes_exp"] for result in collected_results]) / runs,
+                "nodes_gen": sum([result["disjoint_splitting"]["nodes_gen"] for result in collected_results]) / runs
             },
             "tuvya_splitting": {
-                "nodes_exp": sum([result["tuvya_splitting"]["nodes_exp"] for result in collected_results]) / args.repeats,
-                "nodes_gen": sum([result["tuvya_splitting"]["nodes_gen"] for result in collected_results]) / args.repeats
+                "nodes_exp": sum([result["tuvya_splitting"]["nodes_exp"] for result in collected_results]) / runs,
+                "nodes_gen": sum([result["tuvya_splitting"]["nodes_gen"] for result in collected_results]) / runs
             }
         }
 
         if print_results:
             # Print the result as a table. The columns should be num_exp and num_gen and the rows should be standard and disjoint
+            if args.seeds:
+                print("Average over {} seeds".format(runs))
             print("Method\tNodes Expanded\tNodes Generated")
             print("Standard\t{}\t{}".format(averaged_results["standard_splitting"]["nodes_exp"], averaged_results["standard_splitting"]["nodes_gen"]))
             print("Disjoint\t{}\t{}".format(averaged_results["disjoint_splitting"]["nodes_exp"], averaged_results["disjoint_splitting"]["nodes_gen"]))
@@ -258,32 +426,40 @@ def benchmark_instance(file, args, print_results=False, do_repeats = True):
     }
 
     # Load the instance
-    my_map, starts, goals = import_mapf_instance(file)
+    my_map, starts, goals = load_instance(file, args)
 
     # Run with standard splitting
     if not args.skip_standard:
-        cbs = CBSSolver(my_map, starts, goals, timeout = args.timeout)
-        paths, results["standard_splitting"]["nodes_gen"], results["standard_splitting"]["nodes_exp"] = cbs.find_solution(False)
+        cbs = CBSSolver(my_map, starts, goals, budget = get_budget(args), seed = seed)
+        paths, results["standard_splitting"]["nodes_gen"], results["standard_splitting"]["nodes_exp"] = solve(cbs, file, "standard", args, False, **get_cbs_arguments(args))
 
         if paths is None:
-            raise BaseException('No solutions')
+            results["standard_splitting"]["budget_exhausted"] = budget_exhausted(cbs)
+            if results["standard_splitting"]["budget_exhausted"] is None:
+                raise BaseException('No solutions')
 
     # Run with disjoint splitting
-    cbs = CBSSolver(my_map, starts, goals, timeout = args.timeout)
-    paths, results["disjoint_splitting"]["nodes_gen"], results["disjoint_splitting"]["nodes_exp"] = cbs.find_solution(True)
+    cbs = CBSSolver(my_map, starts, goals, budget = get_budget(args), seed = seed)
+    paths, results["disjoint_splitting"]["nodes_gen"], results["disjoint_splitting"]["nodes_exp"] = solve(cbs, file, "disjoint", args, True, **get_cbs_arguments(args))
 
     if paths is None:
-        raise BaseException('No solutions')
+        results["disjoint_splitting"]["budget_exhausted"] = budget_exhausted(cbs)
+        if results["disjoint_splitting"]["budget_exhausted"] is None:
+            raise BaseException('No solutions')
     
     # Run with Tuvya splitting
-    cbs = CBSSolver(my_map, starts, goals, timeout = args.timeout)
-    paths, results["tuvya_splitting"]["nodes_gen"], results["tuvya_splitting"]["nodes_exp"] = cbs.find_solution(False, True)
+    cbs = CBSSolver(my_map, starts, goals, budget = get_budget(args), seed = seed)
+    paths, results["tuvya_splitting"]["nodes_gen"], results["tuvya_splitting"]["nodes_exp"] = solve(cbs, file, "tuvya", args, False, True, balanced_tuvya_splitting = not args.imbalanced_tuvya_splitting, partition_policy = args.partition_policy, **get_cbs_arguments(args))
 
     if paths is None:
-        raise BaseException('No solutions')
+        results["tuvya_splitting"]["budget_exhausted"] = budget_exhausted(cbs)
+        if results["tuvya_splitting"]["budget_exhausted"] is None:
+            raise BaseException('No solutions')
     
     if print_results:
         # Print the result as a table. The columns should be num_exp and num_gen and the rows should be standard and disjoint
+        if seed is not None:
+            print("Seed {}".format(seed))
         print("Method\tNodes Expanded\tNodes Generated")
         if not args.skip_standard:
             print("Standard\t{}\t{}".format(results["standard_splitting"]["nodes_exp"], results["standard_splitting"]["nodes_gen"]))
@@ -297,6 +473,12 @@ def benchmark_all_instances(args):
     This function runs all instances through the solver without disjoing splitting and compares it to that with disjoint splitting.
     It prints out the amount of nodes generated and expanded for both cases.
 
+    The results of each instance are recorded in BENCHMARK_CHECKPOINT as soon as it finishes. With --resume, the instances
+    that already have results under the same settings and limits are skipped, and only the missing or failed ones are
+    run again.
+
+    With --seeds, every instance is run once per seed, and each run is recorded with its seed.
+
     Parameters:
         args: The arguments from the command line
     '''
@@ -314,11 +496,40 @@ def benchmark_all_instances(args):
         last_instance = 50
     files = ["instances/test_{}.txt".format(i) for i in range(1, last_instance + 1) if not (args.skip_47 and i == 47)]
 
-    for file in files:
-        try:
-            results[file] = benchmark_instance(file, args)
-        except BaseException as e:
-            print("Benchmark failed for file {}. Error: {}".format(file, e))
+    methods = ["standard_splitting", "disjoint_splitting", "tuvya_splitting"]
+    if args.skip_standard:
+        methods.remove("standard_splitting")
+
+    seeds = args.seeds if args.seeds else [None]
+    config = get_checkpoint_config(args)
+
+    with Checkpoint(BENCHMARK_CHECKPOINT) as checkpoint:
+        for file in files:
+            for seed in seeds:
+                run = file if seed is None else "{} (seed {})".format(file, seed)
+                keys = {method: Checkpoint.get_key(file, method, args.hlsolver, seed, config) for method in methods}
+
+                # Reuse the results of an earlier run if every method finished
+                if args.resume and all(checkpoint.is_complete(key) for key in keys.values()):
+                    results[run] = {"standard_splitting": {}}
+                    for method in methods:
+                        results[run][method] = checkpoint.get_result(keys[method])
+                    continue
+
+                try:
+                    # A seeded run is not repeated, since it would give the same results
+                    results[run] = benchmark_instance(file, args, do_repeats=seed is None, seed=seed)
+                except KeyboardInterrupt:
+                    raise
+                except BaseException as e:
+                    print("Benchmark failed for {}. Error: {}".format(run, e))
+                    for method in methods:
+                        checkpoint.record(keys[method], "Failed", None)
+                    continue
+
+                for method in methods:
+                    status = "Timeout" if results[run][method].get("budget_exhausted") else "Solved"
+                    checkpoint.record(keys[method], status, results[run][method])
 
     # Print the results in the following format:
     # File, Standard Nodes Expanded, Standard Nodes Generated, Disjoint Nodes Expanded, Disjoint Nodes Generated, Tuvya Nodes Expanded, Tuvya Nodes Generated
@@ -346,6 +557,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Runs various MAPF algorithms')
     parser.add_argument('--instance', type=str, default=None,
                         help='The name of the instance file(s)')
+    parser.add_argument('--map', type=str, default=None,
+                        help='A MovingAI .map file. If set, the instance file(s) given with --scen are MovingAI .scen files of this map.')
+    parser.add_argument('--scen', type=str, default=None,
+                        help='The MovingAI .scen file(s) to run on the map given with --map.')
+    parser.add_argument('--agents', type=int, default=None,
+                        help='Only use the first AGENTS agents of the .scen file. Defaults to every agent.')
     parser.add_argument('--batch', action='store_true', default=False,
                         help='Use batch output instead of animation')
     parser.add_argument('--disjoint', action='store_true', default=False,
@@ -353,7 +570,7 @@ if __name__ == '__main__':
     parser.add_argument('--tuvya_splitting', action='store_true', default=False,
                         help='Use Tuvya splitting')
     parser.add_argument('--hlsolver', type=str, default=HLSOLVER,
-                        help='The solver to use (one of: {CBS,ICBS_CB,ICBS}), defaults to ' + str(HLSOLVER))
+                        help='The solver to use (one of: {CBS,ICBS_CB,ICBS,MAC_ICBS}), defaults to ' + str(HLSOLVER))
     parser.add_argument('--run_all_tests', action='store_true', default=False,
                         help='Run all tests in the instances folder. Used for checking completeness of the solvers.')
     parser.add_argument('--benchmark_instance', action='store_true', default=False,
@@ -366,35 +583,85 @@ if __name__ == '__main__':
                         help='Skip test 47 when benchmarking on all instances.')
     parser.add_argument('--repeats', type=int, default=1,
                         help='The number of times to repeat the experiment when benchmarking')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None,
+                        help='The seeds of the random number generators of the solvers. When benchmarking, every instance is run once per seed (instead of --repeats times) and the seed is recorded with its results; otherwise the first seed is used.')
     parser.add_argument('--skip_standard', action='store_true', default=False,
                         help='Skip the standard splitting method when benchmarking.')
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='When benchmarking on all instances, skip the instances that already have results in ' + BENCHMARK_CHECKPOINT + ' under the same settings and limits, and rerun only the missing or failed ones.')
     parser.add_argument('--timeout', '-t', type=int, default=None,
-                        help='The timeout for the solvers in seconds. Currently only implemented for CBS.')
+                        help='The timeout for the solvers in seconds.')
+    parser.add_argument('--max_hl_nodes', type=int, default=None,
+                        help='The maximum number of high-level nodes the solver may generate. ICBS and ICBS_CB default to 50000.')
+    parser.add_argument('--max_ll_nodes', type=int, default=None,
+                        help='The maximum number of low-level nodes the solver may expand, over all low-level searches.')
+    parser.add_argument('--max_memory', type=int, default=None,
+                        help='The maximum current resident memory of the process in megabytes, checked during the search (memory freed by earlier runs does not count).')
     parser.add_argument('--imbalanced_tuvya_splitting', '-its', action='store_true', default=False,
                         help='Use the imbalanced Tuvya splitting')
+    parser.add_argument('--partition_policy', type=str, default=None, choices=PARTITION_POLICIES,
+                        help='How Tuvya splitting divides the agents into two groups (one of: {}). Defaults to random, or imbalanced with --imbalanced_tuvya_splitting.'.format(', '.join(PARTITION_POLICIES)))
+    parser.add_argument('--merge_policy', type=str, default=None, choices=MERGE_POLICIES,
+                        help='What ICBS does with the open list when it merges two meta-agents (one of: {}). Defaults to restart.'.format(', '.join(MERGE_POLICIES)))
+    parser.add_argument('--merge_threshold', type=parse_merge_threshold, default=None,
+                        help='The number of conflicts after which ICBS merges two meta-agents, or "adaptive" to merge when the projected joint search is cheaper than splitting. Defaults to 7.')
+    parser.add_argument('--lazy', action='store_true', default=False,
+                        help='Defer the low-level search of a child node until it is expanded. Currently only implemented for CBS.')
+    parser.add_argument('--warm_start', action='store_true', default=False,
+                        help='Find an incumbent solution with prioritized planning before the search, prune the nodes that cannot beat it, and return it if the budget runs out. Only implemented for CBS.')
+    parser.add_argument('--profile', action='store_true', default=False,
+                        help='Profile the search of every instance, and report the hottest functions at the end.')
+    parser.add_argument('--profile_directory', type=str, default="profiles",
+                        help='The directory to save the profiles (.prof files and collapsed stacks for flamegraphs) to. Defaults to "profiles".')
     
     # parser.add_argument('--llsolver', type=str, default=LLSOLVER,
     #                     help='The solver to use (one of: {a_star,pea_star,epea_star}), defaults to ' + str(LLSOLVER))
     args = parser.parse_args()
 
-    # Assert that if the timeout is set, that the solver is CBS
-    if args.timeout is not None and not args.hlsolver == "CBS":
-        raise Exception("Timeouts only work with CBS")
-    
-    # Assert that if tuvya splitting is set, that the solver is CBS
-    if args.tuvya_splitting and not args.hlsolver == "CBS":
-        raise Exception("Tuvya splitting only works with CBS")
+    # MovingAI scenarios take the place of the instance files
+    if (args.map is None) != (args.scen is None):
+        raise Exception("--map and --scen must be used together")
+    if args.scen is not None:
+        if args.run_all_tests or args.benchmark_all_instances:
+            raise Exception("--map and --scen can't be used with --run_all_tests or --benchmark_all_instances")
+        args.instance = args.scen
+
+    # Assert that if tuvya splitting is set, that the solver supports it
+    if args.tuvya_splitting and args.hlsolver not in TUVYA_SOLVERS:
+        raise Exception("Tuvya splitting only works with CBS and MAC_ICBS")
+
+    # Assert that a partition policy is only set with Tuvya splitting (which the benchmarks always run)
+    if args.partition_policy is not None and not (args.tuvya_splitting or args.benchmark_instance or args.benchmark_all_instances):
+        raise Exception("--partition_policy only works with Tuvya splitting")
+
+    # Assert that if the warm start is set, that the solver is CBS
+    if args.warm_start and not args.hlsolver == "CBS":
+        raise Exception("The warm start only works with CBS")
+
+    # Assert that the merge policy and threshold are only set for ICBS, the solver that merges meta-agents
+    if (args.merge_policy is not None or args.merge_threshold is not None) and not args.hlsolver == "ICBS":
+        raise Exception("--merge_policy and --merge_threshold only work with ICBS")
+
+    # Assert that if lazy child evaluation is set, that the solver is CBS
+    if args.lazy and not args.hlsolver == "CBS":
+        raise Exception("Lazy child evaluation only works with CBS")
     
     if args.run_all_tests:
         run_all_tests(args)
+        if args.profile:
+            report_profiles(args.profile_directory)
         exit()
 
     if args.benchmark_instance:
         benchmark_instance(args.instance, args, True)
+        if args.profile:
+            report_profiles(args.profile_directory)
         exit()
 
     if args.benchmark_all_instances:
         benchmark_all_instances(args)
+        if args.profile:
+            report_profiles(args.profile_directory)
         exit()
 
     result_file = open("results.csv", "w", buffering=1)
@@ -405,7 +672,7 @@ if __name__ == '__main__':
     nodes_exp_file = open("nodes-exp-cleaned.csv", "w", buffering=1)
 
 
-    if args.batch:
+    if args.batch and args.scen is None:
         input_instance = sorted(glob.glob("instances/test*"))
     else:
         input_instance = sorted(glob.glob(args.instance))
@@ -416,12 +683,12 @@ if __name__ == '__main__':
 
         
         print(file)
-        my_map, starts, goals = import_mapf_instance(file)
+        my_map, starts, goals = load_instance(file, args)
         print_mapf_instance(my_map, starts, goals)
 
         if args.hlsolver == "CBS":
             print("***Run CBS***")
-            cbs = CBSSolver(my_map, starts, goals, timeout = args.timeout)
+            cbs = CBSSolver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args))
             # solution = cbs.find_solution(args.disjoint)
 
             # if solution is not None:
@@ -434,12 +701,12 @@ if __name__ == '__main__':
 
         elif args.hlsolver == "ICBS_CB":
             print("***Run ICBS with CB***")
-            cbs = ICBS_CB_Solver(my_map, starts, goals)
+            cbs = ICBS_CB_Solver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args))
  
 
         elif args.hlsolver == "ICBS":
             print("***Run ICBS***")
-            cbs = ICBS_Solver(my_map, starts, goals)
+            cbs = ICBS_Solver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args), **get_merge_arguments(args))
             # solution = cbs.find_solution(args.disjoint)
 
             # if solution is not None:
@@ -452,6 +719,10 @@ if __name__ == '__main__':
 
 
 
+        elif args.hlsolver == "MAC_ICBS":
+            print("***Run MAC-ICBS***")
+            cbs = MAC_ICBS_Solver(my_map, starts, goals, budget = get_budget(args), seed = get_seed(args))
+
         # elif args.solver == "Independent":
         #     print("***Run Independent***")
         #     solver = IndependentSolver(my_map, starts, goals)
@@ -469,14 +740,19 @@ if __name__ == '__main__':
         solution = None
 
         if args.tuvya_splitting:
-            solution = cbs.find_solution(args.disjoint, print_results=True, do_tuvya_splitting=True, balanced_tuvya_splitting= not args.imbalanced_tuvya_splitting)
+            solution = solve(cbs, file, get_method_name(args), args, args.disjoint, print_results=True, do_tuvya_splitting=True, balanced_tuvya_splitting= not args.imbalanced_tuvya_splitting, partition_policy= args.partition_policy, **get_cbs_arguments(args))
+        elif args.hlsolver == "CBS":
+            solution = solve(cbs, file, get_method_name(args), args, args.disjoint, print_results=True, **get_cbs_arguments(args))
         else:
-            solution = cbs.find_solution(args.disjoint, print_results=True)
+            solution = solve(cbs, file, get_method_name(args), args, args.disjoint, print_results=True)
 
         if solution is not None:
             # print(solution)
             paths, nodes_gen, nodes_exp = [solution[i] for i in range(3)]
             if paths is None:
+                # A search that ran out of budget has no solution to record or show
+                if budget_exhausted(cbs) is not None:
+                    continue
                 raise BaseException('No solutions')  
         else:
             raise BaseException('No solutions')
@@ -497,3 +773,6 @@ if __name__ == '__main__':
             # animation.save('demo/fig.gif', 1)
 
     result_file.close()
+
+    if args.profile:
+        report_profiles(args.profile_directory)
@@ -0,0 +1,282 @@
+'''
+This file contains the scaling benchmark, which finds the largest number of agents each splitting strategy can solve
+on a map within a time budget. For every strategy, the number of agents is increased step by step, and at every step
+CBS is run on the first k agents of each scenario file. The curve of a strategy stops at the first step whose success
+rate falls below the threshold; the last step before it is the headline number of the strategy.
+
+Functions
+---------
+run_scaling_benchmark()
+    Run the scaling benchmark for every strategy and save the curves.
+run_scaling_curve()
+    Run the scaling curve of one splitting strategy.
+run_step()
+    Run one step of a scaling curve.
+
+Notes
+-----
+The following metrics are recorded for every step:
+- Success rate (the fraction of scenarios solved within the timeout)
+- Median runtime (unsolved scenarios count as the timeout)
+- Median HL nodes expanded and generated
+- Median LL nodes expanded
+- The seed of the solvers (empty if they weren't seeded)
+
+The agents of a step are a prefix of the agents of the next step, so the heuristic table of every goal is computed
+once and shared by all the steps and strategies.
+
+With --seeds, the whole benchmark is run once per seed, and every seed's curves are saved to their own file.
+
+Usage:
+    python scaling_benchmark.py --map <file.map> --scen <file.scen> [<file.scen> ...] [--seeds <S1> <S2> ...]
+'''
+
+import argparse
+import os
+import statistics
+import time
+
+from a_star_class import compute_heuristics
+from atzmon_benchmark import SPLITTING_STRATEGIES, get_splitting_flags
+from budget import Budget
+from cbs_basic import CBSSolver
+from movingai import load_map, load_scenario
+
+# A strategy's curve stops at the first step that solves fewer than this fraction of the scenarios
+DEFAULT_SUCCESS_THRESHOLD = 0.5
+
+METRICS_HEADER = 'Splitting strategy,Agents,Scenarios,Success rate,Median runtime,Median HL Nodes expanded,Median HL Nodes generated,Median LL Nodes expanded,Seed\n'
+
+def get_heuristics(my_map, goals, heuristics_cache):
+    '''
+    Get the heuristic tables of the goals, computing only those that aren't in the cache yet.
+
+    Parameters
+    ----------
+    my_map : list
+        The map.
+    goals : list
+        The goal locations of the agents.
+    heuristics_cache : dict
+        The heuristic tables computed so far, keyed by their goal. Updated in place.
+
+    Returns
+    -------
+    list
+        The heuristic table of every goal.
+    '''
+
+    for goal in goals:
+        if goal not in heuristics_cache:
+            heuristics_cache[goal] = compute_heuristics(my_map, goal)
+
+    return [heuristics_cache[goal] for goal in goals]
+
+def run_step(my_map, scenarios, num_agents, splitting_strategy, timeout, heuristics_cache, seed=None):
+    '''
+    Run CBS on the first num_agents agents of every scenario.
+
+    Parameters
+    ----------
+    my_map : list
+        The map.
+    scenarios : list
+        The (starts, goals) of every scenario.
+    num_agents : int
+        The number of agents.
+    splitting_strategy : str
+        The splitting strategy, one of SPLITTING_STRATEGIES.
+    timeout : float
+        The timeout of every run in seconds.
+    heuristics_cache : dict
+        The heuristic tables computed so far, keyed by their goal.
+    seed : int
+        The seed of the solvers' random choices. Default is None (not seeded).
+
+    Returns
+    -------
+    dict
+        The metrics of the step.
+    '''
+
+    disjoint, tuvya_splitting, imbalanced = get_splitting_flags(splitting_strategy)
+
+    solved = 0
+    runtimes, hl_expanded, hl_generated, ll_expanded = [], [], [], []
+    for starts, goals in scenarios:
+        starts, goals = starts[:num_agents], goals[:num_agents]
+        heuristics = get_heuristics(my_map, goals, heuristics_cache)
+
+        cbs = CBSSolver(my_map, starts, goals, budget=Budget(wall_time=timeout), heuristics=heuristics, seed=seed)
+
+        start_time = time.time()
+        paths, _, _ = cbs.find_solution(disjoint=disjoint, do_tuvya_splitting=tuvya_splitting, balanced_tuvya_splitting=not imbalanced)
+        runtime = time.time() - start_time
+
+        if paths is not None:
+            solved += 1
+        else:
+            runtime = max(runtime, timeout)
+
+        runtimes.append(runtime)
+        hl_expanded.append(cbs.num_of_expanded)
+        hl_generated.append(cbs.num_of_generated)
+        ll_expanded.append(cbs.budget_report['ll_expanded'])
+
+    return {
+        'Splitting strategy': splitting_strategy,
+        'Agents': num_agents,
+        'Scenarios': len(scenarios),
+        'Success rate': solved / len(scenarios),
+        'Median runtime': statistics.median(runtimes),
+        'Median HL Nodes expanded': statistics.median(hl_expanded),
+        'Median HL Nodes generated': statistics.median(hl_generated),
+        'Median LL Nodes expanded': statistics.median(ll_expanded),
+        'Seed': '' if seed is None else seed
+    }
+
+def run_scaling_curve(my_map, scenarios, splitting_strategy, timeout, threshold=DEFAULT_SUCCESS_THRESHOLD,
+                      min_agents=2, step=1, heuristics_cache=None, f=None, seed=None):
+    '''
+    Run the scaling curve of one splitting strategy: increase the number of agents by step until the success rate
+    falls below the threshold, or until the scenarios run out of agents.
+
+    Parameters
+    ----------
+    my_map : list
+        The map.
+    scenarios : list
+        The (starts, goals) of every scenario.
+    splitting_strategy : str
+        The splitting strategy, one of SPLITTING_STRATEGIES.
+    timeout : float
+        The timeout of every run in seconds.
+    threshold : float
+        The lowest success rate a step may have for the curve to continue. Default is DEFAULT_SUCCESS_THRESHOLD.
+    min_agents : int
+        The number of agents of the first step. Default is 2.
+    step : int
+        The number of agents added at every step. Default is 1.
+    heuristics_cache : dict
+        The heuristic tables computed so far, keyed by their goal. Default is None (start with an empty cache).
+    f : file
+        The file to append the metrics of every step to, as CSV. Default is None (don't save them).
+    seed : int
+        The seed of the solvers' random choices. Default is None (not seeded).
+
+    Returns
+    -------
+    tuple
+        The metrics of every step, and the largest number of agents solved with a success rate of at least the
+        threshold (0 if none).
+    '''
+
+    if heuristics_cache is None:
+        heuristics_cache = dict()
+
+    max_agents = min(len(goals) for _, goals in scenarios)
+
+    curve = []
+    max_solved = 0
+    for num_agents in range(min_agents, max_agents + 1, step):
+        metrics = run_step(my_map, scenarios, num_agents, splitting_strategy, timeout, heuristics_cache, seed)
+        curve.append(metrics)
+
+        print('{:<28} {:>4} agents   success {:>6.1%}   median runtime {:>8.3f}s   median HL expanded {:>8}'.format(
+            splitting_strategy, num_agents, metrics['Success rate'], metrics['Median runtime'], metrics['Median HL Nodes expanded']))
+
+        if f is not None:
+            f.write(format_metrics(metrics))
+            f.flush()
+
+        if metrics['Success rate'] < threshold:
+            break
+        max_solved = num_agents
+
+    return curve, max_solved
+
+def format_metrics(metrics):
+    '''
+    Format the metrics of a step as a CSV line.
+    '''
+
+    return ','.join(str(metrics[column]) for column in METRICS_HEADER.strip().split(',')) + '\n'
+
+def run_scaling_benchmark(map_file, scen_files, splitting_strategies=SPLITTING_STRATEGIES, timeout=60,
+                          threshold=DEFAULT_SUCCESS_THRESHOLD, min_agents=2, step=1, output_directory='scaling_benchmark_results', seed=None):
+    '''
+    Run the scaling curve of every splitting strategy on a map, save the curves and report the largest number of
+    agents each strategy solved.
+
+    Parameters
+    ----------
+    map_file : str
+        The MovingAI .map file.
+    scen_files : list
+        The MovingAI .scen files of the map.
+    splitting_strategies : list
+        The splitting strategies to run. Default is every strategy.
+    timeout : float
+        The timeout of every run in seconds. Default is 60.
+    threshold : float
+        The lowest success rate a step may have for a curve to continue. Default is DEFAULT_SUCCESS_THRESHOLD.
+    min_agents : int
+        The number of agents of the first step. Default is 2.
+    step : int
+        The number of agents added at every step. Default is 1.
+    output_directory : str
+        The directory to save the curves to. Default is "scaling_benchmark_results".
+    seed : int
+        The seed of the solvers' random choices. It is recorded with every step and in the name of the file. Default
+        is None (not seeded).
+
+    Returns
+    -------
+    dict
+        The largest number of agents solved by every strategy.
+    '''
+
+    my_map = load_map(map_file)
+    scenarios = [load_scenario(scen_file) for scen_file in scen_files]
+
+    os.makedirs(output_directory, exist_ok=True)
+    map_name = os.path.splitext(os.path.basename(map_file))[0]
+    seed_suffix = '' if seed is None else f'-seed{seed}'
+    filename = f'{output_directory}/{map_name}-{time.strftime("%m-%d-%Y_%H-%M-%S")}{seed_suffix}.csv'
+
+    # Shared by every step and every strategy
+    heuristics_cache = dict()
+
+    max_solved = dict()
+    with open(filename, 'w') as f:
+        f.write(METRICS_HEADER)
+        for splitting_strategy in splitting_strategies:
+            _, max_solved[splitting_strategy] = run_scaling_curve(my_map, scenarios, splitting_strategy, timeout, threshold,
+                                                                  min_agents, step, heuristics_cache, f, seed)
+
+    seed_note = '' if seed is None else f', seed {seed}'
+    print(f'\nLargest number of agents solved on {map_name} (success rate >= {threshold:.0%}, timeout {timeout}s{seed_note}):')
+    for splitting_strategy, num_agents in max_solved.items():
+        print(f'  {splitting_strategy:<28} {num_agents}')
+    print(f'The curves were saved to {filename}.')
+
+    return max_solved
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the largest number of agents each splitting strategy solves on a map within a time budget.')
+
+    parser.add_argument('--map', type=str, required=True, help='The MovingAI .map file.')
+    parser.add_argument('--scen', type=str, nargs='+', required=True, help='The MovingAI .scen files of the map. The success rate of a step is the fraction of them that is solved.')
+    parser.add_argument('--splitting_strategy', type=str, nargs='+', default=SPLITTING_STRATEGIES, choices=SPLITTING_STRATEGIES, help='The splitting strategies to run. Default is every strategy.')
+    parser.add_argument('--timeout', '-t', type=float, default=60, help='The timeout of every run in seconds. Default is 60 seconds.')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_SUCCESS_THRESHOLD, help='A curve stops at the first step with a lower success rate. Default is 0.5.')
+    parser.add_argument('--min_agents', type=int, default=2, help='The number of agents of the first step. Default is 2.')
+    parser.add_argument('--step', type=int, default=1, help='The number of agents added at every step. Default is 1.')
+    parser.add_argument('--seeds', type=int, nargs='+', default=None, help='Run the benchmark once per seed, with seeded solvers. Default is a single unseeded run.')
+    parser.add_argument('--output_directory', '-o', type=str, default='scaling_benchmark_results', help='The directory to save the curves to. Default is "scaling_benchmark_results".')
+
+    args = parser.parse_args()
+
+    for seed in args.seeds if args.seeds else [None]:
+        run_scaling_benchmark(args.map, args.scen, args.splitting_strategy, args.timeout, args.threshold,
+                              args.min_agents, args.step, args.output_directory, seed)
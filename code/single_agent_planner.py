@@ -141,12 +141,13 @@ def compare_nodes(n1, n2):
     return n1['g_val'] + n1['h_val'] < n2['g_val'] + n2['h_val']
 
 
-def a_star(my_map, start_loc, goal_loc, h_values, agent, constraints):
+def a_star(my_map, start_loc, goal_loc, h_values, agent, constraints, budget=None):
     """ my_map      - binary obstacle map
         start_loc   - start position
         goal_loc    - goal position
         agent       - the agent that is being re-planned
         constraints - constraints defining where robot should or cannot go at each timestep
+        budget      - Budget of the high-level solver, charged once per expansion (optional)
     """
 
     ##############################
@@ -163,6 +164,8 @@ def a_star(my_map, start_loc, goal_loc, h_values, agent, constraints):
     closed_list[(root['loc'],root['timestep'])] = root
     while len(open_list) > 0:
         curr = pop_node(open_list)
+        if budget is not None:
+            budget.expand_ll()
         # if curr['loc'] == goal_loc:
         #     return get_path(curr)
         #############################